@@ -0,0 +1,195 @@
+import datetime
+import os
+import threading
+import time
+from io import BytesIO
+
+# Results are reused while the data version is unchanged; this bounds staleness
+# for changes the version does not see (e.g. two students swapping sections)
+ANALYTICS_MAX_AGE = float(os.getenv("ANALYTICS_MAX_AGE", "300"))
+# Distinct date ranges kept computed at once
+ANALYTICS_CACHE_RANGES = 8
+
+# Cheap fingerprint of everything the metrics depend on:
+#   attendance writes   -> attendance_change_seq, plus stats totals for deletes/flushes
+#   events              -> dates, cutoffs and archiving
+#   roster              -> per-section head counts
+#   late_after setting  -> the tardiness threshold
+_VERSION_SQL = """
+    SELECT md5(concat_ws('|',
+        (SELECT last_value FROM attendance_change_seq),
+        (SELECT COALESCE(SUM(checked_in), 0) FROM event_stats)
+            + (SELECT COALESCE(SUM(checked_in), 0) FROM attendance_stats_delta),
+        (SELECT string_agg(concat_ws(',', id, date, am_cutoff, deleted_at), ';' ORDER BY id) FROM events),
+        (SELECT string_agg(concat_ws(',', program, year_level, section, students), ';'
+                           ORDER BY program, year_level, section) FROM roster_stats),
+        (SELECT value FROM settings WHERE key = 'late_after')
+    )) AS version
+"""
+
+_cache = {}  # (today, date_from, date_to) -> Report
+_lock = threading.Lock()
+
+
+class Report:
+    """
+    Computed metrics for one date range: `students` and `sections` DataFrames,
+    plus the students x events `attended`/`tardy` matrices they came from
+    (rows in `students` order, columns in `events` order). `late_after` is the
+    tardiness threshold used ('HH:MM'), or None for each event's AM cutoff.
+    """
+
+    def __init__(self, version, events, students, sections, attended, tardy, late_after=None):
+        self.version = version
+        self.late_after = late_after
+        self.events = events
+        self.students = students
+        self.sections = sections
+        self.attended = attended
+        self.tardy = tardy
+        self.computed_at = time.time()
+
+    def history(self, student_no):
+        """[{event..., attended, tardy}] for one student, oldest event first."""
+        row = self.students.index.get_loc(student_no)
+        return [
+            {**event, 'attended': bool(self.attended[row, i]), 'tardy': bool(self.tardy[row, i])}
+            for i, event in enumerate(self.events)
+        ]
+
+
+def _copy_frame(cursor, query, params=None, dtype=None):
+    """Runs a SELECT through COPY ... TO STDOUT and parses the CSV straight into a DataFrame."""
+    import pandas as pd  # heavy; only analytics needs it
+
+    buffer = BytesIO()
+    sql = cursor.mogrify(query, params).decode('utf-8') if params else query
+    cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH CSV HEADER", buffer)
+    buffer.seek(0)
+    return pd.read_csv(buffer, keep_default_na=False, na_values=[''], dtype=dtype)
+
+
+def _cutoff_seconds(values):
+    """'HH:MM' strings (event am_cutoffs, late_after) as seconds after midnight; unreadable ones fall back to noon."""
+    import pandas as pd
+
+    parsed = pd.to_datetime(values, format='%H:%M', errors='coerce')
+    seconds = parsed.dt.hour * 3600 + parsed.dt.minute * 60
+    return seconds.fillna(12 * 3600).to_numpy(dtype='float64')
+
+
+def _run_lengths(marks):
+    """Per-row current and longest run of True in a students x events boolean matrix."""
+    import numpy as np
+
+    counts = np.cumsum(marks, axis=1)
+    # At each position, the running count as of the most recent miss
+    resets = np.maximum.accumulate(np.where(marks, 0, counts), axis=1)
+    runs = counts - resets
+    if runs.shape[1] == 0:
+        zeros = np.zeros(runs.shape[0], dtype='int64')
+        return zeros, zeros
+    return runs[:, -1], runs.max(axis=1)
+
+
+def compute(cursor, version, date_from=None, date_to=None):
+    """
+    Loads events, roster and attendance in bulk and computes, with array
+    operations only, per-student and per-section attendance rate, tardiness
+    and attendance streaks. Only events dated today or earlier count.
+
+    A student is tardy when their first IN of the day (am_in, else pm_in) is
+    later than the `late_after` setting ('HH:MM'). Without that setting the
+    threshold is each event's am_cutoff, the AM/PM session boundary, so tardy
+    then means "checked in only for the PM session".
+    """
+    import numpy as np
+    import pandas as pd
+
+    clauses = ["deleted_at IS NULL", "date <= %s"]
+    params = [datetime.date.today().isoformat()]
+    if date_from:
+        clauses.append("date >= %s")
+        params.append(date_from)
+    if date_to:
+        clauses.append("date <= %s")
+        params.append(date_to)
+    where = " AND ".join(clauses)
+
+    cursor.execute("SELECT value FROM settings WHERE key = 'late_after'")
+    setting = cursor.fetchone()
+    late_after = (setting['value'] or '').strip() if setting else ''
+    late_after = late_after or None
+
+    events = _copy_frame(cursor, f"SELECT id, name, date, am_cutoff FROM events WHERE {where} ORDER BY date, id",
+                         params, dtype={'name': str, 'date': str, 'am_cutoff': str})
+    students = _copy_frame(cursor, """
+        SELECT student_no, COALESCE(program, '') AS program, COALESCE(year_level, '') AS year_level,
+               COALESCE(section, '') AS section
+        FROM students ORDER BY student_no
+    """, dtype=str).fillna('')
+    # timestamptz::time is in the session time zone, the same clock the cutoff uses
+    attendance = _copy_frame(cursor, f"""
+        SELECT a.event_id, a.student_no,
+               EXTRACT(EPOCH FROM COALESCE(a.am_in, a.pm_in)::time) AS first_in
+        FROM attendance a
+        WHERE a.deleted_at IS NULL AND (a.am_in IS NOT NULL OR a.pm_in IS NOT NULL)
+          AND a.event_id IN (SELECT id FROM events WHERE {where})
+    """, params, dtype={'student_no': str})
+
+    n_students, n_events = len(students), len(events)
+    rows = pd.Index(students['student_no']).get_indexer(attendance['student_no'])
+    cols = pd.Index(events['id']).get_indexer(attendance['event_id'])
+    keep = (rows >= 0) & (cols >= 0)
+    rows, cols = rows[keep], cols[keep]
+
+    attended = np.zeros((n_students, n_events), dtype=bool)
+    attended[rows, cols] = True
+    tardy = np.zeros((n_students, n_events), dtype=bool)
+    if late_after:
+        cutoffs = np.full(n_events, _cutoff_seconds(pd.Series([late_after]))[0])
+    else:
+        cutoffs = _cutoff_seconds(events['am_cutoff'])
+    tardy[rows, cols] = attendance['first_in'].to_numpy(dtype='float64')[keep] > cutoffs[cols]
+
+    current, longest = _run_lengths(attended)
+    students['events'] = n_events
+    students['attended'] = attended.sum(axis=1)
+    students['tardy'] = tardy.sum(axis=1)
+    students['rate'] = students['attended'] / n_events if n_events else 0.0
+    students['current_streak'] = current
+    students['longest_streak'] = longest
+
+    sections = students.groupby(['program', 'year_level', 'section'], sort=True).agg(
+        students=('student_no', 'size'), attended=('attended', 'sum'), tardy=('tardy', 'sum')).reset_index()
+    possible = sections['students'] * n_events
+    sections['rate'] = (sections['attended'] / possible).where(possible > 0, 0.0)
+    sections['tardy_rate'] = (sections['tardy'] / sections['attended']).where(sections['attended'] > 0, 0.0)
+
+    event_list = [
+        {'id': int(e.id), 'name': e.name, 'date': str(e.date)}
+        for e in events.itertuples(index=False)
+    ]
+    return Report(version, event_list, students.set_index('student_no', drop=False).rename_axis(None), sections,
+                  attended, tardy, late_after)
+
+
+def get_report(cursor, date_from=None, date_to=None):
+    """Returns the Report for a date range, recomputing only when the data version has moved."""
+    cursor.execute(_VERSION_SQL)
+    version = cursor.fetchone()['version']
+    # Today is part of the key: events join the metrics on their date
+    key = (datetime.date.today().isoformat(), date_from or None, date_to or None)
+
+    with _lock:
+        report = _cache.get(key)
+    if report and report.version == version and time.time() - report.computed_at < ANALYTICS_MAX_AGE:
+        return report
+
+    report = compute(cursor, version, key[1], key[2])
+    with _lock:
+        _cache[key] = report
+        if len(_cache) > ANALYTICS_CACHE_RANGES:
+            oldest = min(_cache, key=lambda k: _cache[k].computed_at)
+            _cache.pop(oldest)
+    return report
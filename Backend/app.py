@@ -1,10 +1,11 @@
 import os
-from flask import Flask, render_template
+from flask import Flask, render_template, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 # Import the database functions properly
-from database import init_db, close_connection 
+from database import init_db, close_connection, PoolTimeout
+import metrics
 
 # Import blueprints using absolute paths for Vercel
 from routes.auth import auth_bp
@@ -12,6 +13,7 @@ from routes.admin import admin_bp
 from routes.students import students_bp
 from routes.events import events_bp
 from routes.attendance import attendance_bp
+from routes.analytics import analytics_bp
 from flask import redirect, url_for
 
 load_dotenv()
@@ -27,6 +29,12 @@ CORS(app, resources={r"/*": {
 }}, supports_credentials=True)
 # Register Teardown Context
 app.teardown_appcontext(close_connection)
+# Per-endpoint request/SQL/encryption metrics (see /api/admin/metrics)
+metrics.init_app(app)
+
+@app.errorhandler(PoolTimeout)
+def database_busy(e):
+    return jsonify({'message': 'Database is busy. Please try again.'}), 503, {'Retry-After': '1'}
 
 # Register Blueprints
 app.register_blueprint(auth_bp)
@@ -34,6 +42,7 @@ app.register_blueprint(admin_bp)
 app.register_blueprint(students_bp)
 app.register_blueprint(events_bp)
 app.register_blueprint(attendance_bp)
+app.register_blueprint(analytics_bp)
 
 @app.route('/')
 def root():
@@ -0,0 +1,158 @@
+import atexit
+import datetime
+import os
+import queue
+import threading
+import time
+from psycopg2.extras import execute_values
+from database import get_pool
+
+# Entries waiting beyond this are dropped (and counted) rather than blocking requests
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+# Longest an entry sits in the queue before the writer commits it
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))
+# How long shutdown waits for the queue to drain
+AUDIT_SHUTDOWN_TIMEOUT = float(os.getenv("AUDIT_SHUTDOWN_TIMEOUT", "5"))
+
+
+class AuditWriter:
+    """Buffers audit_logs rows in memory and inserts them in batches from a background thread."""
+
+    def __init__(self, maxsize, batch_size, interval):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pid = os.getpid()
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.high_water = 0
+
+    def log(self, actor, action, details):
+        """Queues one entry; never blocks the caller."""
+        try:
+            self._queue.put_nowait((actor, action, details, datetime.datetime.now()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"Audit queue full, dropped entry: {action} by {actor}")
+            return
+        with self._lock:
+            self.enqueued += 1
+            self.high_water = max(self.high_water, self._queue.qsize())
+
+    def flush(self, timeout=AUDIT_SHUTDOWN_TIMEOUT):
+        """Waits until every queued entry is written (or given up on). Returns True if drained."""
+        if not self._thread.is_alive():
+            # Nothing is draining the queue, so write what is left from here
+            while self._write(self._take_batch(block=False)):
+                pass
+        deadline = time.monotonic() + timeout
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                done.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'queued': self._queue.qsize(),
+                'max_queue': self._queue.maxsize,
+                'high_water': self.high_water,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches,
+            }
+
+    def _take_batch(self, block=True):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.interval) if block else self._queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+                # Let a short burst accumulate into the next batch
+                time.sleep(min(self.interval, 0.05))
+
+    def _write(self, batch):
+        if not batch:
+            return False
+        try:
+            # One retry covers a connection the server dropped while it sat idle
+            for attempt in range(2):
+                try:
+                    self._insert(batch)
+                    with self._lock:
+                        self.written += len(batch)
+                        self.batches += 1
+                    break
+                except Exception as e:
+                    if attempt:
+                        with self._lock:
+                            self.failed += len(batch)
+                        print(f"Failed to write {len(batch)} audit log entries: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+        return True
+
+    def _insert(self, batch):
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            cursor = conn.cursor()
+            execute_values(cursor,
+                           "INSERT INTO audit_logs (actor_username, action, details, timestamp) VALUES %s",
+                           batch)
+            conn.commit()
+            cursor.close()
+        finally:
+            pool.putconn(conn)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Returns this process's writer, starting a fresh one after a fork."""
+    global _writer
+    writer = _writer
+    if writer is not None and writer.pid == os.getpid():
+        return writer
+    with _writer_lock:
+        if _writer is None or _writer.pid != os.getpid():
+            # Entries still queued in the parent's copy belong to the parent
+            _writer = AuditWriter(AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL)
+        return _writer
+
+def audit_stats():
+    return get_writer().stats()
+
+def _flush_at_exit():
+    writer = _writer
+    if writer is not None and writer.pid == os.getpid() and not writer.flush():
+        print(f"Audit writer shut down with {writer.stats()['queued']} entries unwritten.")
+
+atexit.register(_flush_at_exit)
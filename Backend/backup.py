@@ -0,0 +1,344 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+import zlib
+import psycopg2
+from cache import invalidate_all
+from partitions import ensure_all_partitions
+
+# Archive layout (the whole stream is gzip-compressed):
+#
+#     {"format": "ams-backup", "version": 1, "created_at": ..., "tables": [...]}
+#     {"table": "events", "columns": [...]}
+#     <COPY text-format rows>
+#     \.
+#     ... one section per table ...
+#     {"manifest": {"events": {"rows": N, "sha256": "..."}, ...}}
+#
+# Table data is exactly what COPY ... TO STDOUT produces, so a restore is a
+# COPY FROM STDIN with no per-row work. Each sha256 covers a table's COPY rows.
+
+# Parents before children, so a restore can load them in this order
+BACKUP_TABLES = ['events', 'students', 'sections', 'settings', 'officers', 'attendance', 'audit_logs']
+# Transaction ids mean nothing in another database; restored rows take the column default
+BACKUP_SKIP_COLUMNS = {'attendance': ('change_xid',)}
+BACKUP_FORMAT = 'ams-backup'
+BACKUP_VERSION = 1
+BACKUP_COMPRESS_LEVEL = int(os.getenv("BACKUP_COMPRESS_LEVEL", "6"))
+# Compressed bytes buffered before a chunk is sent to the client
+BACKUP_CHUNK_SIZE = 64 * 1024
+# COPY output blocks held between the database thread and the response
+_PIPE_DEPTH = 64
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _PipeWriter:
+    """File-like target for copy_expert that hands ~64KB blocks to the consuming generator."""
+
+    def __init__(self):
+        self.blocks = queue.Queue(maxsize=_PIPE_DEPTH)
+        self.cancelled = threading.Event()
+        # psycopg2 writes COPY output one row at a time; batch it before crossing threads
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= BACKUP_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        block = b''.join(self._buffer)
+        self._buffer, self._buffered = [], 0
+        while True:
+            if self.cancelled.is_set():
+                raise _Cancelled()
+            try:
+                self.blocks.put(block, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+
+def table_columns(cursor, table):
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+        ORDER BY ordinal_position
+    """, (table,))
+    return [row['column_name'] for row in cursor.fetchall()]
+
+
+def _copy_out(conn, sql, pipe):
+    """Runs COPY ... TO STDOUT on a helper thread; ends the stream with None or the exception."""
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.copy_expert(sql, pipe)
+            pipe.flush()
+        finally:
+            cursor.close()
+        result = None
+    except Exception as e:
+        result = e
+    if not pipe.cancelled.is_set():
+        pipe.blocks.put(result)
+
+
+def stream_backup(conn):
+    """
+    Yields the gzip-compressed archive of every BACKUP_TABLES table, read from
+    one consistent snapshot. Memory use is bounded by the COPY pipe, whatever
+    the table sizes.
+    """
+    compressor = zlib.compressobj(BACKUP_COMPRESS_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip framing
+    pending = []
+    pending_size = 0
+
+    def emit(data):
+        nonlocal pending_size
+        out = compressor.compress(data)
+        if out:
+            pending.append(out)
+            pending_size += len(out)
+
+    def drain():
+        nonlocal pending_size
+        chunk = b''.join(pending)
+        pending.clear()
+        pending_size = 0
+        return chunk
+
+    cursor = None
+    pipe = None
+    worker = None
+    try:
+        cursor = conn.cursor()
+        # Every table is read from the same snapshot
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        columns = {
+            table: [c for c in table_columns(cursor, table) if c not in BACKUP_SKIP_COLUMNS.get(table, ())]
+            for table in BACKUP_TABLES
+        }
+
+        emit((json.dumps({
+            'format': BACKUP_FORMAT, 'version': BACKUP_VERSION,
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'tables': BACKUP_TABLES,
+        }) + '\n').encode('utf-8'))
+
+        manifest = {}
+        for table in BACKUP_TABLES:
+            column_list = ', '.join(f'"{c}"' for c in columns[table])
+            emit((json.dumps({'table': table, 'columns': columns[table]}) + '\n').encode('utf-8'))
+
+            digest, rows = hashlib.sha256(), 0
+            pipe = _PipeWriter()
+            worker = threading.Thread(
+                target=_copy_out, daemon=True,
+                args=(conn, f'COPY (SELECT {column_list} FROM "{table}") TO STDOUT', pipe))
+            worker.start()
+            while True:
+                block = pipe.blocks.get()
+                if block is None:
+                    break
+                if isinstance(block, Exception):
+                    raise block
+                digest.update(block)
+                rows += block.count(b'\n')
+                emit(block)
+                if pending_size >= BACKUP_CHUNK_SIZE:
+                    yield drain()
+            worker.join()
+            pipe = worker = None
+
+            emit(b'\\.\n')
+            manifest[table] = {'rows': rows, 'sha256': digest.hexdigest()}
+
+        emit((json.dumps({'manifest': manifest}) + '\n').encode('utf-8'))
+        pending.append(compressor.flush())
+        yield drain()
+    finally:
+        if worker is not None:
+            # Client went away mid-table: stop the COPY thread before releasing the connection
+            pipe.cancelled.set()
+            worker.join()
+        if cursor is not None:
+            cursor.close()
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+
+
+# --- Restore ---
+
+class BackupFormatError(ValueError):
+    """The archive is not a readable ams-backup, or it fails its manifest checks."""
+
+
+class _SectionReader:
+    """File-like source for copy_expert: one table's COPY rows, hashed as they stream past."""
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.digest = hashlib.sha256()
+        self.rows = 0
+        self.done = False
+
+    def read(self, size=-1):
+        if self.done:
+            return b''
+        size = size if size and size > 0 else BACKUP_CHUNK_SIZE
+        lines, length = [], 0
+        while length < size:
+            line = self.archive.readline()
+            if not line:
+                raise BackupFormatError("Archive ends in the middle of a table.")
+            if line == b'\\.\n':
+                self.done = True
+                break
+            self.digest.update(line)
+            self.rows += 1
+            lines.append(line)
+            length += len(line)
+        return b''.join(lines)
+
+
+def _read_json_line(archive):
+    line = archive.readline()
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise BackupFormatError("Expected a JSON header line in the archive.")
+
+
+def _droppable_indexes(cursor, table):
+    """Indexes on a table that do not back a constraint, as (name, definition)."""
+    cursor.execute("""
+        SELECT i.indexrelid::regclass::text AS name, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid
+        WHERE i.indrelid = %s::regclass AND c.oid IS NULL
+    """, (table,))
+    return [(row['name'], row['definition']) for row in cursor.fetchall()]
+
+
+def _reset_sequences(cursor, table):
+    cursor.execute("""
+        SELECT attname AS column_name, pg_get_serial_sequence(%s, attname) AS sequence
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+    """, (table, table))
+    for row in cursor.fetchall():
+        if row['sequence']:
+            cursor.execute(f"""
+                SELECT setval(%s, COALESCE((SELECT MAX("{row['column_name']}") FROM "{table}"), 0) + 1, false)
+            """, (row['sequence'],))
+
+
+def restore_backup(conn, stream):
+    """
+    Replaces the tables in a stream_backup() archive with its contents, in one
+    transaction. Rows are loaded with COPY FROM while user triggers are off and
+    secondary indexes are dropped; indexes are rebuilt, sequences reset and the
+    stats tables recomputed afterwards. Nothing is committed unless every table
+    matches the manifest. Returns {table: rows}.
+    """
+    archive = gzip.GzipFile(fileobj=stream, mode='rb')
+    cursor = conn.cursor()
+    try:
+        try:
+            header = _read_json_line(archive)
+        except (OSError, EOFError):
+            raise BackupFormatError("The file is not a gzip backup archive.")
+        if header.get('format') != BACKUP_FORMAT or header.get('version') != BACKUP_VERSION:
+            raise BackupFormatError("Unsupported backup format or version.")
+        tables = header.get('tables') or []
+        unknown = [t for t in tables if t not in BACKUP_TABLES]
+        if unknown:
+            raise BackupFormatError(f"Archive contains unknown tables: {', '.join(unknown)}")
+
+        # Keep the dependency order even if the archive lists tables differently
+        tables = [t for t in BACKUP_TABLES if t in tables]
+        quoted = ', '.join(f'"{t}"' for t in tables)
+        indexes = [ix for t in tables for ix in _droppable_indexes(cursor, t)]
+
+        # The archive is one consistent snapshot loaded parents-first, so foreign
+        # key checks only cost time; skip them when the role is allowed to
+        cursor.execute("SAVEPOINT replica_role")
+        try:
+            cursor.execute("SET LOCAL session_replication_role = replica")
+            cursor.execute("RELEASE SAVEPOINT replica_role")
+        except psycopg2.Error:
+            cursor.execute("ROLLBACK TO SAVEPOINT replica_role")
+        for table in tables:
+            cursor.execute(f'ALTER TABLE "{table}" DISABLE TRIGGER USER')
+        # Derived counters are rebuilt below rather than maintained row by row
+        cursor.execute(f"TRUNCATE {quoted}, event_stats, event_section_stats, attendance_stats_delta, roster_stats RESTART IDENTITY CASCADE")
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {name}")
+
+        loaded = {}
+        while True:
+            section = _read_json_line(archive)
+            if 'manifest' in section:
+                manifest = section['manifest']
+                break
+            table = section.get('table')
+            if table not in tables or table in loaded:
+                raise BackupFormatError(f"Unexpected table section: {table}")
+            existing = set(table_columns(cursor, table))
+            missing = [c for c in section['columns'] if c not in existing]
+            if missing:
+                raise BackupFormatError(f"{table} has no column(s) {', '.join(missing)} in this database.")
+
+            column_list = ', '.join(f'"{c}"' for c in section['columns'])
+            reader = _SectionReader(archive)
+            cursor.copy_expert(f'COPY "{table}" ({column_list}) FROM STDIN', reader)
+            loaded[table] = (reader.rows, reader.digest.hexdigest())
+            if table == 'events':
+                # Give restored events their attendance partitions before attendance loads
+                ensure_all_partitions(cursor)
+
+        for table in tables:
+            expected = manifest.get(table, {})
+            rows, digest = loaded.get(table, (0, None))
+            if table not in loaded or expected.get('rows') != rows or expected.get('sha256') != digest:
+                raise BackupFormatError(f"{table} does not match the backup manifest; nothing was restored.")
+
+        for _, definition in indexes:
+            # Partitioned tables report "ON ONLY", which would build an empty
+            # invalid parent index; rebuild it on every partition instead
+            cursor.execute(definition.replace(' ON ONLY ', ' ON ', 1))
+        for table in tables:
+            cursor.execute(f'ALTER TABLE "{table}" ENABLE TRIGGER USER')
+            _reset_sequences(cursor, table)
+        if 'attendance' in tables:
+            cursor.execute("""
+                SELECT setval('attendance_change_seq', COALESCE((SELECT MAX(change_seq) FROM attendance), 0) + 1, false)
+            """)
+        cursor.execute("SELECT rebuild_attendance_stats()")
+        cursor.execute(f"ANALYZE {quoted}")
+
+        invalidate_all(cursor)
+        conn.commit()
+        return {table: loaded[table][0] for table in tables}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
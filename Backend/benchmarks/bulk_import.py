@@ -0,0 +1,113 @@
+"""
+Student upsert benchmark: execute_values (the JSON import path) vs COPY staging.
+
+Measures only the database side of an import. Rows are built from a small
+pool of real Fernet ciphertexts so that encryption time, identical for both
+paths, does not hide the difference. Each size is timed twice per path:
+once inserting new students and once updating the same students.
+
+Usage (from Backend/, against a disposable database):
+    python benchmarks/bulk_import.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import DATABASE_URL  # noqa: E402
+from helpers import encrypt_data  # noqa: E402
+from name_index import search_tokens  # noqa: E402
+from roster import begin_student_stage, merge_student_stage, stage_students, upsert_students  # noqa: E402
+
+PREFIX = 'BULK-'
+CHUNK = 5000  # rows handed to each execute_values / COPY call, like the file importer
+NAMES = [('Juan', 'Dela Cruz'), ('Maria', 'Santos'), ('Jose', 'Reyes'), ('Ana', 'Bautista'),
+         ('Rizal', 'Mercado'), ('Liza', 'Villanueva'), ('Paolo', 'Garcia'), ('Bea', 'Ramos')]
+
+
+def make_rows(count):
+    pool = [(encrypt_data(first), encrypt_data('M'), encrypt_data(last), search_tokens(first, last))
+            for first, last in NAMES]
+    for i in range(count):
+        first, middle, last, tokens = pool[i % len(pool)]
+        yield (f"{PREFIX}{i:07d}", first, middle, last, 'BENCH', '1st Year', 'Z', tokens)
+
+
+def chunks(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == CHUNK:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_values(conn, count):
+    cursor = conn.cursor()
+    for batch in chunks(make_rows(count)):
+        upsert_students(cursor, batch, refresh_order=False)
+    conn.commit()
+
+
+def run_copy(conn, count):
+    cursor = conn.cursor()
+    begin_student_stage(cursor)
+    for batch in chunks(make_rows(count)):
+        stage_students(cursor, batch)
+    merge_student_stage(cursor)
+    conn.commit()
+
+
+def cleanup(conn):
+    """Deletes benchmark rows and vacuums; expects an autocommit connection."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM students WHERE student_no LIKE %s", (PREFIX + '%',))
+    cursor.execute("VACUUM ANALYZE students")
+
+
+def timed(fn, conn, count):
+    started = time.perf_counter()
+    fn(conn, count)
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    results = []
+    try:
+        for count in args.sizes:
+            for name, fn in (('execute_values', run_values), ('copy', run_copy)):
+                conn.autocommit = True  # VACUUM cannot run inside a transaction
+                cleanup(conn)
+                conn.autocommit = False
+                insert_rate = timed(fn, conn, count)
+                update_rate = timed(fn, conn, count)
+                results.append((count, name, insert_rate, update_rate))
+                print(f"{count:>9} rows  {name:<15} insert {insert_rate:>10,.0f} rows/s   "
+                      f"update {update_rate:>10,.0f} rows/s", flush=True)
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        cleanup(conn)
+        conn.close()
+
+    print()
+    for count in args.sizes:
+        rates = {name: (ins, upd) for c, name, ins, upd in results if c == count}
+        if len(rates) == 2:
+            v, c = rates['execute_values'], rates['copy']
+            print(f"{count:>9} rows  COPY speedup: insert x{c[0] / v[0]:.2f}  update x{c[1] / v[1]:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Concurrency stress test and latency comparison for /api/check_in.
+
+Fires the same student IDs from many simulated scanners at once and checks
+that the atomic attendance_check_in() path records each student exactly
+once: one scan per student must come back 'in_first' and every other one
+'already_in', with one attendance row per student. The legacy
+SELECT-then-INSERT sequence is replayed against an unconstrained scratch
+copy of the attendance table for comparison.
+
+Usage (from Backend/, against a disposable database):
+    python benchmarks/check_in_stress.py --students 200 --scanners 16 --rounds 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import DATABASE_URL  # noqa: E402
+
+PREFIX = 'STRESS-'
+
+
+def connect():
+    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+
+
+def legacy_check_in(cursor, event_id, student_no):
+    """The pre-atomic query sequence, run against attendance_stress_legacy."""
+    cursor.execute("SELECT first_name, last_name FROM students WHERE student_no = %s", (student_no,))
+    cursor.fetchone()
+    cursor.execute("SELECT am_cutoff, attendance_mode FROM events WHERE id = %s", (event_id,))
+    cursor.fetchone()
+    cursor.execute("SELECT * FROM attendance_stress_legacy WHERE event_id = %s AND student_no = %s",
+                   (event_id, student_no))
+    if cursor.fetchone() is None:
+        cursor.execute("INSERT INTO attendance_stress_legacy (event_id, student_no, am_in, status) "
+                       "VALUES (%s, %s, %s, 'Present')", (event_id, student_no, datetime.now()))
+
+
+def atomic_check_in(cursor, event_id, student_no):
+    cursor.execute("SELECT * FROM attendance_check_in(%s, %s, %s)", (event_id, student_no, datetime.now()))
+    return cursor.fetchone()['outcome']
+
+
+def run(scan, event_id, student_nos, scanners, rounds):
+    latencies = []
+    outcomes = Counter()  # (student_no, outcome) -> scans
+    lock = threading.Lock()
+    barrier = threading.Barrier(scanners)
+
+    def scanner():
+        conn = connect()
+        cursor = conn.cursor()
+        local, seen = [], Counter()
+        barrier.wait()
+        for _ in range(rounds):
+            for student_no in student_nos:
+                start = time.perf_counter()
+                outcome = scan(cursor, event_id, student_no)
+                conn.commit()
+                local.append(time.perf_counter() - start)
+                seen[student_no, outcome] += 1
+        cursor.close()
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            outcomes.update(seen)
+
+    threads = [threading.Thread(target=scanner) for _ in range(scanners)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, outcomes, time.perf_counter() - started
+
+
+def duplicates(cursor, table, event_id):
+    cursor.execute(f"""
+        SELECT COUNT(*) AS dupes FROM (
+            SELECT student_no FROM {table} WHERE event_id = %s
+            GROUP BY student_no HAVING COUNT(*) > 1
+        ) d
+    """, (event_id,))
+    return cursor.fetchone()['dupes']
+
+
+def wrong_outcomes(outcomes, student_nos, scans_each):
+    """Students whose scans did not come back as exactly one in_first and the rest already_in."""
+    return [
+        no for no in student_nos
+        if outcomes[no, 'in_first'] != 1 or outcomes[no, 'already_in'] != scans_each - 1
+    ]
+
+
+def report(label, latencies, elapsed, dupes):
+    ordered = sorted(latencies)
+    pct = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+    print(f"{label:<8} scans={len(ordered):>6}  {len(ordered) / elapsed:>8.0f}/s  "
+          f"mean={statistics.mean(ordered) * 1000:6.2f}ms  p50={pct(0.50):6.2f}ms  "
+          f"p95={pct(0.95):6.2f}ms  p99={pct(0.99):6.2f}ms  duplicates={dupes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--scanners', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    conn = connect()
+    cursor = conn.cursor()
+    student_nos = [f"{PREFIX}{i:05d}" for i in range(args.students)]
+    execute_values(cursor, """
+        INSERT INTO students (student_no, first_name, last_name, program, year_level, section)
+        VALUES %s ON CONFLICT DO NOTHING
+    """, [(no, 'Stress', 'Test', 'BENCH', '1st Year', 'Z') for no in student_nos])
+    cursor.execute("INSERT INTO events (name, date, am_cutoff) VALUES (%s, %s, '23:59') RETURNING id",
+                   (f"{PREFIX}event", datetime.now().strftime('%Y-%m-%d')))
+    event_id = cursor.fetchone()['id']
+    cursor.execute("CREATE UNLOGGED TABLE IF NOT EXISTS attendance_stress_legacy "
+                   "(LIKE attendance INCLUDING DEFAULTS)")
+    conn.commit()
+
+    try:
+        latencies, _, elapsed = run(legacy_check_in, event_id, student_nos, args.scanners, args.rounds)
+        report('legacy', latencies, elapsed, duplicates(cursor, 'attendance_stress_legacy', event_id))
+
+        latencies, outcomes, elapsed = run(atomic_check_in, event_id, student_nos, args.scanners, args.rounds)
+        wrong = wrong_outcomes(outcomes, student_nos, args.scanners * args.rounds)
+        cursor.execute("SELECT COUNT(*) AS n FROM attendance WHERE event_id = %s", (event_id,))
+        recorded = cursor.fetchone()['n']
+        report('atomic', latencies, elapsed, duplicates(cursor, 'attendance', event_id))
+        print(f"atomic   students with wrong outcomes={len(wrong)}  rows={recorded}/{len(student_nos)}")
+    finally:
+        cursor.execute("DROP TABLE IF EXISTS attendance_stress_legacy")
+        cursor.execute("DELETE FROM attendance WHERE event_id = %s", (event_id,))
+        cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+        cursor.execute("DELETE FROM students WHERE student_no LIKE %s", (PREFIX + '%',))
+        conn.commit()
+        conn.close()
+
+    if wrong or recorded != len(student_nos):
+        sys.exit(f"FAIL: atomic check-in misrecorded {len(wrong)} students "
+                 f"({recorded} attendance rows for {len(student_nos)} students).")
+
+
+if __name__ == '__main__':
+    main()
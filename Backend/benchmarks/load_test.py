@@ -0,0 +1,306 @@
+"""
+Event-day load test: concurrent scanners, polling dashboards and CSV exports.
+
+Seeds a throwaway event and roster, serves the app (in-process threaded
+server, or gunicorn), then for --duration seconds runs at the same time:
+  * --scanners threads posting /api/check_in as fast as the server answers
+    (or every --scan-interval seconds each);
+  * --dashboards threads polling /api/attendance/<id>?since=<cursor> and
+    /api/stats/<id> every --poll-interval seconds, as the dashboard does;
+  * --exporters threads downloading /api/export/attendance/<id> every
+    --export-interval seconds.
+Reports throughput and p50/p95/p99 latency per endpoint. --json saves the
+results (with the git commit) and --compare prints the change against an
+earlier results file. Afterwards the pool must have every connection back
+(a streamed response that leaks one fails the run); under gunicorn only the
+worker that answers the check is seen.
+
+Usage (from Backend/, against a disposable database):
+    python benchmarks/load_test.py --scanners 32 --dashboards 20 --duration 30 --json run.json
+    python benchmarks/load_test.py --server gunicorn --workers 4 --compare run.json
+"""
+import argparse
+import datetime
+import http.client
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+from database import DATABASE_URL  # noqa: E402
+from helpers import encrypt_data  # noqa: E402
+from name_index import search_tokens  # noqa: E402
+from partitions import purge_event_attendance  # noqa: E402
+
+PREFIX = 'LOAD-'
+NAMES = [('Juan', 'Dela Cruz'), ('Maria', 'Santos'), ('Jose', 'Reyes'), ('Ana', 'Bautista')]
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class Recorder:
+    """Latency samples and outcomes per endpoint, shared by every client thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, endpoint, seconds, status):
+        with self.lock:
+            entry = self.samples.setdefault(endpoint, {'latencies': [], 'statuses': {}})
+            entry['latencies'].append(seconds)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+
+    def summary(self, elapsed):
+        result = {}
+        for endpoint, entry in sorted(self.samples.items()):
+            ordered = sorted(entry['latencies'])
+            pct = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+            errors = sum(n for status, n in entry['statuses'].items() if status == 'error' or int(status) >= 500)
+            result[endpoint] = {
+                'requests': len(ordered),
+                'per_second': len(ordered) / elapsed,
+                'errors': errors,
+                'statuses': {str(k): v for k, v in entry['statuses'].items()},
+                'p50_ms': pct(0.50), 'p95_ms': pct(0.95), 'p99_ms': pct(0.99), 'max_ms': ordered[-1] * 1000,
+            }
+        return result
+
+
+def seed(conn, students):
+    cursor = conn.cursor()
+    pool = [(encrypt_data(first), encrypt_data(last), search_tokens(first, last)) for first, last in NAMES]
+    rows = []
+    for i in range(students):
+        first, last, tokens = pool[i % len(pool)]
+        rows.append((f"{PREFIX}{i:06d}", first, last, 'BENCH', '1st Year', f"L{i % 10}", tokens))
+    execute_values(cursor, """
+        INSERT INTO students (student_no, first_name, last_name, program, year_level, section, name_search)
+        VALUES %s ON CONFLICT DO NOTHING
+    """, rows, template='(%s, %s, %s, %s, %s, %s, %s::text[])')
+    cursor.execute("INSERT INTO events (name, date, am_cutoff) VALUES (%s, %s, '23:59') RETURNING id",
+                   (f"{PREFIX}event", datetime.date.today().isoformat()))
+    event_id = cursor.fetchone()['id']
+    cursor.execute("SELECT ensure_attendance_partition(%s)", (event_id,))
+    conn.commit()
+    return event_id, [row[0] for row in rows]
+
+
+def cleanup(conn, event_id):
+    conn.rollback()
+    cursor = conn.cursor()
+    if event_id is not None:
+        purge_event_attendance(cursor, event_id)
+        cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+    cursor.execute("DELETE FROM students WHERE student_no LIKE %s", (PREFIX + '%',))
+    conn.commit()
+
+
+def start_server(args):
+    """Returns (port, stop)."""
+    if args.server == 'werkzeug':
+        from app import app
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server.port, server.shutdown
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-k', 'gthread', '--threads', str(args.threads),
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=BACKEND)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            if proc.poll() is not None:
+                sys.exit("gunicorn exited during startup (is it installed?)")
+            time.sleep(0.2)
+
+    def stop():
+        proc.terminate()
+        proc.wait(timeout=30)
+    return port, stop
+
+
+def request(conn, recorder, endpoint, method, path, body=None):
+    """Sends one request, records its latency, returns the parsed JSON body (or None)."""
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    started = time.perf_counter()
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        payload = response.read()
+        recorder.add(endpoint, time.perf_counter() - started, response.status)
+    except (OSError, http.client.HTTPException):
+        recorder.add(endpoint, time.perf_counter() - started, 'error')
+        conn.close()
+        return None
+    if response.headers.get('Content-Type', '').startswith('application/json'):
+        return json.loads(payload)
+    return None
+
+
+def scanner(port, event_id, students, stop, recorder, interval):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while not stop.is_set():
+        request(conn, recorder, 'check_in', 'POST', '/api/check_in',
+                {'event_id': event_id, 'student_no': next(students)})
+        if interval:
+            stop.wait(interval)
+    conn.close()
+
+
+def dashboard(port, event_id, stop, recorder, interval):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    cursor = 0
+    while not stop.is_set():
+        changes = request(conn, recorder, 'attendance_delta', 'GET', f'/api/attendance/{event_id}?since={cursor}')
+        if changes:
+            cursor = changes['cursor']
+        request(conn, recorder, 'stats', 'GET', f'/api/stats/{event_id}')
+        stop.wait(interval)
+    conn.close()
+
+
+def exporter(port, event_id, stop, recorder, interval):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    while not stop.is_set():
+        request(conn, recorder, 'export_csv', 'GET', f'/api/export/attendance/{event_id}')
+        stop.wait(interval)
+    conn.close()
+
+
+def pool_in_use(port):
+    """Connections the serving worker still has checked out, from /api/admin/pool_stats."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request('GET', '/api/admin/pool_stats')
+        return json.loads(conn.getresponse().read())['in_use']
+    finally:
+        conn.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(endpoints, baseline=None):
+    print(f"{'endpoint':<18}{'requests':>9}{'req/s':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for endpoint, r in endpoints.items():
+        print(f"{endpoint:<18}{r['requests']:>9}{r['per_second']:>9.1f}{r['errors']:>8}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}")
+        old = (baseline or {}).get(endpoint)
+        if old:
+            change = lambda key: (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            print(f"{'  vs baseline':<18}{'':>9}{change('per_second'):>+8.0f}%{'':>8}"
+                  f"{change('p50_ms'):>+8.0f}%{change('p95_ms'):>+8.0f}%{change('p99_ms'):>+8.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=['werkzeug', 'gunicorn'], default='werkzeug')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--scanners', type=int, default=16)
+    parser.add_argument('--scan-interval', type=float, default=0.0, help='pause between one scanner\'s scans')
+    parser.add_argument('--dashboards', type=int, default=10)
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--exporters', type=int, default=1)
+    parser.add_argument('--export-interval', type=float, default=5.0)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='earlier --json results to compare against')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    event_id, stop_server = None, None
+    try:
+        event_id, student_nos = seed(conn, args.students)
+        port, stop_server = start_server(args)
+
+        # Each student is scanned IN once; after that scans come back "already in",
+        # which is still a full check-in round trip
+        lock = threading.Lock()
+        cycle = itertools.cycle(student_nos)
+        def next_student():
+            with lock:
+                return next(cycle)
+        students = iter(next_student, None)
+
+        recorder, stop = Recorder(), threading.Event()
+        threads = (
+            [threading.Thread(target=scanner, args=(port, event_id, students, stop, recorder, args.scan_interval))
+             for _ in range(args.scanners)] +
+            [threading.Thread(target=dashboard, args=(port, event_id, stop, recorder, args.poll_interval))
+             for _ in range(args.dashboards)] +
+            [threading.Thread(target=exporter, args=(port, event_id, stop, recorder, args.export_interval))
+             for _ in range(args.exporters)]
+        )
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        leaked = pool_in_use(port)
+    finally:
+        if stop_server:
+            stop_server()
+        cleanup(conn, event_id)
+        conn.close()
+
+    endpoints = recorder.summary(elapsed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        baseline = previous['endpoints']
+        print(f"Baseline: commit {previous.get('commit')} at {previous.get('timestamp')}")
+    print(f"server={args.server} scanners={args.scanners} dashboards={args.dashboards} "
+          f"exporters={args.exporters} students={args.students} elapsed={elapsed:.1f}s\n")
+    print_report(endpoints, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'config': vars(args),
+                'elapsed_s': elapsed,
+                'endpoints': endpoints,
+            }, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if leaked:
+        sys.exit(f"FAIL: {leaked} pooled connection(s) still checked out after every client finished.")
+
+
+if __name__ == '__main__':
+    main()
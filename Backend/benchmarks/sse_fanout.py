@@ -0,0 +1,128 @@
+"""
+SSE fan-out harness for /api/stream/attendance/<event_id>.
+
+Serves the app on a local threaded server, connects hundreds of simulated
+dashboards to the stream, then drives check-ins straight through
+attendance_check_in() and measures how long each one takes to reach every
+subscriber.
+
+Usage (from Backend/, against a disposable database):
+    python benchmarks/sse_fanout.py --subscribers 300 --scans 200
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app  # noqa: E402
+from database import DATABASE_URL  # noqa: E402
+
+PREFIX = 'SSE-'
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def subscriber(port, event_id, expected, latencies, ready, lock):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('GET', f'/api/stream/attendance/{event_id}')
+    response = conn.getresponse()
+    ready.release()
+
+    received = []
+    data = None
+    while len(received) < expected:
+        line = response.fp.readline()
+        if not line:
+            break
+        line = line.decode('utf-8').rstrip('\n')
+        if line.startswith('data: '):
+            data = json.loads(line[6:])
+        elif line == '' and data is not None:
+            if data.get('type') == 'check_in':
+                sent = datetime.fromisoformat(data['at'])
+                received.append((datetime.now() - sent).total_seconds())
+            data = None
+    conn.close()
+    with lock:
+        latencies.extend(received)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=300)
+    parser.add_argument('--scans', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=200, help='check-ins per second')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    cursor = conn.cursor()
+    student_nos = [f"{PREFIX}{i:05d}" for i in range(args.scans)]
+    execute_values(cursor, """
+        INSERT INTO students (student_no, first_name, last_name, program, year_level, section)
+        VALUES %s ON CONFLICT DO NOTHING
+    """, [(no, 'Fan', 'Out', 'BENCH', '1st Year', 'Z') for no in student_nos])
+    cursor.execute("INSERT INTO events (name, date, am_cutoff) VALUES (%s, %s, '23:59') RETURNING id",
+                   (f"{PREFIX}event", datetime.now().strftime('%Y-%m-%d')))
+    event_id = cursor.fetchone()['id']
+    conn.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    latencies, lock = [], threading.Lock()
+    ready = threading.Semaphore(0)
+    threads = [
+        threading.Thread(target=subscriber, args=(server.port, event_id, args.scans, latencies, ready, lock),
+                         daemon=True)
+        for _ in range(args.subscribers)
+    ]
+    try:
+        for t in threads:
+            t.start()
+        for _ in threads:
+            ready.acquire()
+        time.sleep(2)  # let the worker's LISTEN connection come up
+
+        started = time.perf_counter()
+        for student_no in student_nos:
+            cursor.execute("SELECT * FROM attendance_check_in(%s, %s, %s, 'IN', TRUE)",
+                           (event_id, student_no, datetime.now()))
+            conn.commit()
+            time.sleep(1 / args.rate)
+        for t in threads:
+            t.join(timeout=30)
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        cursor.execute("DELETE FROM attendance WHERE event_id = %s", (event_id,))
+        cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+        cursor.execute("DELETE FROM students WHERE student_no LIKE %s", (PREFIX + '%',))
+        conn.commit()
+        conn.close()
+
+    expected = args.subscribers * args.scans
+    ordered = sorted(latencies) or [0.0]
+    pct = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+    print(f"subscribers={args.subscribers} scans={args.scans} delivered={len(latencies)}/{expected} "
+          f"in {elapsed:.1f}s")
+    print(f"latency mean={statistics.mean(ordered) * 1000:.2f}ms p50={pct(0.50):.2f}ms "
+          f"p95={pct(0.95):.2f}ms p99={pct(0.99):.2f}ms max={ordered[-1] * 1000:.2f}ms")
+    if len(latencies) < expected:
+        sys.exit("FAIL: some check-ins were not delivered to every subscriber.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Cold-start profile: per-module import time and time to the first request.
+
+Each run starts a fresh interpreter with -X importtime, imports app, and
+serves one request through the Flask test client. The report gives median
+figures over the runs plus the slowest modules. With thresholds set, the
+exit status is 1 on a regression, so the script can run as a CI step:
+
+    python benchmarks/startup_profile.py --runs 5 --max-import-ms 400 \\
+        --max-first-request-ms 150 --json startup.json
+
+Modules listed in --forbid (by default the heavy optional dependencies that
+must stay lazy) fail the run if importing app pulls them in.
+
+Usage (from Backend/):
+    python benchmarks/startup_profile.py [--path /api/active_event] [--top 25]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FORBID = 'pandas,numpy,openpyxl,reportlab,cryptography'
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (served - imported) * 1000,
+    'status': response.status_code,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_once(path):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, path],
+                          cwd=BACKEND, capture_output=True, text=True,
+                          env={**os.environ, 'PYTHONPATH': BACKEND})
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        sys.exit(f"Startup run failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['process_ms'] = wall_ms
+    result['importtime'] = parse_importtime(proc.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/', help="request served as the first request")
+    parser.add_argument('--top', type=int, default=20, help="slowest modules to list")
+    parser.add_argument('--forbid', default=DEFAULT_FORBID,
+                        help="comma list of modules that must not load at startup ('' to disable)")
+    parser.add_argument('--max-import-ms', type=float)
+    parser.add_argument('--max-first-request-ms', type=float)
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args()
+
+    runs = [run_once(args.path) for _ in range(args.runs)]
+    summary = {key: statistics.median(r[key] for r in runs)
+               for key in ('import_ms', 'first_request_ms', 'process_ms')}
+
+    modules = {}
+    for r in runs:
+        for name, (self_us, cumulative_us) in r['importtime'].items():
+            modules.setdefault(name, ([], []))
+            modules[name][0].append(self_us)
+            modules[name][1].append(cumulative_us)
+    module_ms = {name: {'self_ms': statistics.median(s) / 1000, 'cumulative_ms': statistics.median(c) / 1000}
+                 for name, (s, c) in modules.items()}
+
+    print(f"Runs: {args.runs}   first request: GET {args.path} -> {runs[-1]['status']}")
+    print(f"  import app          {summary['import_ms']:8.1f} ms (median)")
+    print(f"  first request       {summary['first_request_ms']:8.1f} ms")
+    print(f"  process wall time   {summary['process_ms']:8.1f} ms (includes interpreter start)")
+    print(f"\nSlowest modules by self time (median of {args.runs}):")
+    print(f"  {'self ms':>9} {'cumul ms':>9}  module")
+    for name, t in sorted(module_ms.items(), key=lambda item: -item[1]['self_ms'])[:args.top]:
+        print(f"  {t['self_ms']:9.2f} {t['cumulative_ms']:9.2f}  {name}")
+
+    failures = []
+    loaded = set(runs[-1]['modules'])
+    for name in filter(None, (m.strip() for m in args.forbid.split(','))):
+        if name in loaded:
+            failures.append(f"{name} is imported at startup; keep it lazy")
+    if args.max_import_ms is not None and summary['import_ms'] > args.max_import_ms:
+        failures.append(f"import app took {summary['import_ms']:.1f} ms (limit {args.max_import_ms:.0f})")
+    if args.max_first_request_ms is not None and summary['first_request_ms'] > args.max_first_request_ms:
+        failures.append(f"first request took {summary['first_request_ms']:.1f} ms "
+                        f"(limit {args.max_first_request_ms:.0f})")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'path': args.path, 'runs': args.runs, **summary,
+                       'modules': module_ms, 'failures': failures}, f, indent=2)
+
+    if failures:
+        print("\nFAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    main()
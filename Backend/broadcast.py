@@ -0,0 +1,77 @@
+import json
+import os
+import queue
+import threading
+import pubsub
+from helpers import decrypt_data
+
+# attendance_check_in() publishes every successful scan on this channel
+CHECK_IN_CHANNEL = 'attendance_checkin'
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "256"))
+
+# A subscriber that sees this must refetch through /api/attendance/<id>?since=
+RESYNC = json.dumps({'type': 'resync'})
+
+_subscribers = {}  # event_id -> set of queue.Queue
+_lock = threading.Lock()
+
+def subscribe(event_id):
+    """Returns a queue that receives JSON strings for every check-in on event_id."""
+    q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _lock:
+        _subscribers.setdefault(event_id, set()).add(q)
+    pubsub.ensure_listener()
+    return q
+
+def unsubscribe(event_id, q):
+    with _lock:
+        queues = _subscribers.get(event_id)
+        if queues:
+            queues.discard(q)
+            if not queues:
+                del _subscribers[event_id]
+
+def subscriber_count():
+    with _lock:
+        return sum(len(queues) for queues in _subscribers.values())
+
+def _offer(q, message):
+    try:
+        q.put_nowait(message)
+    except queue.Full:
+        # Slow client: drop its backlog and tell it to catch up through the delta feed
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
+        q.put_nowait(RESYNC)
+
+def _on_check_in(payload):
+    if payload is None:
+        # The listener (re)connected and may have missed scans
+        with _lock:
+            targets = [q for queues in _subscribers.values() for q in queues]
+        for q in targets:
+            _offer(q, RESYNC)
+        return
+
+    scan = json.loads(payload)
+    with _lock:
+        targets = list(_subscribers.get(scan['event_id'], ()))
+    if not targets:
+        return
+
+    # Decrypted once per worker, then fanned out to every dashboard
+    message = json.dumps({
+        'type': 'check_in',
+        'event_id': scan['event_id'],
+        'student_no': scan['student_no'],
+        'student_name': f"{decrypt_data(scan['first_name'])} {decrypt_data(scan['last_name'])}",
+        'slot': scan['slot'],
+        'at': scan['at'],
+    })
+    for q in targets:
+        _offer(q, message)
+
+pubsub.subscribe(CHECK_IN_CHANNEL, _on_check_in)
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+import pubsub
+
+# Upper bound (seconds) on staleness if an invalidation notification is missed
+CACHE_TTL = float(os.getenv("CACHE_TTL", "30"))
+INVALIDATION_CHANNEL = 'cache_invalidate'
+
+class TTLCache:
+    """Small thread-safe key/value cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        """Returns the cached value for key, calling loader() on a miss. None is never cached."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        with self._lock:
+            # Skip the store if an invalidation ran while we were loading
+            if value is not None and generation == self._generation:
+                self._data[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._data), 'hits': self.hits, 'misses': self.misses, 'ttl': self.ttl}
+
+
+_events = TTLCache(CACHE_TTL)
+_settings = TTLCache(CACHE_TTL)
+_officers = TTLCache(CACHE_TTL)
+
+def get_event(cursor, event_id):
+    """Cached `events` row as a dict, or None if it does not exist."""
+    pubsub.ensure_listener()
+
+    def load():
+        cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    return _events.get(int(event_id), load)
+
+def get_setting(cursor, key, default=None):
+    """Cached value from the `settings` table."""
+    pubsub.ensure_listener()
+
+    def load():
+        cursor.execute("SELECT key, value FROM settings")
+        return {row['key']: row['value'] for row in cursor.fetchall()}
+
+    return _settings.get('all', load).get(key, default)
+
+def get_officer_session(username):
+    """Cached {token_generation, is_active, role} for an officer, or None if unknown."""
+    pubsub.ensure_listener()
+
+    def load():
+        from database import get_db_connection
+        cursor = get_db_connection().cursor()
+        try:
+            cursor.execute("SELECT token_generation, is_active, role FROM officers WHERE username = %s", (username,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            cursor.close()
+
+    return _officers.get(username, load)
+
+def invalidate_event(cursor, event_id):
+    """Drops an event from this worker's cache and notifies the others when the transaction commits."""
+    _events.invalidate(int(event_id))
+    pubsub.publish(cursor, INVALIDATION_CHANNEL, f"event:{int(event_id)}")
+
+def invalidate_settings(cursor):
+    _settings.invalidate()
+    pubsub.publish(cursor, INVALIDATION_CHANNEL, 'settings')
+
+def invalidate_officer(cursor, username):
+    """Call after bumping an officer's token_generation so every worker re-reads it."""
+    _officers.invalidate(username)
+    pubsub.publish(cursor, INVALIDATION_CHANNEL, f"officer:{username}")
+
+def invalidate_all(cursor):
+    """For bulk rewrites such as a restore: every worker drops every cached entry."""
+    _on_invalidate(None)
+    pubsub.publish(cursor, INVALIDATION_CHANNEL, 'all')
+
+def cache_stats():
+    return {'events': _events.stats(), 'settings': _settings.stats(), 'officers': _officers.stats()}
+
+def _on_invalidate(payload):
+    if payload is None or payload == 'all':
+        _events.invalidate()
+        _settings.invalidate()
+        _officers.invalidate()
+    elif payload == 'settings':
+        _settings.invalidate()
+    elif payload.startswith('event:'):
+        _events.invalidate(int(payload.split(':', 1)[1]))
+    elif payload.startswith('officer:'):
+        _officers.invalidate(payload.split(':', 1)[1])
+
+pubsub.subscribe(INVALIDATION_CHANNEL, _on_invalidate)
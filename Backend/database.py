@@ -1,179 +1,231 @@
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import extensions
 from flask import g, current_app
-from werkzeug.security import generate_password_hash
 from dotenv import load_dotenv
+from migrations import migrate
+from metrics import InstrumentedCursor
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# --- CONNECTION POOL SETTINGS ---
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Idle connections older than this (seconds) are pinged before being handed out
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """Thread-safe PostgreSQL connection pool owned by a single process."""
+
+    def __init__(self, dsn, minconn, maxconn, timeout, healthcheck_after):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._idle = deque()  # (connection, returned_at)
+        self._in_use = 0
+
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.discarded = 0
+        self._checkout_total = 0.0
+        self._checkout_max = 0.0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, cursor_factory=InstrumentedCursor)
+        with self._lock:
+            self.connects += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_alive(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, returned_at = self._idle.pop()
+            if conn.closed:
+                self._discard(conn)
+                continue
+            if time.monotonic() - returned_at > self.healthcheck_after and not self._is_alive(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def getconn(self):
+        """Checks out a connection, waiting up to `timeout` seconds for a free slot."""
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise PoolTimeout(f"No database connection available within {self.timeout:g}s.")
+
+        try:
+            conn = self._take_idle() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self._in_use += 1
+            self.checkouts += 1
+            self._checkout_total += elapsed
+            self._checkout_max = max(self._checkout_max, elapsed)
+        return conn
+
+    def putconn(self, conn):
+        """Returns a connection to the pool, rolling back any unfinished transaction."""
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        except Exception:
+            self._discard(conn)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': self.pid,
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'discarded': self.discarded,
+                'avg_checkout_ms': round(self._checkout_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_checkout_ms': round(self._checkout_max * 1000, 3),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Pools inherited across a fork. They stay referenced so their connections
+# are never closed or collected in the child: closing one sends Terminate on
+# a socket the parent still uses and ends the parent's session.
+_abandoned = []
+
+def get_pool():
+    """Returns this process's pool, rebuilding it after a fork (e.g. gunicorn workers)."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            if _pool is not None:
+                _abandoned.append(_pool)
+            _pool = ConnectionPool(DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX,
+                                   DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK_AFTER)
+        return _pool
+
+def get_pool_stats():
+    """Snapshot of the current worker's pool counters."""
+    return get_pool().stats()
+
 def get_db_connection():
-    """Opens a new PostgreSQL connection using the URL from .env."""
+    """Checks out a pooled PostgreSQL connection for the current request."""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = psycopg2.connect(
-            DATABASE_URL, 
-            cursor_factory=RealDictCursor
-        )
+        db = g._database = get_pool().getconn()
     return db
 
+@contextmanager
+def stream_connection():
+    """
+    Checks out a pooled connection for a streamed response body. Flask returns
+    the request's connection to the pool when the view returns, before the
+    body is generated, so generators must not use get_db_connection().
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)  # also ends any transaction the stream left open
+
 def close_connection(exception):
-    """Closes the database connection at the end of the request."""
-    db = getattr(g, '_database', None)
+    """Returns the request's connection to the pool at the end of the request."""
+    db = g.pop('_database', None)
     if db is not None:
-        db.close()
+        get_pool().putconn(db)
 
 def init_db(app):
-    """Initializes the PostgreSQL schema and populates initial data."""
+    """
+    Brings the PostgreSQL schema up to date by applying pending migrations (see
+    migrations.py), then fills in the name index for students that predate it.
+    """
+    from name_index import backfill_name_index
+
     with app.app_context():
         db = get_db_connection()
-        cursor = db.cursor()
-        
-        # Tables
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS students (
-                student_no TEXT PRIMARY KEY,
-                first_name TEXT NOT NULL,
-                middle_name TEXT,
-                last_name TEXT NOT NULL,
-                program TEXT,
-                year_level TEXT,
-                section TEXT
-            );
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS events (
-                id SERIAL PRIMARY KEY,
-                name TEXT NOT NULL,
-                date TEXT NOT NULL,
-                am_cutoff TEXT DEFAULT '13:00'
-            );
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS attendance (
-                id SERIAL PRIMARY KEY,
-                event_id INTEGER NOT NULL REFERENCES events(id),
-                student_no TEXT NOT NULL REFERENCES students(student_no),
-                am_in TIMESTAMPTZ, 
-                am_out TIMESTAMPTZ, 
-                pm_in TIMESTAMPTZ, 
-                pm_out TIMESTAMPTZ,
-                status TEXT DEFAULT 'Absent'
-            );
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS officers (
-                id SERIAL PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT DEFAULT 'officer',
-                is_active BOOLEAN DEFAULT TRUE,
-                session_token TEXT,
-                last_login TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)        
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY, 
-                value TEXT
-            );
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sections (
-                id SERIAL PRIMARY KEY,
-                program TEXT NOT NULL,
-                year_level TEXT NOT NULL,
-                name TEXT NOT NULL,
-                UNIQUE (program, year_level, name)
-            );
-        """)
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS audit_logs (
-                id SERIAL PRIMARY KEY,
-                actor_username TEXT,
-                action TEXT,
-                details TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_student_no ON attendance(student_no);")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_event_id ON attendance(event_id);")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_students_full_name ON students(last_name, first_name);")     
-           
-        # Sections
-        mock_sections = [('BSCS', '3rd Year', 'A'), ('BSIS', '3rd Year', 'B'), 
-                         ('BSIT', '4th Year', 'C'), ('BSEMC', '1st Year', 'A')]
-        for prog, year, name in mock_sections:
-            cursor.execute("""
-                INSERT INTO sections (program, year_level, name) 
-                VALUES (%s, %s, %s) 
-                ON CONFLICT DO NOTHING
-            """, (prog, year, name))
-
-        cursor.execute("INSERT INTO settings (key, value) VALUES ('active_event_id', '1') ON CONFLICT DO NOTHING")
-        
-        # Students
-        cursor.execute("""
-            INSERT INTO students (student_no, first_name, middle_name, last_name, program, year_level, section) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s) 
-            ON CONFLICT DO NOTHING
-        """, ('23-00951', 'Rio', 'P', 'Pana', 'BSCS', '3rd Year', 'A'))
-
-        env_officer_pw = os.getenv('OFFICER_PASSWORD', 'default_officer_pass')
-        env_admin_pw = os.getenv('ADMIN_PASSWORD', 'default_admin_pass')
-
-        # Officers (Check existence before inserting)
-        cursor.execute("SELECT 1 FROM officers WHERE username = %s", ('officer',))
-        if not cursor.fetchone():
-             hashed_pw = generate_password_hash(env_officer_pw)
-             cursor.execute("INSERT INTO officers (username, password_hash, role) VALUES (%s, %s, %s)", 
-                            ('officer', hashed_pw, 'officer'))
-             
-        cursor.execute("SELECT 1 FROM officers WHERE username = %s", ('admin',))
-        if not cursor.fetchone():
-             hashed_admin_pw = generate_password_hash(env_admin_pw)
-             cursor.execute("INSERT INTO officers (username, password_hash, role) VALUES (%s, %s, %s)", 
-                            ('admin', hashed_admin_pw, 'admin'))
-             
-    # Soft Delete Schema Updates 
-        cursor.execute("ALTER TABLE events ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ DEFAULT NULL;")
-        cursor.execute("ALTER TABLE attendance ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ DEFAULT NULL;")
-
-        # Create the cascade function
-        cursor.execute("""
-            CREATE OR REPLACE FUNCTION cascade_soft_delete_event()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                IF NEW.deleted_at IS NOT NULL AND OLD.deleted_at IS NULL THEN
-                    UPDATE attendance SET deleted_at = NEW.deleted_at WHERE event_id = NEW.id;
-                ELSIF NEW.deleted_at IS NULL AND OLD.deleted_at IS NOT NULL THEN
-                    UPDATE attendance SET deleted_at = NULL WHERE event_id = NEW.id;
-                END IF;
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql;
-        """)
-
-        # Attach the trigger
-        cursor.execute("""
-            DROP TRIGGER IF EXISTS trigger_cascade_soft_delete ON events;
-            CREATE TRIGGER trigger_cascade_soft_delete
-            AFTER UPDATE OF deleted_at ON events
-            FOR EACH ROW
-            EXECUTE FUNCTION cascade_soft_delete_event();
-        """)
-
-        cursor.execute("ALTER TABLE events ADD COLUMN IF NOT EXISTS attendance_mode TEXT DEFAULT 'IN';")
-
-        db.commit() 
-        cursor.close()
-        print("PostgreSQL Database initialized.")
\ No newline at end of file
+        applied = migrate(db)
+        if applied:
+            print(f"PostgreSQL Database initialized ({len(applied)} migration(s) applied).")
+        else:
+            print("PostgreSQL Database schema is up to date.")
+        backfilled = backfill_name_index(db)
+        if backfilled:
+            print(f"Name index filled in for {backfilled} existing student(s).")
@@ -1,80 +1,146 @@
 import os
+import threading
+import time
+from functools import lru_cache
 import psycopg2
-from cryptography.fernet import Fernet
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 from database import get_db_connection
+from cache import get_officer_session
+from audit import get_writer
+from metrics import record_crypto
 
 # --- CONFIGURATION (Production Ready) ---
 # Retrieve the key securely from the environment
 ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')
+# Max number of decrypted values kept in memory (roughly 400 bytes each). Listings
+# decrypt three names per student, so this must exceed 3x the roster or a full
+# pass evicts its own entries before they are reused; the default fits 20k students.
+DECRYPT_CACHE_SIZE = int(os.getenv('DECRYPT_CACHE_SIZE', '60000'))
 
-cipher = None
-if ENCRYPTION_KEY:
-    try:
-        # Ensure the key is in bytes format
-        cipher = Fernet(ENCRYPTION_KEY.encode('utf-8'))
-    except Exception as e:
-        print(f"CRITICAL: Invalid ENCRYPTION_KEY format. {e}")
-else:
-    print("SECURITY WARNING: ENCRYPTION_KEY environment variable is missing! Encryption disabled.")
+# Officer session tokens are signed with SECRET_KEY and expire after SESSION_MAX_AGE seconds
+SECRET_KEY = os.getenv('SECRET_KEY')
+SESSION_MAX_AGE = int(os.getenv('SESSION_MAX_AGE', str(12 * 60 * 60)))
+
+# A per-process random key would differ between gunicorn workers and across
+# restarts, so tokens signed by one worker would be rejected by the next
+if not SECRET_KEY:
+    raise RuntimeError("SECRET_KEY environment variable is missing; refusing to start.")
+_session_serializer = URLSafeTimedSerializer(SECRET_KEY, salt='officer-session')
+
+# Built on first use so cold starts skip loading cryptography; None when there is no usable key
+_UNSET = object()
+_cipher = _UNSET
+_cipher_lock = threading.Lock()
+
+def set_encryption_key(key):
+    """(Re)sets the Fernet key and flushes every plaintext cached under the old key."""
+    global _cipher, ENCRYPTION_KEY
+    with _cipher_lock:
+        ENCRYPTION_KEY = key
+        _cipher = _UNSET
+        _decrypt_cached.cache_clear()
+    if not key:
+        print("SECURITY WARNING: ENCRYPTION_KEY environment variable is missing! Encryption disabled.")
+
+def _get_cipher():
+    global _cipher
+    cipher = _cipher
+    if cipher is not _UNSET:
+        return cipher
+    with _cipher_lock:
+        if _cipher is _UNSET:
+            cipher = None
+            if ENCRYPTION_KEY:
+                from cryptography.fernet import Fernet
+                try:
+                    # Ensure the key is in bytes format
+                    cipher = Fernet(ENCRYPTION_KEY.encode('utf-8'))
+                except Exception as e:
+                    print(f"CRITICAL: Invalid ENCRYPTION_KEY format. {e}")
+            _cipher = cipher
+        return _cipher
 
 # --- ENCRYPTION TOOLS --- 
 def encrypt_data(data):
+    cipher = _get_cipher()
     if not data or cipher is None: return data
+    started = time.perf_counter()
     try:
         return cipher.encrypt(data.encode('utf-8')).decode('utf-8')
     except Exception as e:
         print(f"Encryption error: {e}")
         return data
+    finally:
+        record_crypto('encrypt', time.perf_counter() - started)
 
 def decrypt_data(data):
-    if not data or cipher is None: return data
+    if not data or _get_cipher() is None: return data
     
     # If the data doesn't look like Fernet (doesn't start with gAAAA), return it as-is
     if not str(data).startswith('gAAAA'):
         return data
 
+    # Fernet ciphertexts are unique per encryption, so the ciphertext itself is the cache key
     try:
-        return cipher.decrypt(data.encode('utf-8')).decode('utf-8')
+        return _decrypt_cached(data)
     except Exception as e:
         # We print the error so it shows up in Render Logs, but return a fallback string
         print(f"Decryption error on payload {data[:15]}... : {e}")
         return "[Decryption Failed]"
 
+# Raises on bad ciphertext: lru_cache does not keep exceptions, so a failure
+# (e.g. under a key that has since been fixed) is retried on the next call
+@lru_cache(maxsize=DECRYPT_CACHE_SIZE)
+def _decrypt_cached(data):
+    started = time.perf_counter()
+    try:
+        return _get_cipher().decrypt(data.encode('utf-8')).decode('utf-8')
+    finally:
+        record_crypto('decrypt', time.perf_counter() - started)
+
+def decrypt_cache_stats():
+    info = _decrypt_cached.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'entries': info.currsize, 'max_entries': info.maxsize}
+
+set_encryption_key(ENCRYPTION_KEY)
+
 def log_action(actor, action, details):
-    """Writes system events to the audit_logs table using Postgres syntax."""
-    db = get_db_connection()
-    cursor = db.cursor() # Required for PostgreSQL
+    """
+    Queues an audit_logs entry for the background writer (see audit.py). Call it
+    after the caller's commit: the entry is written whether or not that commits.
+    """
+    get_writer().log(actor, action, details)
+
+def issue_session_token(username, role, generation):
+    """Signed, expiring session token; validating it needs no database round trip."""
+    return _session_serializer.dumps({'u': username, 'r': role, 'g': generation})
+
+def get_session_claims(client_token):
+    """
+    Returns {'username', 'role'} for a valid token, else None. A token dies when it
+    expires, when its officer is suspended, or when their token_generation is bumped
+    (revocation, role change), which workers learn about through cache invalidation.
+    """
+    if not client_token:
+        return None
     try:
-        cursor.execute(
-            "INSERT INTO audit_logs (actor_username, action, details) VALUES (%s, %s, %s)", 
-            (actor, action, details)
-        )
-        db.commit()
+        claims = _session_serializer.loads(client_token, max_age=SESSION_MAX_AGE)
+    except BadSignature:
+        return None
+
+    try:
+        officer = get_officer_session(claims['u'])
     except Exception as e:
-        db.rollback()
-        print(f"Failed to write audit log: {e}")
-    finally:
-        cursor.close()
+        print(f"Session check error: {e}")
+        return None
+
+    if not officer or not officer['is_active'] or officer['token_generation'] != claims['g']:
+        return None
+    return {'username': claims['u'], 'role': officer['role']}
 
 def is_session_valid(username, client_token):
-    """Verifies session tokens using Postgres %s placeholders."""
+    """Verifies that client_token is a live session token belonging to username."""
     if not username or not client_token:
         return False
-        
-    db = get_db_connection() 
-    cursor = db.cursor() 
-    try:
-        cursor.execute(
-            "SELECT session_token FROM officers WHERE username = %s", 
-            (username,)
-        )
-        user = cursor.fetchone()
-
-        if user and user[0] and user[0] == client_token:
-            return True
-    except Exception as e:
-        print(f"Session check error: {e}")
-    finally:
-        cursor.close()
-        
-    return False
\ No newline at end of file
+    claims = get_session_claims(client_token)
+    return bool(claims and claims['username'] == username)
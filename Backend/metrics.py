@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from psycopg2.extras import RealDictCursor
+from flask import request
+import slow_queries
+from slow_queries import SLOW_QUERY_SECONDS
+
+# Per-endpoint request, SQL and encryption metrics, served in Prometheus text
+# format by /api/admin/metrics. Counters live in this process only, so under
+# gunicorn each worker reports its own (series carry a `worker` label).
+# A request is measured until its view returns; work done later while a
+# streamed body is generated is not charged to it.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ('1', 'true', 'yes', 'on')
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Work done by the request being served in this context, or None outside one
+_current = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+_series = {}  # (endpoint, method, status) -> Series
+
+
+class RequestStats:
+    """What one request did; folded into its Series when the request ends."""
+    __slots__ = ('started', 'status', 'statements', 'db_seconds', 'rows',
+                 'encrypts', 'encrypt_seconds', 'decrypts', 'decrypt_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.status = None
+        self.statements = self.rows = self.encrypts = self.decrypts = 0
+        self.db_seconds = self.encrypt_seconds = self.decrypt_seconds = 0.0
+
+
+class Series:
+    """Running totals for one (endpoint, method, status)."""
+
+    def __init__(self):
+        self.requests = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.seconds = 0.0
+        self.statements = self.rows = self.encrypts = self.decrypts = 0
+        self.db_seconds = self.encrypt_seconds = self.decrypt_seconds = 0.0
+
+    def add(self, stats, elapsed):
+        self.requests += 1
+        self.seconds += elapsed
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.buckets[i] += 1
+                break
+        self.statements += stats.statements
+        self.db_seconds += stats.db_seconds
+        self.rows += stats.rows
+        self.encrypts += stats.encrypts
+        self.encrypt_seconds += stats.encrypt_seconds
+        self.decrypts += stats.decrypts
+        self.decrypt_seconds += stats.decrypt_seconds
+
+
+class InstrumentedCursor(RealDictCursor):
+    """
+    RealDictCursor that charges statement count, database time and rows to the
+    current request. Rows are counted when they arrive: at execute time for
+    ordinary cursors, on each fetch for named (server-side) ones. Statements
+    slower than SLOW_QUERY_MS go to the slow-query log (slow_queries.py).
+    """
+
+    def execute(self, query, vars=None):
+        stats = _current.get()
+        started = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - started
+            if stats is not None:
+                stats.statements += 1
+                stats.db_seconds += elapsed
+                if self.name is None and self.description is not None and self.rowcount > 0:
+                    stats.rows += self.rowcount
+        # Named cursors only DECLARE here; their time goes to the fetches
+        if elapsed >= SLOW_QUERY_SECONDS and self.name is None:
+            slow_queries.record(self, query, vars, elapsed)
+        return result
+
+    def executemany(self, query, vars_list):
+        stats = _current.get()
+        if stats is None:
+            return super().executemany(query, vars_list)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            stats.statements += 1
+            stats.db_seconds += time.perf_counter() - started
+
+    def copy_expert(self, sql, file, size=8192):
+        stats = _current.get()
+        if stats is None:
+            return super().copy_expert(sql, file, size)
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            stats.statements += 1
+            stats.db_seconds += time.perf_counter() - started
+
+    def _timed_fetch(self, fetch, *args):
+        stats = _current.get()
+        if stats is None or self.name is None:
+            return fetch(*args)
+        started = time.perf_counter()
+        rows = fetch(*args)
+        stats.db_seconds += time.perf_counter() - started
+        stats.rows += len(rows) if isinstance(rows, list) else int(rows is not None)
+        return rows
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+def record_crypto(operation, seconds):
+    """Charges one encrypt/decrypt ('encrypt' or 'decrypt') to the current request."""
+    stats = _current.get()
+    if stats is None:
+        return
+    if operation == 'encrypt':
+        stats.encrypts += 1
+        stats.encrypt_seconds += seconds
+    else:
+        stats.decrypts += 1
+        stats.decrypt_seconds += seconds
+
+
+def _start_request():
+    _current.set(RequestStats())
+
+def _record_status(response):
+    stats = _current.get()
+    if stats is not None:
+        stats.status = response.status_code
+    return response
+
+def _finish_request(exception):
+    stats = _current.get()
+    if stats is None:
+        return
+    _current.set(None)
+    elapsed = time.perf_counter() - stats.started
+    # Unmatched URLs share one series instead of one per path
+    endpoint = request.endpoint or 'unmatched'
+    status = stats.status or (500 if exception is not None else 200)
+    key = (endpoint, request.method, str(status))
+    with _lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = Series()
+        series.add(stats, elapsed)
+
+def init_app(app):
+    """Starts collecting metrics for every request the app serves (unless METRICS_ENABLED is off)."""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_request)
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+def render_prometheus():
+    """Every series in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        snapshot = {key: (s.requests, list(s.buckets), s.seconds, s.statements, s.db_seconds, s.rows,
+                          s.encrypts, s.encrypt_seconds, s.decrypts, s.decrypt_seconds)
+                    for key, s in sorted(_series.items())}
+    worker = os.getpid()
+
+    lines = [
+        '# HELP ams_http_requests_total Requests served, by endpoint, method and status.',
+        '# TYPE ams_http_requests_total counter',
+    ]
+    for (endpoint, method, status), values in snapshot.items():
+        lines.append(f'ams_http_requests_total{{{_labels(worker=worker, endpoint=endpoint, method=method, status=status)}}} {values[0]}')
+
+    lines += [
+        '# HELP ams_http_request_duration_seconds Time from the start of a request until its view returns.',
+        '# TYPE ams_http_request_duration_seconds histogram',
+    ]
+    for (endpoint, method, status), values in snapshot.items():
+        labels = _labels(worker=worker, endpoint=endpoint, method=method, status=status)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, values[1]):
+            cumulative += count
+            lines.append(f'ams_http_request_duration_seconds_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        lines.append(f'ams_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {values[0]}')
+        lines.append(f'ams_http_request_duration_seconds_sum{{{labels}}} {values[2]:.6f}')
+        lines.append(f'ams_http_request_duration_seconds_count{{{labels}}} {values[0]}')
+
+    counters = (
+        ('ams_db_statements_total', 'SQL statements executed.', 3, 'd'),
+        ('ams_db_seconds_total', 'Time spent waiting on the database.', 4, '.6f'),
+        ('ams_db_rows_total', 'Rows returned by the database.', 5, 'd'),
+        ('ams_encrypt_operations_total', 'Values encrypted.', 6, 'd'),
+        ('ams_encrypt_seconds_total', 'Time spent encrypting.', 7, '.6f'),
+        ('ams_decrypt_operations_total', 'Values decrypted (decrypted-name cache misses only).', 8, 'd'),
+        ('ams_decrypt_seconds_total', 'Time spent decrypting.', 9, '.6f'),
+    )
+    for name, help_text, index, fmt in counters:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (endpoint, method, status), values in snapshot.items():
+            labels = _labels(worker=worker, endpoint=endpoint, method=method, status=status)
+            lines.append(f'{name}{{{labels}}} {values[index]:{fmt}}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,914 @@
+import os
+import time
+from werkzeug.security import generate_password_hash
+from partitions import ATTENDANCE_PARTITIONED, install_partition_functions, migrate_attendance_partitions
+
+# Versioned schema steps. Each step runs once per database, in version order,
+# and is recorded in schema_migrations; a started app only reads that table.
+# Steps must stay idempotent (IF NOT EXISTS / CREATE OR REPLACE) because
+# databases created before schema_migrations existed replay all of them once.
+# Never edit a released step: append a new version instead.
+
+# pg_advisory_lock key shared by every process that migrates this database
+MIGRATION_LOCK_KEY = 7_310_411
+
+# Attached to attendance by the steps below, and again after the table is
+# rebuilt by the partitioning conversion
+ATTENDANCE_STAMP_TRIGGER = """
+    DROP TRIGGER IF EXISTS trigger_stamp_attendance_change ON attendance;
+    CREATE TRIGGER trigger_stamp_attendance_change
+    BEFORE INSERT OR UPDATE ON attendance
+    FOR EACH ROW
+    EXECUTE FUNCTION stamp_attendance_change();
+"""
+ATTENDANCE_STATS_TRIGGERS = """
+    DROP TRIGGER IF EXISTS trigger_attendance_stats ON attendance;
+    CREATE TRIGGER trigger_attendance_stats
+    AFTER INSERT OR UPDATE OR DELETE ON attendance
+    FOR EACH ROW
+    EXECUTE FUNCTION track_attendance_stats();
+
+    DROP TRIGGER IF EXISTS trigger_attendance_stats_truncate ON attendance;
+    CREATE TRIGGER trigger_attendance_stats_truncate
+    AFTER TRUNCATE ON attendance
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION clear_attendance_stats();
+"""
+
+
+def _base_schema(cursor):
+    # Tables
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS students (
+            student_no TEXT PRIMARY KEY,
+            first_name TEXT NOT NULL,
+            middle_name TEXT,
+            last_name TEXT NOT NULL,
+            program TEXT,
+            year_level TEXT,
+            section TEXT
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            date TEXT NOT NULL,
+            am_cutoff TEXT DEFAULT '13:00'
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attendance (
+            id SERIAL PRIMARY KEY,
+            event_id INTEGER NOT NULL REFERENCES events(id),
+            student_no TEXT NOT NULL REFERENCES students(student_no),
+            am_in TIMESTAMPTZ, 
+            am_out TIMESTAMPTZ, 
+            pm_in TIMESTAMPTZ, 
+            pm_out TIMESTAMPTZ,
+            status TEXT DEFAULT 'Absent'
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS officers (
+            id SERIAL PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT DEFAULT 'officer',
+            is_active BOOLEAN DEFAULT TRUE,
+            session_token TEXT,
+            last_login TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)        
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY, 
+            value TEXT
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sections (
+            id SERIAL PRIMARY KEY,
+            program TEXT NOT NULL,
+            year_level TEXT NOT NULL,
+            name TEXT NOT NULL,
+            UNIQUE (program, year_level, name)
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id SERIAL PRIMARY KEY,
+            actor_username TEXT,
+            action TEXT,
+            details TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_student_no ON attendance(student_no);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_event_id ON attendance(event_id);")
+
+    # Sections
+    mock_sections = [('BSCS', '3rd Year', 'A'), ('BSIS', '3rd Year', 'B'), 
+                     ('BSIT', '4th Year', 'C'), ('BSEMC', '1st Year', 'A')]
+    for prog, year, name in mock_sections:
+        cursor.execute("""
+            INSERT INTO sections (program, year_level, name) 
+            VALUES (%s, %s, %s) 
+            ON CONFLICT DO NOTHING
+        """, (prog, year, name))
+
+    cursor.execute("INSERT INTO settings (key, value) VALUES ('active_event_id', '1') ON CONFLICT DO NOTHING")
+
+    # Students
+    cursor.execute("""
+        INSERT INTO students (student_no, first_name, middle_name, last_name, program, year_level, section) 
+        VALUES (%s, %s, %s, %s, %s, %s, %s) 
+        ON CONFLICT DO NOTHING
+    """, ('23-00951', 'Rio', 'P', 'Pana', 'BSCS', '3rd Year', 'A'))
+
+    env_officer_pw = os.getenv('OFFICER_PASSWORD', 'default_officer_pass')
+    env_admin_pw = os.getenv('ADMIN_PASSWORD', 'default_admin_pass')
+
+    # Officers (Check existence before inserting)
+    cursor.execute("SELECT 1 FROM officers WHERE username = %s", ('officer',))
+    if not cursor.fetchone():
+         hashed_pw = generate_password_hash(env_officer_pw)
+         cursor.execute("INSERT INTO officers (username, password_hash, role) VALUES (%s, %s, %s)", 
+                        ('officer', hashed_pw, 'officer'))
+
+    cursor.execute("SELECT 1 FROM officers WHERE username = %s", ('admin',))
+    if not cursor.fetchone():
+         hashed_admin_pw = generate_password_hash(env_admin_pw)
+         cursor.execute("INSERT INTO officers (username, password_hash, role) VALUES (%s, %s, %s)", 
+                        ('admin', hashed_admin_pw, 'admin'))
+
+
+def _soft_delete(cursor):
+    cursor.execute("ALTER TABLE events ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ DEFAULT NULL;")
+    cursor.execute("ALTER TABLE attendance ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ DEFAULT NULL;")
+
+    # Create the cascade function
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION cascade_soft_delete_event()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF NEW.deleted_at IS NOT NULL AND OLD.deleted_at IS NULL THEN
+                UPDATE attendance SET deleted_at = NEW.deleted_at WHERE event_id = NEW.id;
+            ELSIF NEW.deleted_at IS NULL AND OLD.deleted_at IS NOT NULL THEN
+                UPDATE attendance SET deleted_at = NULL WHERE event_id = NEW.id;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Attach the trigger
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS trigger_cascade_soft_delete ON events;
+        CREATE TRIGGER trigger_cascade_soft_delete
+        AFTER UPDATE OF deleted_at ON events
+        FOR EACH ROW
+        EXECUTE FUNCTION cascade_soft_delete_event();
+    """)
+
+
+def _event_mode_and_token_generation(cursor):
+    cursor.execute("ALTER TABLE events ADD COLUMN IF NOT EXISTS attendance_mode TEXT DEFAULT 'IN';")
+    # Bumped to revoke every signed session token an officer holds
+    cursor.execute("ALTER TABLE officers ADD COLUMN IF NOT EXISTS token_generation INTEGER NOT NULL DEFAULT 0;")
+
+
+def _unique_attendance(cursor):
+    # One attendance row per student per event: merge any duplicates left by
+    # concurrent scans before the unique index existed, keeping the oldest row
+    cursor.execute("""
+        UPDATE attendance keep
+        SET am_in = d.am_in, am_out = d.am_out, pm_in = d.pm_in, pm_out = d.pm_out,
+            status = d.status
+        FROM (
+            SELECT MIN(id) AS id, MIN(am_in) AS am_in, MIN(am_out) AS am_out,
+                   MIN(pm_in) AS pm_in, MIN(pm_out) AS pm_out, MAX(status) AS status
+            FROM attendance
+            GROUP BY event_id, student_no
+            HAVING COUNT(*) > 1
+        ) d
+        WHERE keep.id = d.id;
+    """)
+    cursor.execute("""
+        DELETE FROM attendance dup
+        USING attendance keep
+        WHERE dup.event_id = keep.event_id AND dup.student_no = keep.student_no
+          AND dup.id > keep.id;
+    """)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_event_student ON attendance(event_id, student_no);")
+
+
+def _attendance_change_seq(cursor):
+    # Change sequence for the incremental live-log feed (?since= on /api/attendance)
+    cursor.execute("CREATE SEQUENCE IF NOT EXISTS attendance_change_seq;")
+    cursor.execute("ALTER TABLE attendance ADD COLUMN IF NOT EXISTS change_seq BIGINT;")
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION stamp_attendance_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.change_seq := nextval('attendance_change_seq');
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute(ATTENDANCE_STAMP_TRIGGER)
+    cursor.execute("UPDATE attendance SET change_seq = nextval('attendance_change_seq') WHERE change_seq IS NULL;")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_event_change ON attendance(event_id, change_seq);")
+
+
+def _name_index(cursor):
+    # Blind-index columns for sorting/searching encrypted names (see name_index.py).
+    # The old (last_name, first_name) index only ordered ciphertext.
+    cursor.execute("ALTER TABLE students ADD COLUMN IF NOT EXISTS name_sort BIGINT;")
+    cursor.execute("ALTER TABLE students ADD COLUMN IF NOT EXISTS name_search TEXT[];")
+    cursor.execute("DROP INDEX IF EXISTS idx_students_full_name;")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_students_name_sort ON students(name_sort, student_no);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_students_section_sort ON students(program, year_level, section, name_sort);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_students_name_search ON students USING GIN (name_search);")
+    # Existing rows are filled in after startup by name_index.backfill_name_index(),
+    # outside the migration lock
+
+
+def _attendance_stats(cursor):
+    # Per-event counters for /api/stats, kept current by triggers instead of COUNT(*)
+    cursor.execute("SELECT to_regclass('event_stats') IS NULL AS missing")
+    stats_missing = cursor.fetchone()['missing']
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS event_stats (
+            event_id INTEGER PRIMARY KEY REFERENCES events(id) ON DELETE CASCADE,
+            checked_in INTEGER NOT NULL DEFAULT 0,
+            am_in INTEGER NOT NULL DEFAULT 0,
+            am_out INTEGER NOT NULL DEFAULT 0,
+            pm_in INTEGER NOT NULL DEFAULT 0,
+            pm_out INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS event_section_stats (
+            event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+            program TEXT NOT NULL,
+            year_level TEXT NOT NULL,
+            section TEXT NOT NULL,
+            checked_in INTEGER NOT NULL DEFAULT 0,
+            am_in INTEGER NOT NULL DEFAULT 0,
+            am_out INTEGER NOT NULL DEFAULT 0,
+            pm_in INTEGER NOT NULL DEFAULT 0,
+            pm_out INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (event_id, program, year_level, section)
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS roster_stats (
+            program TEXT NOT NULL,
+            year_level TEXT NOT NULL,
+            section TEXT NOT NULL,
+            students INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (program, year_level, section)
+        );
+    """)
+
+    # Adds one attendance row's contribution (p_sign = 1) or removes it (-1)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION bump_event_stats(
+            p_event_id INTEGER, p_student_no TEXT, p_sign INTEGER,
+            p_am_in INTEGER, p_am_out INTEGER, p_pm_in INTEGER, p_pm_out INTEGER,
+            p_checked_in INTEGER
+        )
+        RETURNS VOID AS $$
+        BEGIN
+            INSERT INTO event_stats AS es (event_id, checked_in, am_in, am_out, pm_in, pm_out)
+            VALUES (p_event_id, p_sign * p_checked_in, p_sign * p_am_in, p_sign * p_am_out,
+                    p_sign * p_pm_in, p_sign * p_pm_out)
+            ON CONFLICT (event_id) DO UPDATE SET
+                checked_in = es.checked_in + EXCLUDED.checked_in,
+                am_in = es.am_in + EXCLUDED.am_in,
+                am_out = es.am_out + EXCLUDED.am_out,
+                pm_in = es.pm_in + EXCLUDED.pm_in,
+                pm_out = es.pm_out + EXCLUDED.pm_out;
+
+            INSERT INTO event_section_stats AS ss
+                (event_id, program, year_level, section, checked_in, am_in, am_out, pm_in, pm_out)
+            SELECT p_event_id, COALESCE(s.program, ''), COALESCE(s.year_level, ''), COALESCE(s.section, ''),
+                   p_sign * p_checked_in, p_sign * p_am_in, p_sign * p_am_out,
+                   p_sign * p_pm_in, p_sign * p_pm_out
+            FROM students s WHERE s.student_no = p_student_no
+            ON CONFLICT (event_id, program, year_level, section) DO UPDATE SET
+                checked_in = ss.checked_in + EXCLUDED.checked_in,
+                am_in = ss.am_in + EXCLUDED.am_in,
+                am_out = ss.am_out + EXCLUDED.am_out,
+                pm_in = ss.pm_in + EXCLUDED.pm_in,
+                pm_out = ss.pm_out + EXCLUDED.pm_out;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Soft-deleted (archived) rows do not count
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION track_attendance_stats()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            old_live BOOLEAN := TG_OP <> 'INSERT' AND OLD.deleted_at IS NULL;
+            new_live BOOLEAN := TG_OP <> 'DELETE' AND NEW.deleted_at IS NULL;
+            d_am_in INTEGER;
+            d_am_out INTEGER;
+            d_pm_in INTEGER;
+            d_pm_out INTEGER;
+            d_checked_in INTEGER;
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.event_id = NEW.event_id AND OLD.student_no = NEW.student_no THEN
+                -- Same row, same section: apply only the difference
+                d_am_in := (new_live AND NEW.am_in IS NOT NULL)::int - (old_live AND OLD.am_in IS NOT NULL)::int;
+                d_am_out := (new_live AND NEW.am_out IS NOT NULL)::int - (old_live AND OLD.am_out IS NOT NULL)::int;
+                d_pm_in := (new_live AND NEW.pm_in IS NOT NULL)::int - (old_live AND OLD.pm_in IS NOT NULL)::int;
+                d_pm_out := (new_live AND NEW.pm_out IS NOT NULL)::int - (old_live AND OLD.pm_out IS NOT NULL)::int;
+                d_checked_in := new_live::int - old_live::int;
+                IF d_am_in <> 0 OR d_am_out <> 0 OR d_pm_in <> 0 OR d_pm_out <> 0 OR d_checked_in <> 0 THEN
+                    PERFORM bump_event_stats(NEW.event_id, NEW.student_no, 1,
+                        d_am_in, d_am_out, d_pm_in, d_pm_out, d_checked_in);
+                END IF;
+                RETURN NULL;
+            END IF;
+
+            IF old_live THEN
+                PERFORM bump_event_stats(OLD.event_id, OLD.student_no, -1,
+                    (OLD.am_in IS NOT NULL)::int, (OLD.am_out IS NOT NULL)::int,
+                    (OLD.pm_in IS NOT NULL)::int, (OLD.pm_out IS NOT NULL)::int, 1);
+            END IF;
+            IF new_live THEN
+                PERFORM bump_event_stats(NEW.event_id, NEW.student_no, 1,
+                    (NEW.am_in IS NOT NULL)::int, (NEW.am_out IS NOT NULL)::int,
+                    (NEW.pm_in IS NOT NULL)::int, (NEW.pm_out IS NOT NULL)::int, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Roster sizes per section. Inserts and deletes are counted once per
+    # statement from the transition table: a row-level counter would rewrite
+    # the same roster_stats row once per student during a bulk import.
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION track_roster_counts()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO roster_stats AS rs (program, year_level, section, students)
+                SELECT COALESCE(program, ''), COALESCE(year_level, ''), COALESCE(section, ''), COUNT(*)
+                FROM new_rows GROUP BY 1, 2, 3
+                ON CONFLICT (program, year_level, section) DO UPDATE SET students = rs.students + EXCLUDED.students;
+            ELSE
+                UPDATE roster_stats rs SET students = rs.students - d.n
+                FROM (
+                    SELECT COALESCE(program, '') AS program, COALESCE(year_level, '') AS year_level,
+                           COALESCE(section, '') AS section, COUNT(*) AS n
+                    FROM old_rows GROUP BY 1, 2, 3
+                ) d
+                WHERE rs.program = d.program AND rs.year_level = d.year_level AND rs.section = d.section;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # A student moving section: shift the roster count and their attendance
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION track_roster_stats()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF (OLD.program, OLD.year_level, OLD.section) IS NOT DISTINCT FROM
+               (NEW.program, NEW.year_level, NEW.section) THEN
+                RETURN NULL;
+            END IF;
+
+            UPDATE roster_stats SET students = students - 1
+            WHERE program = COALESCE(OLD.program, '') AND year_level = COALESCE(OLD.year_level, '')
+              AND section = COALESCE(OLD.section, '');
+            INSERT INTO roster_stats AS rs (program, year_level, section, students)
+            VALUES (COALESCE(NEW.program, ''), COALESCE(NEW.year_level, ''), COALESCE(NEW.section, ''), 1)
+            ON CONFLICT (program, year_level, section) DO UPDATE SET students = rs.students + 1;
+
+            INSERT INTO event_section_stats AS ss
+                (event_id, program, year_level, section, checked_in, am_in, am_out, pm_in, pm_out)
+            SELECT a.event_id, g.program, g.year_level, g.section,
+                   g.sign, g.sign * (a.am_in IS NOT NULL)::int, g.sign * (a.am_out IS NOT NULL)::int,
+                   g.sign * (a.pm_in IS NOT NULL)::int, g.sign * (a.pm_out IS NOT NULL)::int
+            FROM attendance a
+            CROSS JOIN (VALUES
+                (COALESCE(OLD.program, ''), COALESCE(OLD.year_level, ''), COALESCE(OLD.section, ''), -1),
+                (COALESCE(NEW.program, ''), COALESCE(NEW.year_level, ''), COALESCE(NEW.section, ''), 1)
+            ) AS g(program, year_level, section, sign)
+            WHERE a.student_no = NEW.student_no AND a.deleted_at IS NULL
+            ON CONFLICT (event_id, program, year_level, section) DO UPDATE SET
+                checked_in = ss.checked_in + EXCLUDED.checked_in,
+                am_in = ss.am_in + EXCLUDED.am_in,
+                am_out = ss.am_out + EXCLUDED.am_out,
+                pm_in = ss.pm_in + EXCLUDED.pm_in,
+                pm_out = ss.pm_out + EXCLUDED.pm_out;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION clear_attendance_stats()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            DELETE FROM event_section_stats;
+            DELETE FROM event_stats;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Full recount, used once when the summary tables are created and after restores
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION rebuild_attendance_stats()
+        RETURNS VOID AS $$
+        BEGIN
+            LOCK TABLE attendance, students IN SHARE MODE;
+            DELETE FROM event_section_stats;
+            DELETE FROM event_stats;
+            DELETE FROM roster_stats;
+
+            INSERT INTO roster_stats (program, year_level, section, students)
+            SELECT COALESCE(program, ''), COALESCE(year_level, ''), COALESCE(section, ''), COUNT(*)
+            FROM students GROUP BY 1, 2, 3;
+
+            INSERT INTO event_section_stats
+                (event_id, program, year_level, section, checked_in, am_in, am_out, pm_in, pm_out)
+            SELECT a.event_id, COALESCE(s.program, ''), COALESCE(s.year_level, ''), COALESCE(s.section, ''),
+                   COUNT(*), COUNT(a.am_in), COUNT(a.am_out), COUNT(a.pm_in), COUNT(a.pm_out)
+            FROM attendance a JOIN students s ON s.student_no = a.student_no
+            WHERE a.deleted_at IS NULL
+            GROUP BY 1, 2, 3, 4;
+
+            INSERT INTO event_stats (event_id, checked_in, am_in, am_out, pm_in, pm_out)
+            SELECT event_id, SUM(checked_in), SUM(am_in), SUM(am_out), SUM(pm_in), SUM(pm_out)
+            FROM event_section_stats GROUP BY event_id;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    cursor.execute(ATTENDANCE_STATS_TRIGGERS)
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS trigger_roster_stats ON students;
+        CREATE TRIGGER trigger_roster_stats
+        AFTER UPDATE OF program, year_level, section ON students
+        FOR EACH ROW
+        EXECUTE FUNCTION track_roster_stats();
+
+        DROP TRIGGER IF EXISTS trigger_roster_stats_insert ON students;
+        CREATE TRIGGER trigger_roster_stats_insert
+        AFTER INSERT ON students
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION track_roster_counts();
+
+        DROP TRIGGER IF EXISTS trigger_roster_stats_delete ON students;
+        CREATE TRIGGER trigger_roster_stats_delete
+        AFTER DELETE ON students
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION track_roster_counts();
+    """)
+
+    if stats_missing:
+        cursor.execute("SELECT rebuild_attendance_stats()")
+
+
+def _check_in_functions(cursor):
+    # Live check-in feed: delivered to LISTENers (the SSE endpoint) on commit
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION notify_check_in(
+            p_event_id INTEGER, p_student_no TEXT, p_slot TEXT, p_at TIMESTAMP,
+            p_first_name TEXT, p_last_name TEXT
+        )
+        RETURNS VOID AS $$
+        BEGIN
+            PERFORM pg_notify('attendance_checkin', json_build_object(
+                'event_id', p_event_id, 'student_no', p_student_no, 'slot', p_slot,
+                'at', p_at, 'first_name', p_first_name, 'last_name', p_last_name
+            )::text);
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Whole IN/OUT + AM/PM state machine for a single scan, so /api/check_in
+    # is one round trip and concurrent scans cannot create duplicate rows.
+    # p_mode / p_is_am may be supplied by the caller; otherwise they are
+    # derived from the event row.
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION attendance_check_in(
+            p_event_id INTEGER,
+            p_student_no TEXT,
+            p_at TIMESTAMP,
+            p_mode TEXT DEFAULT NULL,
+            p_is_am BOOLEAN DEFAULT NULL
+        )
+        RETURNS TABLE (outcome TEXT, session TEXT, first_name TEXT) AS $$
+        #variable_conflict use_column
+        DECLARE
+            v_first TEXT;
+            v_last TEXT;
+            v_cutoff TEXT;
+            v_event_mode TEXT;
+            v_mode TEXT := p_mode;
+            v_is_am BOOLEAN := p_is_am;
+            v_session TEXT;
+            v_inserted BOOLEAN;
+            rec RECORD;
+        BEGIN
+            SELECT s.first_name, s.last_name INTO v_first, v_last FROM students s WHERE s.student_no = p_student_no;
+            IF NOT FOUND THEN
+                RETURN QUERY SELECT 'unknown_student'::TEXT, NULL::TEXT, NULL::TEXT;
+                RETURN;
+            END IF;
+
+            IF v_mode IS NULL OR v_is_am IS NULL THEN
+                SELECT e.am_cutoff, COALESCE(e.attendance_mode, 'IN') INTO v_cutoff, v_event_mode
+                FROM events e WHERE e.id = p_event_id;
+                IF NOT FOUND THEN
+                    RETURN QUERY SELECT 'unknown_event'::TEXT, NULL::TEXT, v_first;
+                    RETURN;
+                END IF;
+
+                v_mode := COALESCE(v_mode, v_event_mode);
+                IF v_is_am IS NULL THEN
+                    v_cutoff := COALESCE(NULLIF(v_cutoff, ''), '12:00');
+                    IF v_cutoff ~ '^([01]?[0-9]|2[0-3]):[0-5]?[0-9]$' THEN
+                        v_is_am := p_at::TIME <= v_cutoff::TIME;
+                    ELSE
+                        v_is_am := EXTRACT(HOUR FROM p_at) < 12;
+                    END IF;
+                END IF;
+            END IF;
+
+            v_session := CASE WHEN v_is_am THEN 'AM' ELSE 'PM' END;
+
+            IF v_mode = 'OUT' THEN
+                UPDATE attendance a
+                SET am_out = CASE WHEN v_is_am THEN p_at ELSE a.am_out END,
+                    pm_out = CASE WHEN v_is_am THEN a.pm_out ELSE p_at END
+                WHERE a.event_id = p_event_id AND a.student_no = p_student_no
+                  AND CASE WHEN v_is_am THEN a.am_in IS NOT NULL AND a.am_out IS NULL
+                           ELSE a.pm_in IS NOT NULL AND a.pm_out IS NULL END;
+
+                IF FOUND THEN
+                    PERFORM notify_check_in(p_event_id, p_student_no, lower(v_session) || '_out', p_at, v_first, v_last);
+                    RETURN QUERY SELECT 'out'::TEXT, v_session, v_first;
+                    RETURN;
+                END IF;
+
+                SELECT a.am_in, a.am_out, a.pm_in, a.pm_out INTO rec
+                FROM attendance a WHERE a.event_id = p_event_id AND a.student_no = p_student_no;
+                IF NOT FOUND THEN
+                    RETURN QUERY SELECT 'no_record'::TEXT, v_session, v_first;
+                ELSIF (v_is_am AND rec.am_in IS NULL) OR (NOT v_is_am AND rec.pm_in IS NULL) THEN
+                    RETURN QUERY SELECT 'not_in'::TEXT, v_session, v_first;
+                ELSE
+                    RETURN QUERY SELECT 'already_out'::TEXT, v_session, v_first;
+                END IF;
+                RETURN;
+            END IF;
+
+            -- Insert and update are separate statements because a partitioned
+            -- attendance table cannot report xmax to tell them apart
+            INSERT INTO attendance AS a (event_id, student_no, am_in, pm_in, status)
+            VALUES (p_event_id, p_student_no,
+                    CASE WHEN v_is_am THEN p_at END,
+                    CASE WHEN v_is_am THEN NULL ELSE p_at END,
+                    'Present')
+            ON CONFLICT (event_id, student_no) DO NOTHING;
+            v_inserted := FOUND;
+
+            IF NOT v_inserted THEN
+                UPDATE attendance a
+                SET am_in = CASE WHEN v_is_am THEN p_at ELSE a.am_in END,
+                    pm_in = CASE WHEN v_is_am THEN a.pm_in ELSE p_at END,
+                    status = 'Present'
+                WHERE a.event_id = p_event_id AND a.student_no = p_student_no
+                  AND CASE WHEN v_is_am THEN a.am_in IS NULL ELSE a.pm_in IS NULL END;
+
+                IF NOT FOUND THEN
+                    RETURN QUERY SELECT 'already_in'::TEXT, v_session, v_first;
+                    RETURN;
+                END IF;
+            END IF;
+
+            PERFORM notify_check_in(p_event_id, p_student_no, lower(v_session) || '_in', p_at, v_first, v_last);
+            IF v_inserted THEN
+                RETURN QUERY SELECT 'in_first'::TEXT, v_session, v_first;
+            ELSE
+                RETURN QUERY SELECT 'in'::TEXT, v_session, v_first;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+
+def _partition_functions(cursor):
+    install_partition_functions(cursor)
+
+
+def _attendance_change_xid(cursor):
+    # change_seq is drawn when a row is written, not when it commits, so a
+    # poller that moved past a seq could miss a slower transaction's earlier
+    # one. The ?since= feed now pages by writing transaction instead and only
+    # hands out rows from transactions that have finished. Rows already there
+    # (and rows a restore loads with triggers off) count as long committed.
+    cursor.execute("ALTER TABLE attendance ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT '1';")
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION stamp_attendance_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.change_seq := nextval('attendance_change_seq');
+            NEW.change_xid := pg_current_xact_id();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_event_xid ON attendance(event_id, change_xid);")
+    cursor.execute("DROP INDEX IF EXISTS idx_attendance_event_change;")
+
+
+
+def _attendance_stats_deltas(cursor):
+    # Every check-in used to upsert its event's single event_stats row, so
+    # concurrent scanners queued on one row lock and multi-event batches could
+    # deadlock. Writers now append delta rows, which never conflict; readers
+    # add them to the base tables and fold_attendance_stats() moves them across.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_stats_delta (
+            event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+            program TEXT NOT NULL,
+            year_level TEXT NOT NULL,
+            section TEXT NOT NULL,
+            checked_in INTEGER NOT NULL,
+            am_in INTEGER NOT NULL,
+            am_out INTEGER NOT NULL,
+            pm_in INTEGER NOT NULL,
+            pm_out INTEGER NOT NULL
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_attendance_stats_delta_event ON attendance_stats_delta(event_id);")
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION bump_event_stats(
+            p_event_id INTEGER, p_student_no TEXT, p_sign INTEGER,
+            p_am_in INTEGER, p_am_out INTEGER, p_pm_in INTEGER, p_pm_out INTEGER,
+            p_checked_in INTEGER
+        )
+        RETURNS VOID AS $$
+        BEGIN
+            INSERT INTO attendance_stats_delta
+                (event_id, program, year_level, section, checked_in, am_in, am_out, pm_in, pm_out)
+            SELECT p_event_id, COALESCE(s.program, ''), COALESCE(s.year_level, ''), COALESCE(s.section, ''),
+                   p_sign * p_checked_in, p_sign * p_am_in, p_sign * p_am_out,
+                   p_sign * p_pm_in, p_sign * p_pm_out
+            FROM students s WHERE s.student_no = p_student_no;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # A student moving section: shift the roster count and their attendance
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION track_roster_stats()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF (OLD.program, OLD.year_level, OLD.section) IS NOT DISTINCT FROM
+               (NEW.program, NEW.year_level, NEW.section) THEN
+                RETURN NULL;
+            END IF;
+
+            UPDATE roster_stats SET students = students - 1
+            WHERE program = COALESCE(OLD.program, '') AND year_level = COALESCE(OLD.year_level, '')
+              AND section = COALESCE(OLD.section, '');
+            INSERT INTO roster_stats AS rs (program, year_level, section, students)
+            VALUES (COALESCE(NEW.program, ''), COALESCE(NEW.year_level, ''), COALESCE(NEW.section, ''), 1)
+            ON CONFLICT (program, year_level, section) DO UPDATE SET students = rs.students + 1;
+
+            INSERT INTO attendance_stats_delta
+                (event_id, program, year_level, section, checked_in, am_in, am_out, pm_in, pm_out)
+            SELECT a.event_id, g.program, g.year_level, g.section,
+                   g.sign, g.sign * (a.am_in IS NOT NULL)::int, g.sign * (a.am_out IS NOT NULL)::int,
+                   g.sign * (a.pm_in IS NOT NULL)::int, g.sign * (a.pm_out IS NOT NULL)::int
+            FROM attendance a
+            CROSS JOIN (VALUES
+                (COALESCE(OLD.program, ''), COALESCE(OLD.year_level, ''), COALESCE(OLD.section, ''), -1),
+                (COALESCE(NEW.program, ''), COALESCE(NEW.year_level, ''), COALESCE(NEW.section, ''), 1)
+            ) AS g(program, year_level, section, sign)
+            WHERE a.student_no = NEW.student_no AND a.deleted_at IS NULL;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Moves the pending deltas into the base tables and returns how many events
+    # it touched. Only one fold runs at a time; a caller that finds one running
+    # skips (returns 0) rather than waiting.
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION fold_attendance_stats()
+        RETURNS INTEGER AS $$
+        DECLARE
+            folded INTEGER;
+        BEGIN
+            IF NOT pg_try_advisory_xact_lock(hashtext('attendance_stats_delta')) THEN
+                RETURN 0;
+            END IF;
+
+            WITH moved AS (
+                DELETE FROM attendance_stats_delta RETURNING *
+            ), folded AS (
+                SELECT event_id, program, year_level, section,
+                       SUM(checked_in) AS checked_in, SUM(am_in) AS am_in, SUM(am_out) AS am_out,
+                       SUM(pm_in) AS pm_in, SUM(pm_out) AS pm_out
+                FROM moved GROUP BY 1, 2, 3, 4
+            ), sections AS (
+                -- Key order, so a fold and a rebuild or purge cannot deadlock
+                INSERT INTO event_section_stats AS ss
+                    (event_id, program, year_level, section, checked_in, am_in, am_out, pm_in, pm_out)
+                SELECT * FROM folded ORDER BY 1, 2, 3, 4
+                ON CONFLICT (event_id, program, year_level, section) DO UPDATE SET
+                    checked_in = ss.checked_in + EXCLUDED.checked_in,
+                    am_in = ss.am_in + EXCLUDED.am_in,
+                    am_out = ss.am_out + EXCLUDED.am_out,
+                    pm_in = ss.pm_in + EXCLUDED.pm_in,
+                    pm_out = ss.pm_out + EXCLUDED.pm_out
+            )
+            INSERT INTO event_stats AS es (event_id, checked_in, am_in, am_out, pm_in, pm_out)
+            SELECT event_id, SUM(checked_in), SUM(am_in), SUM(am_out), SUM(pm_in), SUM(pm_out)
+            FROM folded GROUP BY event_id ORDER BY event_id
+            ON CONFLICT (event_id) DO UPDATE SET
+                checked_in = es.checked_in + EXCLUDED.checked_in,
+                am_in = es.am_in + EXCLUDED.am_in,
+                am_out = es.am_out + EXCLUDED.am_out,
+                pm_in = es.pm_in + EXCLUDED.pm_in,
+                pm_out = es.pm_out + EXCLUDED.pm_out;
+            GET DIAGNOSTICS folded = ROW_COUNT;
+
+            RETURN folded;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION clear_attendance_stats()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            DELETE FROM attendance_stats_delta;
+            DELETE FROM event_section_stats;
+            DELETE FROM event_stats;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Same recount as before, plus dropping the deltas it replaces
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION rebuild_attendance_stats()
+        RETURNS VOID AS $$
+        BEGIN
+            LOCK TABLE attendance, students IN SHARE MODE;
+            DELETE FROM attendance_stats_delta;
+            DELETE FROM event_section_stats;
+            DELETE FROM event_stats;
+            DELETE FROM roster_stats;
+
+            INSERT INTO roster_stats (program, year_level, section, students)
+            SELECT COALESCE(program, ''), COALESCE(year_level, ''), COALESCE(section, ''), COUNT(*)
+            FROM students GROUP BY 1, 2, 3;
+
+            INSERT INTO event_section_stats
+                (event_id, program, year_level, section, checked_in, am_in, am_out, pm_in, pm_out)
+            SELECT a.event_id, COALESCE(s.program, ''), COALESCE(s.year_level, ''), COALESCE(s.section, ''),
+                   COUNT(*), COUNT(a.am_in), COUNT(a.am_out), COUNT(a.pm_in), COUNT(a.pm_out)
+            FROM attendance a JOIN students s ON s.student_no = a.student_no
+            WHERE a.deleted_at IS NULL
+            GROUP BY 1, 2, 3, 4;
+
+            INSERT INTO event_stats (event_id, checked_in, am_in, am_out, pm_in, pm_out)
+            SELECT event_id, SUM(checked_in), SUM(am_in), SUM(am_out), SUM(pm_in), SUM(pm_out)
+            FROM event_section_stats GROUP BY event_id;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+
+def _name_search_backfill_index(cursor):
+    # Lets backfill_name_index() find the rows it still has to fill without a
+    # full scan; the index is empty once the roster is backfilled
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_students_name_search_missing ON students(student_no)
+        WHERE name_search IS NULL;
+    """)
+
+
+MIGRATIONS = [
+    (1, 'base_schema', _base_schema),
+    (2, 'soft_delete', _soft_delete),
+    (3, 'event_mode_and_token_generation', _event_mode_and_token_generation),
+    (4, 'unique_attendance', _unique_attendance),
+    (5, 'attendance_change_seq', _attendance_change_seq),
+    (6, 'name_index', _name_index),
+    (7, 'attendance_stats', _attendance_stats),
+    (8, 'check_in_functions', _check_in_functions),
+    (9, 'partition_functions', _partition_functions),
+    (10, 'attendance_change_xid', _attendance_change_xid),
+    (11, 'attendance_stats_deltas', _attendance_stats_deltas),
+    (12, 'name_search_backfill_index', _name_search_backfill_index),
+]
+
+
+def applied_versions(cursor):
+    """Versions already recorded, or an empty set on a database that predates schema_migrations."""
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS ready")
+    if not cursor.fetchone()['ready']:
+        return set()
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def _needs_partitioning(cursor):
+    if not ATTENDANCE_PARTITIONED:
+        return False
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('attendance')")
+    row = cursor.fetchone()
+    return row is not None and row['relkind'] == 'r'
+
+
+def _partition_attendance(cursor):
+    """Opt-in conversion (see partitions.py); the rebuilt table needs its triggers back."""
+    if migrate_attendance_partitions(cursor):
+        cursor.execute(ATTENDANCE_STAMP_TRIGGER)
+        cursor.execute(ATTENDANCE_STATS_TRIGGERS)
+        return True
+    return False
+
+
+def migrate(conn):
+    """
+    Applies pending MIGRATIONS, each in its own transaction, and returns the
+    versions applied. When the schema is current this is one catalog check and
+    one SELECT. Otherwise work happens under a session advisory lock, so
+    workers booting together wait for the first one instead of racing it.
+    """
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+        pending = [m for m in MIGRATIONS if m[0] not in done]
+        partition = _needs_partitioning(cursor)
+        conn.commit()
+        if not pending and not partition:
+            return []
+
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    duration_ms INTEGER
+                );
+            """)
+            conn.commit()
+
+            # Another worker may have finished while this one waited for the lock
+            done = applied_versions(cursor)
+            applied = []
+            for version, name, step in MIGRATIONS:
+                if version in done:
+                    continue
+                started = time.perf_counter()
+                step(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+                    (version, name, int((time.perf_counter() - started) * 1000)))
+                conn.commit()
+                applied.append(version)
+
+            if _needs_partitioning(cursor) and _partition_attendance(cursor):
+                conn.commit()
+            return applied
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+    finally:
+        cursor.close()
@@ -0,0 +1,295 @@
+import functools
+import hashlib
+import hmac
+import os
+import time
+import unicodedata
+from psycopg2.extras import execute_values
+from helpers import ENCRYPTION_KEY, decrypt_data
+
+# Names are Fernet-encrypted, so Postgres cannot sort or search them directly.
+# Two derived columns are kept next to the ciphertext instead:
+#   name_search - HMAC tokens of every word prefix, queried through a GIN index
+#   name_sort   - the student's rank in (last, first, middle) order, spaced out
+#                 by NAME_SORT_GAP so a write can slot in between its neighbours
+NAME_SORT_GAP = 1 << 20
+NAME_PREFIX_MAX = int(os.getenv('NAME_PREFIX_MAX', '12'))
+# Writers hold this shared while they place students; maintain_name_sort() takes it exclusively
+NAME_SORT_LOCK = 'students.name_sort'
+# Respace attempts before maintenance gives up while other writers hold students
+NAME_SORT_RESPACE_ATTEMPTS = 5
+# Students per transaction when backfill_name_index() fills in an existing roster
+NAME_BACKFILL_BATCH = int(os.getenv('NAME_BACKFILL_BATCH', '500'))
+PROBE_COLUMNS = "student_no, name_sort, first_name, middle_name, last_name"
+
+_index_key = hmac.new(
+    (os.getenv('BLIND_INDEX_KEY') or ENCRYPTION_KEY or '').encode('utf-8'),
+    b'ams-blind-index', hashlib.sha256
+).digest()
+_token_hmac = hmac.new(_index_key, digestmod=hashlib.sha256)
+
+def normalize_name(value):
+    """Case- and accent-insensitive form used for both tokens and ordering."""
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    cleaned = ''.join(ch if ch.isalnum() else ' ' for ch in stripped.casefold())
+    return ' '.join(cleaned.split())
+
+# Rosters share most short prefixes, so bulk imports hit this cache constantly
+@functools.lru_cache(maxsize=65536)
+def _token(prefix):
+    mac = _token_hmac.copy()
+    mac.update(prefix.encode('utf-8'))
+    return mac.hexdigest()[:16]
+
+def search_tokens(first_name, last_name):
+    """Blind-index tokens for every word prefix of a student's first and last name."""
+    tokens = set()
+    for word in (normalize_name(first_name) + ' ' + normalize_name(last_name)).split():
+        word = word[:NAME_PREFIX_MAX]
+        for end in range(1, len(word) + 1):
+            tokens.add(_token(word[:end]))
+    return sorted(tokens)
+
+def query_tokens(query):
+    """Tokens a student must all carry to match a free-text name query."""
+    return sorted({_token(word[:NAME_PREFIX_MAX]) for word in normalize_name(query).split()})
+
+def collation_key(first_name, middle_name, last_name, student_no):
+    return (normalize_name(last_name), normalize_name(first_name), normalize_name(middle_name), student_no)
+
+def _row_key(row, prefix=''):
+    return collation_key(decrypt_data(row[prefix + 'first_name']), decrypt_data(row[prefix + 'middle_name']),
+                         decrypt_data(row[prefix + 'last_name']), row[prefix + 'student_no'])
+
+def _lock_gap(cursor, low):
+    # Writers filling different gaps do not wait on each other
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{NAME_SORT_LOCK}:{low}",))
+
+def _find_gaps(cursor, keys, low, high):
+    """
+    For each collation key (ascending), the adjacent pair of ranked students it
+    falls between, as ((name_sort, student_no), (name_sort, student_no)) bounds
+    inside (low, high). Every key is bisected at once: each round probes the
+    students either side of the midpoint of its current bounds through
+    idx_students_name_sort and decrypts only those.
+    """
+    bounds = [[low, high] for _ in keys]
+    pending = list(range(len(keys)))
+    while pending:
+        cursor.execute(f"""
+            SELECT p.i,
+                   b.student_no AS b_student_no, b.name_sort AS b_name_sort, b.first_name AS b_first_name,
+                   b.middle_name AS b_middle_name, b.last_name AS b_last_name,
+                   a.student_no AS a_student_no, a.name_sort AS a_name_sort, a.first_name AS a_first_name,
+                   a.middle_name AS a_middle_name, a.last_name AS a_last_name
+            FROM unnest(%s::int[], %s::bigint[], %s::bigint[], %s::text[], %s::bigint[], %s::text[])
+                AS p(i, mid, low_sort, low_no, high_sort, high_no)
+            LEFT JOIN LATERAL (
+                SELECT {PROBE_COLUMNS} FROM students
+                WHERE (name_sort, student_no) > (p.low_sort, p.low_no) AND (name_sort, student_no) < (p.mid, '')
+                ORDER BY name_sort DESC, student_no DESC LIMIT 1
+            ) b ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT {PROBE_COLUMNS} FROM students
+                WHERE (name_sort, student_no) >= (p.mid, '') AND (name_sort, student_no) > (p.low_sort, p.low_no)
+                  AND (name_sort, student_no) < (p.high_sort, p.high_no)
+                ORDER BY name_sort, student_no LIMIT 1
+            ) a ON TRUE
+        """, (pending,
+              [(bounds[i][0][0] + bounds[i][1][0]) // 2 for i in pending],
+              [bounds[i][0][0] for i in pending], [bounds[i][0][1] for i in pending],
+              [bounds[i][1][0] for i in pending], [bounds[i][1][1] for i in pending]))
+
+        pending = []
+        for r in cursor.fetchall():
+            i, key = r['i'], keys[r['i']]
+            below = (r['b_name_sort'], r['b_student_no']) if r['b_student_no'] is not None else None
+            above = (r['a_name_sort'], r['a_student_no']) if r['a_student_no'] is not None else None
+            if below and key < _row_key(r, 'b_'):
+                bounds[i][1] = below
+                pending.append(i)
+            elif above and key > _row_key(r, 'a_'):
+                bounds[i][0] = above
+                pending.append(i)
+            else:
+                # Nothing ranks between the last student before the midpoint and the first after it
+                bounds[i] = [below or bounds[i][0], above or bounds[i][1]]
+    return [tuple(b) for b in bounds]
+
+def place_name_sort(cursor, student_nos, known=None):
+    """
+    Gives the students just written a name_sort between their neighbours in
+    name order. Only their names are decrypted (`known` optionally maps
+    student_no -> collation_key() for rows whose plaintext the caller already
+    has); the neighbours are found by bisecting idx_students_name_sort. Students
+    whose gap has run out keep a NULL name_sort, which lists them last, and are
+    counted in the return value; maintain_name_sort() ranks them once the
+    caller has committed.
+    """
+    student_nos = list(dict.fromkeys(student_nos))
+    if not student_nos:
+        return 0
+    known = known or {}
+    cursor.execute("SELECT pg_advisory_xact_lock_shared(hashtext(%s))", (NAME_SORT_LOCK,))
+    # Unranked first, so the bisection never meets the students being placed
+    cursor.execute("""
+        UPDATE students SET name_sort = NULL WHERE student_no = ANY(%s)
+        RETURNING student_no, first_name, middle_name, last_name
+    """, (student_nos,))
+    targets = sorted(known.get(r['student_no']) or _row_key(r) for r in cursor.fetchall())
+    if not targets:
+        return 0
+
+    cursor.execute("SELECT COALESCE(MAX(name_sort), 0) AS top FROM students")
+    top = cursor.fetchone()['top']
+    gaps = {}
+    for key, gap in zip(targets, _find_gaps(cursor, targets, (0, ''), (top + 2 * NAME_SORT_GAP, ''))):
+        gaps.setdefault(gap, []).append(key)
+
+    updates, unplaced = [], 0
+    work = sorted(gaps.items())
+    while work:
+        (low, high), keys = work.pop(0)
+        # Gap locks are taken in name_sort order, so concurrent writers cannot deadlock
+        _lock_gap(cursor, low[0])
+        cursor.execute("""
+            SELECT EXISTS (SELECT 1 FROM students
+                           WHERE (name_sort, student_no) > (%s, %s) AND (name_sort, student_no) < (%s, %s)) AS taken
+        """, low + high)
+        if cursor.fetchone()['taken']:
+            # Another writer ranked students here since the bisection; look again inside the gap
+            split = {}
+            for key, gap in zip(keys, _find_gaps(cursor, keys, low, high)):
+                split.setdefault(gap, []).append(key)
+            work = sorted(split.items()) + work
+            continue
+        if high[0] - low[0] <= len(keys):
+            unplaced += len(keys)
+            continue
+        step = (high[0] - low[0]) / (len(keys) + 1)
+        updates.extend((key[-1], low[0] + int(step * (j + 1))) for j, key in enumerate(keys))
+
+    if updates:
+        execute_values(cursor, """
+            UPDATE students s SET name_sort = v.name_sort
+            FROM (VALUES %s) AS v(student_no, name_sort)
+            WHERE s.student_no = v.student_no
+        """, updates, template='(%s, %s::bigint)')
+    return unplaced
+
+def maintain_name_sort(conn):
+    """
+    Maintenance, in its own transaction: spaces the ranked students NAME_SORT_GAP
+    apart again, keeping their order so nothing is decrypted, then places the
+    students left unranked. A respace needs every ranked row, so when another
+    writer holds one the transaction is rolled back and retried. Failures are
+    logged and leave those students listed last until the next run. Returns
+    how many students were placed.
+    """
+    cursor = conn.cursor()
+    try:
+        for attempt in range(1, NAME_SORT_RESPACE_ATTEMPTS + 1):
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (NAME_SORT_LOCK,))
+            unranked = []
+            if _respace(cursor):
+                cursor.execute("SELECT student_no FROM students WHERE name_sort IS NULL")
+                unranked = [r['student_no'] for r in cursor.fetchall()]
+                if not unranked:
+                    conn.commit()
+                    return 0
+                place_name_sort(cursor, unranked)
+                if _respace(cursor):
+                    conn.commit()
+                    return len(unranked)
+            conn.rollback()
+            time.sleep(0.1 * attempt)
+        print(f"Name order maintenance gave up: students stayed locked for {NAME_SORT_RESPACE_ATTEMPTS} attempts")
+        return 0
+    except Exception as e:
+        conn.rollback()
+        print(f"Name order maintenance failed: {e}")
+        return 0
+    finally:
+        cursor.close()
+
+def _respace(cursor):
+    """
+    Renumbers every ranked student NAME_SORT_GAP apart. Returns False, having
+    changed nothing, if another transaction holds one of the rows: renumbering
+    around a row would leave it on the old scale, out of place.
+    """
+    cursor.execute("""
+        WITH ranked AS (
+            SELECT student_no, name_sort FROM students WHERE name_sort IS NOT NULL
+            FOR NO KEY UPDATE SKIP LOCKED
+        )
+        SELECT (SELECT COUNT(*) FROM ranked) = (SELECT COUNT(*) FROM students WHERE name_sort IS NOT NULL) AS complete
+    """)
+    if not cursor.fetchone()['complete']:
+        return False
+    cursor.execute("""
+        WITH spaced AS (
+            SELECT student_no, name_sort, row_number() OVER (ORDER BY name_sort, student_no) * %s AS spaced
+            FROM students WHERE name_sort IS NOT NULL
+        )
+        UPDATE students s SET name_sort = spaced.spaced
+        FROM spaced
+        WHERE s.student_no = spaced.student_no AND spaced.name_sort <> spaced.spaced
+    """, (NAME_SORT_GAP,))
+    return True
+
+def backfill_name_index(conn, batch_size=NAME_BACKFILL_BATCH):
+    """
+    Fills name_search/name_sort for rows written before the blind index
+    existed, batch_size students per transaction. Safe to interrupt and to run
+    from several workers at once: every batch commits, and a run only picks up
+    the rows still missing them. Returns how many students it filled in.
+    """
+    cursor = conn.cursor()
+    filled = set()
+    try:
+        while True:
+            cursor.execute("""
+                SELECT student_no, first_name, last_name FROM students
+                WHERE name_search IS NULL ORDER BY student_no LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            execute_values(cursor, """
+                UPDATE students s SET name_search = v.name_search
+                FROM (VALUES %s) AS v(student_no, name_search)
+                WHERE s.student_no = v.student_no
+            """, [(r['student_no'], search_tokens(decrypt_data(r['first_name']), decrypt_data(r['last_name'])))
+                  for r in rows], template='(%s, %s::text[])')
+            conn.commit()
+            filled.update(r['student_no'] for r in rows)
+
+        # Students whose gap ran out stay unranked; walking by student_no
+        # keeps them from being picked up again
+        last, unplaced = '', 0
+        while True:
+            cursor.execute("""
+                SELECT student_no FROM students
+                WHERE name_sort IS NULL AND student_no > %s ORDER BY student_no LIMIT %s
+            """, (last, batch_size))
+            batch = [r['student_no'] for r in cursor.fetchall()]
+            if not batch:
+                break
+            unplaced += place_name_sort(cursor, batch)
+            conn.commit()
+            filled.update(batch)
+            last = batch[-1]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    if unplaced:
+        maintain_name_sort(conn)
+    return len(filled)
@@ -0,0 +1,114 @@
+import os
+
+# Opt-in: attendance as a table LIST-partitioned by event_id, one partition per
+# event. Per-event queries then scan only that event's partition, and purging
+# an event drops its partition instead of deleting rows one by one.
+ATTENDANCE_PARTITIONED = os.getenv("ATTENDANCE_PARTITIONED", "false").lower() in ('1', 'true', 'yes', 'on')
+
+# Rows for an event that has no partition yet land here instead of failing
+DEFAULT_PARTITION = 'attendance_default'
+
+def partition_name(event_id):
+    return f"attendance_e{int(event_id)}"
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'attendance'::regclass) AS p")
+    return cursor.fetchone()['p']
+
+def install_partition_functions(cursor):
+    """SQL side of ensure_event_partition(); a no-op while attendance is a plain table."""
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION ensure_attendance_partition(p_event_id INTEGER)
+        RETURNS BOOLEAN AS $$
+        DECLARE
+            v_name TEXT := 'attendance_e' || p_event_id;
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'attendance'::regclass)
+               OR to_regclass(v_name) IS NOT NULL THEN
+                RETURN FALSE;
+            END IF;
+
+            -- Rows already routed to the default partition would block the new one;
+            -- take them out and re-insert through the parent once it exists
+            CREATE TEMP TABLE IF NOT EXISTS attendance_partition_move (LIKE attendance) ON COMMIT DROP;
+            WITH moved AS (
+                DELETE FROM attendance_default WHERE event_id = p_event_id RETURNING *
+            )
+            INSERT INTO attendance_partition_move SELECT * FROM moved;
+
+            EXECUTE format('CREATE TABLE %I PARTITION OF attendance FOR VALUES IN (%s)', v_name, p_event_id);
+
+            INSERT INTO attendance SELECT * FROM attendance_partition_move;
+            TRUNCATE attendance_partition_move;
+            RETURN TRUE;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+def ensure_event_partition(cursor, event_id):
+    """Creates the event's attendance partition if attendance is partitioned and it is missing."""
+    cursor.execute("SELECT ensure_attendance_partition(%s) AS created", (event_id,))
+    return cursor.fetchone()['created']
+
+def ensure_all_partitions(cursor):
+    """Creates any missing partitions, e.g. for events loaded by a restore."""
+    cursor.execute("SELECT COUNT(*) FILTER (WHERE ensure_attendance_partition(id)) AS created FROM events")
+    return cursor.fetchone()['created']
+
+def purge_event_attendance(cursor, event_id):
+    """
+    Permanently removes an event's attendance rows: its partition is dropped
+    when attendance is partitioned, otherwise the rows are deleted.
+    """
+    if is_partitioned(cursor):
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL AS exists", (partition_name(event_id),))
+        if cursor.fetchone()['exists']:
+            # Archived rows do not count in the stats; live ones are cleared here
+            # because dropping a table fires no row triggers. The fold lock keeps
+            # a concurrent fold from re-adding them.
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('attendance_stats_delta'))")
+            cursor.execute("DELETE FROM attendance_stats_delta WHERE event_id = %s", (event_id,))
+            cursor.execute("DELETE FROM event_section_stats WHERE event_id = %s", (event_id,))
+            cursor.execute("DELETE FROM event_stats WHERE event_id = %s", (event_id,))
+            cursor.execute(f'DROP TABLE "{partition_name(event_id)}"')
+        # Anything that reached the default partition
+        cursor.execute("DELETE FROM attendance WHERE event_id = %s", (event_id,))
+    else:
+        cursor.execute("DELETE FROM attendance WHERE event_id = %s", (event_id,))
+
+def migrate_attendance_partitions(cursor):
+    """
+    One-time conversion of a plain attendance table into the partitioned
+    layout: the table is renamed aside, a partitioned copy with the same
+    columns is created with a partition per existing event, the rows are
+    copied across and the old table is dropped. The new table has no
+    triggers while the rows are copied, so change stamps are kept and the
+    stats tables stay valid; the caller attaches the triggers afterwards.
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'attendance'::regclass")
+    if cursor.fetchone()['relkind'] != 'r':
+        return False
+
+    cursor.execute("LOCK TABLE attendance IN ACCESS EXCLUSIVE MODE")
+    cursor.execute("ALTER TABLE attendance RENAME TO attendance_unpartitioned")
+    # The id sequence would otherwise be dropped along with the old table
+    cursor.execute("ALTER SEQUENCE attendance_id_seq OWNED BY NONE")
+    cursor.execute("""
+        CREATE TABLE attendance (LIKE attendance_unpartitioned INCLUDING DEFAULTS)
+        PARTITION BY LIST (event_id)
+    """)
+    cursor.execute("ALTER SEQUENCE attendance_id_seq OWNED BY attendance.id")
+    cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF attendance DEFAULT")
+    ensure_all_partitions(cursor)
+
+    cursor.execute("INSERT INTO attendance SELECT * FROM attendance_unpartitioned")
+    cursor.execute("DROP TABLE attendance_unpartitioned")
+
+    # Unique keys on a partitioned table must include the partition key
+    cursor.execute("ALTER TABLE attendance ADD PRIMARY KEY (event_id, id)")
+    cursor.execute("ALTER TABLE attendance ADD FOREIGN KEY (event_id) REFERENCES events(id)")
+    cursor.execute("ALTER TABLE attendance ADD FOREIGN KEY (student_no) REFERENCES students(student_no)")
+    cursor.execute("CREATE UNIQUE INDEX uq_attendance_event_student ON attendance(event_id, student_no)")
+    cursor.execute("CREATE INDEX idx_attendance_student_no ON attendance(student_no)")
+    cursor.execute("CREATE INDEX idx_attendance_event_xid ON attendance(event_id, change_xid)")
+    return True
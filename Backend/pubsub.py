@@ -0,0 +1,86 @@
+import os
+import select
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions
+from database import DATABASE_URL
+
+# Seconds between reconnect attempts, and the poll interval for new channels
+LISTEN_RETRY_SECONDS = float(os.getenv("LISTEN_RETRY_SECONDS", "2"))
+LISTEN_POLL_SECONDS = 1.0
+
+_handlers = {}  # channel -> [callback(payload)]
+_lock = threading.Lock()
+_listener_pid = None
+
+def publish(cursor, channel, payload):
+    """Queues a NOTIFY on the caller's transaction; it is delivered only if that transaction commits."""
+    cursor.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+def subscribe(channel, callback):
+    """
+    Registers callback(payload) for NOTIFYs on a channel. The callback also
+    receives None whenever the listener (re)connects, since notifications
+    sent while it was disconnected are lost.
+    """
+    with _lock:
+        _handlers.setdefault(channel, []).append(callback)
+    ensure_listener()
+
+def unsubscribe(channel, callback):
+    with _lock:
+        callbacks = _handlers.get(channel, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+def ensure_listener():
+    """Starts this process's listener thread (again after a fork) if it is not running."""
+    global _listener_pid
+    if _listener_pid == os.getpid() or not DATABASE_URL:
+        return
+    with _lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+    threading.Thread(target=_listen_forever, name='pg-listener', daemon=True).start()
+
+def _dispatch(channel, payload):
+    with _lock:
+        callbacks = list(_handlers.get(channel, []))
+    for callback in callbacks:
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"Notification handler error on {channel}: {e}")
+
+def _listen_forever():
+    while True:
+        try:
+            _listen()
+        except Exception as e:
+            print(f"Notification listener error: {e}")
+        time.sleep(LISTEN_RETRY_SECONDS)
+
+def _listen():
+    # A dedicated session, outside the pool: LISTEN registrations belong to the connection
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    cursor = conn.cursor()
+    listening = set()
+    try:
+        while True:
+            with _lock:
+                pending = set(_handlers) - listening
+            for channel in pending:
+                cursor.execute(f"LISTEN {extensions.quote_ident(channel, cursor)}")
+                listening.add(channel)
+                _dispatch(channel, None)
+
+            if select.select([conn], [], [], LISTEN_POLL_SECONDS)[0]:
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    _dispatch(notify.channel, notify.payload)
+    finally:
+        conn.close()
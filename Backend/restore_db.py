@@ -0,0 +1,26 @@
+import argparse
+import sys
+import time
+from app import app
+from database import get_db_connection
+from backup import restore_backup, BackupFormatError
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Restore a backup archive downloaded from /api/admin/backup.")
+    parser.add_argument('archive', help="path to the .gz backup file")
+    args = parser.parse_args()
+
+    print(f"Restoring {args.archive} into PostgreSQL. Existing rows in the backed-up tables will be replaced...")
+    started = time.perf_counter()
+    try:
+        with app.app_context(), open(args.archive, 'rb') as archive:
+            restored = restore_backup(get_db_connection(), archive)
+        for table, rows in restored.items():
+            print(f"  {table}: {rows} rows")
+        print(f"Restore finished in {time.perf_counter() - started:.1f}s.")
+    except BackupFormatError as e:
+        print(f"Restore refused: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Restore failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,212 @@
+import io
+import os
+from psycopg2.extras import execute_values
+from helpers import encrypt_data
+from name_index import search_tokens, collation_key, place_name_sort
+
+# Rows parsed, encrypted and upserted per transaction by the file importer
+ROSTER_CHUNK_SIZE = int(os.getenv("ROSTER_CHUNK_SIZE", "2000"))
+# Per-row errors beyond this are counted but not listed in the response
+ROSTER_MAX_ERRORS = 500
+
+ROSTER_FIELDS = ('student_no', 'first_name', 'middle_name', 'last_name', 'program', 'year_level', 'section')
+REQUIRED_FIELDS = ('student_no', 'first_name', 'last_name')
+
+# Spreadsheet headers are matched case- and punctuation-insensitively
+_HEADER_ALIASES = {
+    'student_no': ('student no', 'student number', 'student id', 'id number', 'id no', 'student_no'),
+    'first_name': ('first name', 'firstname', 'given name'),
+    'middle_name': ('middle name', 'middlename', 'middle initial', 'mi'),
+    'last_name': ('last name', 'lastname', 'surname', 'family name'),
+    'program': ('program', 'course'),
+    'year_level': ('year level', 'year', 'yr level'),
+    'section': ('section', 'block'),
+}
+
+def _normalize_header(value):
+    cleaned = ''.join(ch if ch.isalnum() else ' ' for ch in str(value or '').casefold())
+    return ' '.join(cleaned.split())
+
+_HEADER_LOOKUP = {_normalize_header(alias): field for field, aliases in _HEADER_ALIASES.items() for alias in aliases}
+
+class RosterFormatError(ValueError):
+    """The uploaded file cannot be read as a roster at all (as opposed to bad rows)."""
+
+def map_headers(headers):
+    """Returns {column position: field}, or raises RosterFormatError if a required column is missing."""
+    mapping = {}
+    for position, header in enumerate(headers):
+        field = _HEADER_LOOKUP.get(_normalize_header(header))
+        if field and field not in mapping.values():
+            mapping[position] = field
+    missing = [f for f in REQUIRED_FIELDS if f not in mapping.values()]
+    if missing:
+        raise RosterFormatError(f"Missing required column(s): {', '.join(missing)}")
+    return mapping
+
+def _clean(value):
+    if value is None:
+        return ''
+    # Spreadsheets hand back numeric IDs as floats (2300951.0)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return ' '.join(str(value).split())
+
+def prepare_rows(records, sort_keys=None):
+    """
+    Validates and encrypts (line, {field: value}) records. Returns the upsert
+    tuples plus a list of {'row', 'message'} errors. When a student number
+    repeats within the batch the last occurrence wins. If sort_keys is given it
+    collects each row's collation key for place_name_sort(known=...).
+    """
+    prepared, errors = {}, []
+    for line, record in records:
+        r = {field: _clean(record.get(field)) for field in ROSTER_FIELDS}
+        missing = [f for f in REQUIRED_FIELDS if not r[f]]
+        if missing:
+            if any(r.values()):  # wholly blank lines are skipped silently
+                errors.append({'row': line, 'message': f"Missing {', '.join(missing)}"})
+            continue
+        if r['student_no'] in prepared:
+            errors.append({'row': prepared[r['student_no']][0], 'message': f"Duplicate student_no {r['student_no']}; later row kept"})
+        prepared[r['student_no']] = (line, r)
+
+    rows = [
+        (r['student_no'], encrypt_data(r['first_name']), encrypt_data(r['middle_name']), encrypt_data(r['last_name']),
+         r['program'], r['year_level'], r['section'], search_tokens(r['first_name'], r['last_name']))
+        for _, r in prepared.values()
+    ]
+    if sort_keys is not None:
+        for _, r in prepared.values():
+            sort_keys[r['student_no']] = collation_key(r['first_name'], r['middle_name'], r['last_name'], r['student_no'])
+    return rows, errors
+
+def upsert_students(cursor, rows, refresh_order=True):
+    """
+    Inserts or updates prepared roster rows. Bulk callers pass refresh_order=False
+    and call place_name_sort() once at the end instead of once per chunk.
+    Returns how many students were left unranked (see place_name_sort()).
+    """
+    execute_values(cursor, """
+        INSERT INTO students (student_no, first_name, middle_name, last_name, program, year_level, section, name_search)
+        VALUES %s
+        ON CONFLICT (student_no) DO UPDATE SET
+            first_name = EXCLUDED.first_name,
+            middle_name = EXCLUDED.middle_name,
+            last_name = EXCLUDED.last_name,
+            program = EXCLUDED.program,
+            year_level = EXCLUDED.year_level,
+            section = EXCLUDED.section,
+            name_search = EXCLUDED.name_search
+    """, rows, page_size=1000)
+    if refresh_order:
+        return place_name_sort(cursor, [row[0] for row in rows])
+    return 0
+
+def read_roster_file(stream, filename, chunk_size=ROSTER_CHUNK_SIZE):
+    """Yields lists of (line, {field: value}) from an uploaded .csv or .xlsx, chunk_size rows at a time."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return _read_csv(stream, chunk_size)
+    if extension in ('.xlsx', '.xlsm'):
+        return _read_xlsx(stream, chunk_size)
+    raise RosterFormatError("Unsupported file type. Upload a .csv or .xlsx file.")
+
+def _read_csv(stream, chunk_size):
+    import pandas as pd  # heavy; only the import path needs it
+
+    try:
+        reader = pd.read_csv(stream, dtype=str, keep_default_na=False, chunksize=chunk_size,
+                             encoding='utf-8-sig', skip_blank_lines=False)
+        first = next(reader, None)
+    except (ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        raise RosterFormatError(f"Could not read CSV: {e}")
+    if first is None:
+        return
+
+    mapping = map_headers(first.columns)
+    line = 2  # line 1 holds the headers
+    for frame in ([first], reader):
+        for chunk in frame:
+            columns = {field: chunk.iloc[:, position].tolist() for position, field in mapping.items()}
+            records = []
+            for i in range(len(chunk)):
+                records.append((line, {field: values[i] for field, values in columns.items()}))
+                line += 1
+            yield records
+
+def _read_xlsx(stream, chunk_size):
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise RosterFormatError(f"Could not read workbook: {e}")
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        mapping = map_headers(headers)
+
+        records = []
+        for line, values in enumerate(rows, start=2):
+            records.append((line, {field: values[position] if position < len(values) else None
+                                   for position, field in mapping.items()}))
+            if len(records) >= chunk_size:
+                yield records
+                records = []
+        if records:
+            yield records
+    finally:
+        workbook.close()
+
+# --- COPY bulk path ---
+# COPY skips per-row statement parsing; the ON CONFLICT merge then runs once, set-based
+_STAGE_COLUMNS = "student_no, first_name, middle_name, last_name, program, year_level, section, name_search"
+
+def _copy_field(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def begin_student_stage(cursor):
+    """Creates this transaction's staging table for stage_students()/merge_student_stage()."""
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS students_stage (
+            seq BIGSERIAL,
+            student_no TEXT, first_name TEXT, middle_name TEXT, last_name TEXT,
+            program TEXT, year_level TEXT, section TEXT, name_search TEXT[]
+        ) ON COMMIT DROP
+    """)
+
+def stage_students(cursor, rows):
+    """Streams prepared roster rows into students_stage with COPY FROM STDIN."""
+    buffer = io.StringIO()
+    for row in rows:
+        *values, tokens = row
+        # Blind-index tokens are hex, so the array literal needs no quoting
+        buffer.write('\t'.join([_copy_field(v) for v in values] + ['{' + ','.join(tokens) + '}']))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY students_stage ({_STAGE_COLUMNS}) FROM STDIN", buffer)
+
+def merge_student_stage(cursor):
+    """Upserts everything staged in this transaction into students. Returns the merged row count."""
+    cursor.execute(f"""
+        INSERT INTO students ({_STAGE_COLUMNS})
+        SELECT DISTINCT ON (student_no) {_STAGE_COLUMNS}
+        FROM students_stage
+        ORDER BY student_no, seq DESC
+        ON CONFLICT (student_no) DO UPDATE SET
+            first_name = EXCLUDED.first_name,
+            middle_name = EXCLUDED.middle_name,
+            last_name = EXCLUDED.last_name,
+            program = EXCLUDED.program,
+            year_level = EXCLUDED.year_level,
+            section = EXCLUDED.section,
+            name_search = EXCLUDED.name_search
+    """)
+    merged = cursor.rowcount
+    cursor.execute("TRUNCATE students_stage")
+    return merged
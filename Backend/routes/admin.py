@@ -1,8 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from werkzeug.security import generate_password_hash
+import datetime
+import time
 import psycopg2 # Updated: Using psycopg2 instead of sqlite3
-from database import get_db_connection
-from helpers import log_action
+from database import get_db_connection, get_pool_stats, stream_connection
+from cache import invalidate_event, invalidate_settings, invalidate_officer, cache_stats
+from helpers import log_action, decrypt_cache_stats, get_session_claims
+from audit import audit_stats
+from backup import stream_backup, restore_backup, BackupFormatError
+from partitions import purge_event_attendance
+from metrics import render_prometheus
+import slow_queries
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -29,8 +37,8 @@ def create_officer():
     try:
         # Updated: Changed '?' to '%s'
         cursor.execute("INSERT INTO officers (username, password_hash, role) VALUES (%s, %s, %s)", (username, hashed_pw, role))
-        log_action('Superadmin', 'CREATE_OFFICER', f'Created officer: {username}')
         db.commit()
+        log_action('Superadmin', 'CREATE_OFFICER', f'Created officer: {username}')
         return jsonify({'message': 'Officer created'}), 201
     except psycopg2.IntegrityError: # Updated: Postgres specific integrity error
         db.rollback()
@@ -50,8 +58,9 @@ def save_system_settings():
                 INSERT INTO settings (key, value) VALUES (%s, %s)
                 ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
             """, (key, str(value)))
-        log_action('Admin', 'UPDATE_SETTINGS', 'Updated global configuration')        
+        invalidate_settings(cursor)
         db.commit()
+        log_action('Admin', 'UPDATE_SETTINGS', 'Updated global configuration')
         return jsonify({'message': 'Settings updated.'}), 200
     except Exception as e:
         db.rollback()
@@ -68,18 +77,124 @@ def get_audit_logs():
     cursor.close()
     return jsonify([dict(row) for row in logs]), 200
 
+@admin_bp.route('/api/admin/pool_stats', methods=['GET'])
+def pool_stats():
+    """Connection pool counters for this worker, used to size DB_POOL_MAX."""
+    return jsonify(get_pool_stats()), 200
+
+@admin_bp.route('/api/admin/cache_stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters for the decrypted-name LRU and the event/settings caches."""
+    stats = cache_stats()
+    stats['decrypted_names'] = decrypt_cache_stats()
+    return jsonify(stats), 200
+
+@admin_bp.route('/api/admin/audit_stats', methods=['GET'])
+def get_audit_stats():
+    """Background audit writer counters for this worker; non-zero `dropped` means AUDIT_QUEUE_SIZE is too small."""
+    return jsonify(audit_stats()), 200
+
+def _request_claims():
+    """Session claims for the request's `Authorization: Bearer <token>` header, or None."""
+    auth = request.headers.get('Authorization', '')
+    return get_session_claims(auth[len('Bearer '):] if auth.startswith('Bearer ') else None)
+
+def _is_admin_request():
+    """True if the request carries an admin session token as `Authorization: Bearer <token>`."""
+    claims = _request_claims()
+    return bool(claims and claims['role'] == 'admin')
+
+def _admin_denied(claims):
+    """The 401/403 response for a destructive admin endpoint, or None if `claims` is an admin's."""
+    if not claims:
+        return jsonify({'message': 'Admin session required'}), 401
+    if claims['role'] != 'admin':
+        return jsonify({'message': 'Admin role required'}), 403
+    return None
+
+@admin_bp.route('/api/admin/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Per-endpoint request counts, latency histograms, SQL statements, DB time,
+    rows and encryption time for this worker, in Prometheus text format.
+    Needs an admin session token as `Authorization: Bearer <token>`.
+    """
+    if not _is_admin_request():
+        return jsonify({'message': 'Admin session required'}), 401
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/api/admin/slow_queries', methods=['GET', 'DELETE'])
+def get_slow_queries():
+    """
+    Statements slower than SLOW_QUERY_MS on this worker, grouped by normalized
+    SQL with the slowest logged example (redacted parameters and plan).
+    Query: sort=total_ms|max_ms|calls, limit. DELETE clears the list.
+    Needs an admin session token, as for /api/admin/metrics.
+    """
+    if not _is_admin_request():
+        return jsonify({'message': 'Admin session required'}), 401
+    if request.method == 'DELETE':
+        slow_queries.reset()
+        return jsonify({'message': 'Slow query log cleared.'}), 200
+
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'max_ms', 'calls'):
+        return jsonify({'message': 'sort must be total_ms, max_ms or calls.'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), slow_queries.SLOW_QUERY_MAX_ENTRIES)
+    except ValueError:
+        return jsonify({'message': 'Invalid limit.'}), 400
+    return jsonify({
+        'threshold_ms': slow_queries.SLOW_QUERY_MS,
+        'queries': slow_queries.worst(sort, limit),
+    }), 200
+
 @admin_bp.route('/api/admin/backup', methods=['GET'])
 def backup_database():
+    """Streams a gzip archive of every table (format in backup.py), built straight from COPY output."""
+    filename = f"ams_backup_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.gz"
+
+    def generate():
+        # The request's connection is returned when the view returns, before streaming starts
+        with stream_connection() as conn:
+            yield from stream_backup(conn)
+
+    response = Response(stream_with_context(generate()), mimetype='application/gzip')
+    response.headers['Content-Disposition'] = f"attachment; filename={filename}"
+    return response
+
+@admin_bp.route('/api/admin/restore', methods=['POST'])
+def restore_database():
+    """
+    Loads a /api/admin/backup archive (multipart 'file', or the raw request body),
+    replacing current data, officers included. Needs an admin session token as
+    `Authorization: Bearer <token>`.
+    """
+    claims = _request_claims()
+    denied = _admin_denied(claims)
+    if denied:
+        return denied
+    actor = claims['username']
+
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+
     db = get_db_connection()
-    cursor = db.cursor()
-    tables = ['students', 'attendance', 'events', 'officers', 'settings', 'sections']
-    backup_data = {}
-    for table in tables:
-        cursor.execute(f"SELECT * FROM {table}")
-        rows = cursor.fetchall()
-        backup_data[table] = [dict(row) for row in rows]
-    cursor.close()
-    return jsonify(backup_data), 200
+    started = time.perf_counter()
+    try:
+        restored = restore_backup(db, stream)
+    except BackupFormatError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        print(f"Restore Error: {str(e)}")
+        return jsonify({'message': f"Restore failed: {str(e)}"}), 500
+
+    log_action(actor, 'RESTORE_BACKUP', f"Restored {sum(restored.values())} rows across {len(restored)} tables")
+    return jsonify({
+        'message': 'Backup restored.',
+        'tables': restored,
+        'seconds': round(time.perf_counter() - started, 2),
+    }), 200
 
 @admin_bp.route('/api/admin/maintenance/flush', methods=['POST'])
 def flush_data():
@@ -98,8 +213,8 @@ def flush_data():
     
     try:
         cursor.execute("TRUNCATE TABLE attendance RESTART IDENTITY CASCADE")
-        log_action(actor, 'FLUSH_DATA', 'Wiped all attendance records.')
         db.commit()
+        log_action(actor, 'FLUSH_DATA', 'Wiped all attendance records.')
         return jsonify({'message': 'All attendance records have been wiped.'}), 200
         
     except Exception as e:
@@ -130,8 +245,12 @@ def revoke_session():
     db = get_db_connection()
     cursor = db.cursor()
     try:
-        # Updated: Changed '?' to '%s'
-        cursor.execute("UPDATE officers SET session_token = NULL WHERE username = %s", (username,))
+        # Bumping the generation invalidates every token the officer holds
+        cursor.execute("""
+            UPDATE officers SET session_token = NULL, token_generation = token_generation + 1
+            WHERE username = %s
+        """, (username,))
+        invalidate_officer(cursor, username)
         db.commit()
         return jsonify({'message': f'Session revoked for {username}.'}), 200
     except Exception as e:
@@ -154,12 +273,14 @@ def update_officer(username):
         if password: 
             from werkzeug.security import generate_password_hash
             hashed_pw = generate_password_hash(password)
-            cursor.execute("UPDATE officers SET role=%s, is_active=%s, password_hash=%s WHERE username=%s", 
+            cursor.execute("UPDATE officers SET role=%s, is_active=%s, password_hash=%s, token_generation=token_generation+1 WHERE username=%s", 
                            (role, is_active, hashed_pw, username))
         else:
-            cursor.execute("UPDATE officers SET role=%s, is_active=%s WHERE username=%s", 
+            cursor.execute("UPDATE officers SET role=%s, is_active=%s, token_generation=token_generation+1 WHERE username=%s", 
                            (role, is_active, username))
         
+        # Tokens carry the old role, so force the officer to sign in again
+        invalidate_officer(cursor, username)
         db.commit()
         return jsonify({"message": "Officer updated successfully"}), 200
     except Exception as e:
@@ -186,16 +307,50 @@ def recover_event(event_id):
     cursor = db.cursor()
     try:
         cursor.execute("UPDATE events SET deleted_at = NULL WHERE id = %s", (event_id,))
+        invalidate_event(cursor, event_id)
         
         cursor.execute("SELECT name FROM events WHERE id = %s", (event_id,))
         event = cursor.fetchone()
         event_name = event['name'] if event else f"ID {event_id}"
-        log_action(actor, 'RECOVER_EVENT', f"Recovered event: {event_name}")
-        
         db.commit()
+        log_action(actor, 'RECOVER_EVENT', f"Recovered event: {event_name}")
         return jsonify({'message': 'Event and associated attendance recovered successfully.'}), 200
     except Exception as e:
         db.rollback()
         return jsonify({'message': str(e)}), 500
+    finally:
+        cursor.close()
+
+@admin_bp.route('/api/admin/events/<int:event_id>/purge', methods=['POST'])
+def purge_event(event_id):
+    """
+    Permanently deletes an archived event and its attendance (a partition drop
+    when partitioned). Needs an admin session token, as for /api/admin/restore.
+    """
+    claims = _request_claims()
+    denied = _admin_denied(claims)
+    if denied:
+        return denied
+    actor = claims['username']
+
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT name, deleted_at FROM events WHERE id = %s FOR UPDATE", (event_id,))
+        event = cursor.fetchone()
+        if not event:
+            return jsonify({'message': 'Event not found.'}), 404
+        if event['deleted_at'] is None:
+            return jsonify({'message': 'Archive the event before purging it.'}), 409
+
+        purge_event_attendance(cursor, event_id)
+        cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+        invalidate_event(cursor, event_id)
+        db.commit()
+        log_action(actor, 'PURGE_EVENT', f"Permanently deleted event: {event['name']}")
+        return jsonify({'message': 'Event and its attendance permanently deleted.'}), 200
+    except Exception as e:
+        db.rollback()
+        return jsonify({'message': str(e)}), 500
     finally:
         cursor.close()
\ No newline at end of file
@@ -0,0 +1,159 @@
+import datetime
+from flask import Blueprint, request, jsonify
+from database import get_db_connection
+from helpers import decrypt_data
+import analytics
+
+analytics_bp = Blueprint('analytics', __name__)
+
+ANALYTICS_PAGE_DEFAULT = 50
+ANALYTICS_PAGE_MAX = 500
+# ?sort= value -> (column, tie-breaker) of the students frame
+STUDENT_SORTS = {
+    'rate': ('rate', 'attended'),
+    'tardy': ('tardy', 'rate'),
+    'streak': ('current_streak', 'longest_streak'),
+    'longest_streak': ('longest_streak', 'current_streak'),
+    'student_no': ('student_no', 'student_no'),
+}
+
+def _valid_date(value):
+    if not value:
+        return None
+    datetime.date.fromisoformat(value)
+    return value
+
+def _load_report(args):
+    """Report for the ?from=/?to= range, or a (response, code) error."""
+    try:
+        date_from, date_to = _valid_date(args.get('from')), _valid_date(args.get('to'))
+    except ValueError:
+        return None, (jsonify({'message': 'from and to must be YYYY-MM-DD dates.'}), 400)
+
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        report = analytics.get_report(cursor, date_from, date_to)
+        db.commit()
+        return report, None
+    except Exception as e:
+        db.rollback()
+        print(f"Analytics Error: {str(e)}")
+        return None, (jsonify({'message': 'Failed to compute analytics', 'error': str(e)}), 500)
+    finally:
+        cursor.close()
+
+def _report_meta(report):
+    return {
+        'version': report.version,
+        # Tardy: first IN after this time, or null when it is each event's AM
+        # cutoff (i.e. checked in only for the PM session)
+        'late_after': report.late_after,
+        'computed_at': datetime.datetime.fromtimestamp(report.computed_at).isoformat(timespec='seconds'),
+        'events': len(report.events),
+        'from': report.events[0]['date'] if report.events else None,
+        'to': report.events[-1]['date'] if report.events else None,
+    }
+
+def _student_records(frame):
+    records = frame[['student_no', 'program', 'year_level', 'section', 'events', 'attended', 'tardy',
+                     'rate', 'current_streak', 'longest_streak']].to_dict('records')
+    for r in records:
+        for column in ('events', 'attended', 'tardy', 'current_streak', 'longest_streak'):
+            r[column] = int(r[column])
+        r['rate'] = round(float(r['rate']), 4)
+    return records
+
+def _attach_names(records):
+    """Decrypts names for just the students being returned."""
+    if not records:
+        return records
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT student_no, first_name, last_name FROM students WHERE student_no = ANY(%s)",
+                       ([r['student_no'] for r in records],))
+        names = {row['student_no']: row for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+    for r in records:
+        row = names.get(r['student_no'])
+        r['first_name'] = decrypt_data(row['first_name']) if row else None
+        r['last_name'] = decrypt_data(row['last_name']) if row else None
+    return records
+
+@analytics_bp.route('/api/analytics/students', methods=['GET'])
+def student_analytics():
+    """
+    Per-student attendance rate, tardiness and streaks over past events
+    (see analytics.compute for what counts as tardy; `late_after` in the
+    response is the threshold used).
+    Query: optional from/to (YYYY-MM-DD), program, year, section filters,
+    sort=rate|tardy|streak|longest_streak|student_no, order=asc|desc,
+    limit and offset. Names are decrypted for the returned page only.
+    """
+    args = request.args
+    sort = args.get('sort', 'rate')
+    if sort not in STUDENT_SORTS:
+        return jsonify({'message': f"sort must be one of {', '.join(STUDENT_SORTS)}."}), 400
+    try:
+        limit = min(max(int(args.get('limit', ANALYTICS_PAGE_DEFAULT)), 1), ANALYTICS_PAGE_MAX)
+        offset = max(int(args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'message': 'Invalid limit or offset.'}), 400
+
+    report, error = _load_report(args)
+    if error:
+        return error
+
+    frame = report.students
+    for column, arg in (('program', 'program'), ('year_level', 'year'), ('section', 'section')):
+        value = args.get(arg)
+        if value and value != 'All':
+            frame = frame[frame[column] == value]
+    ascending = args.get('order', 'desc' if sort != 'student_no' else 'asc') == 'asc'
+    primary, secondary = STUDENT_SORTS[sort]
+    columns = list(dict.fromkeys([primary, secondary, 'student_no']))
+    frame = frame.sort_values(columns, ascending=[ascending] * (len(columns) - 1) + [True], kind='stable')
+
+    page = _attach_names(_student_records(frame.iloc[offset:offset + limit]))
+    return jsonify({**_report_meta(report), 'total': len(frame), 'students': page}), 200
+
+@analytics_bp.route('/api/analytics/students/<student_no>', methods=['GET'])
+def student_analytics_detail(student_no):
+    """One student's metrics plus the per-event attended/tardy flags behind them."""
+    report, error = _load_report(request.args)
+    if error:
+        return error
+    if student_no not in report.students.index:
+        return jsonify({'message': 'Student not found'}), 404
+
+    record = _attach_names(_student_records(report.students.loc[[student_no]]))[0]
+    record['history'] = report.history(student_no)
+    return jsonify({**_report_meta(report), 'student': record}), 200
+
+@analytics_bp.route('/api/analytics/sections', methods=['GET'])
+def section_analytics():
+    """
+    Per-section attendance rate (attended / students x events) and tardy
+    rate (tardy / attended) over past events. Query: optional from/to and
+    program/year filters.
+    """
+    args = request.args
+    report, error = _load_report(args)
+    if error:
+        return error
+
+    frame = report.sections
+    for column, arg in (('program', 'program'), ('year_level', 'year')):
+        value = args.get(arg)
+        if value and value != 'All':
+            frame = frame[frame[column] == value]
+
+    sections = frame.to_dict('records')
+    for s in sections:
+        for column in ('students', 'attended', 'tardy'):
+            s[column] = int(s[column])
+        s['rate'] = round(float(s['rate']), 4)
+        s['tardy_rate'] = round(float(s['tardy_rate']), 4)
+    return jsonify({**_report_meta(report), 'sections': sections}), 200
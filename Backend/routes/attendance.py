@@ -1,125 +1,186 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from datetime import datetime
 import csv
-from io import StringIO
-from database import get_db_connection
+import queue
+import time
+from io import StringIO, BytesIO
+from database import get_db_connection, stream_connection
+from cache import get_event
+import broadcast
 from helpers import decrypt_data
 from helpers import is_session_valid
 
 attendance_bp = Blueprint('attendance', __name__)
 
+# Outcome codes returned by the attendance_check_in() SQL function
+CHECK_IN_RESULTS = {
+    'in_first':    (200, 'in',    "Time IN recorded, {name}!"),
+    'in':          (200, 'in',    "{session} Time IN recorded, {name}."),
+    'already_in':  (400, 'error', "{name}, you have already Timed IN for the {session} session."),
+    'out':         (200, 'out',   "{session} Time OUT recorded, {name}."),
+    'no_record':   (400, 'error', "Cannot Time OUT. No Time IN record found for {name}."),
+    'not_in':      (400, 'error', "Cannot Time OUT. You haven't Timed IN for {session} yet."),
+    'already_out': (400, 'error', "You have already Timed OUT for {session}."),
+}
+MAX_BATCH_SCANS = 5000
+# events.id is a 32-bit serial
+MAX_EVENT_ID = 2**31 - 1
+EXPORT_BATCH_SIZE = 2000
+SSE_HEARTBEAT_SECONDS = 15
+
+def _is_am_session(event, at):
+    """True if a scan at `at` falls in the event's AM session."""
+    cutoff_str = event['am_cutoff'] or '12:00'
+    try:
+        return at.time() <= datetime.strptime(cutoff_str, '%H:%M').time()
+    except ValueError:
+        return at.hour < 12
+
+def _check_in_payload(result, student_no, time_str):
+    """Turns an attendance_check_in() row into the popup JSON and its HTTP status."""
+    outcome = result['outcome']
+    if outcome == 'unknown_student':
+        return {'message': f'Student ID {student_no} is not registered.'}, 404
+    if outcome == 'unknown_event':
+        return {'message': 'Event not found.', 'status': 'error'}, 404
+
+    real_first_name = decrypt_data(result['first_name'])
+    http_status, status_type, template = CHECK_IN_RESULTS[outcome]
+    message = template.format(name=real_first_name, session=result['session'])
+
+    if status_type == 'error':
+        return {'message': message, 'status': status_type}, http_status
+    return {'message': message, 'status': status_type, 'time': time_str, 'student_name': real_first_name}, http_status
+
+def _parse_scan_time(value, fallback):
+    """Client scan timestamps (ISO 8601) converted to the server's local wall-clock time."""
+    if not value:
+        return fallback
+    try:
+        at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return fallback
+    return at.astimezone().replace(tzinfo=None) if at.tzinfo else at
+
+def _scan_event_id(value):
+    """A queued scan's event_id as an int, or None if it is not a valid event id."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        return None
+    return value if 0 < value <= MAX_EVENT_ID else None
+
 @attendance_bp.route('/api/check_in', methods=['POST'])
 def check_in_student():
-    data = request.get_json()
-    event_id = data.get('event_id')
+    data = request.get_json(silent=True)
+    data = data if isinstance(data, dict) else {}
+    event_id = _scan_event_id(data.get('event_id'))
     student_no = data.get('student_no')
 
-    if not event_id or not student_no:
+    if not data.get('event_id') or not student_no:
         return jsonify({'message': 'Missing event_id or student_no.'}), 400
+    if event_id is None or not isinstance(student_no, (str, int)) or isinstance(student_no, bool):
+        return jsonify({'message': 'Invalid event_id or student_no.', 'status': 'error'}), 400
+    student_no = str(student_no)
 
     db = get_db_connection()
     cursor = db.cursor() 
-    
-    # Validate Student
-    cursor.execute("SELECT first_name, last_name FROM students WHERE student_no = %s", (student_no,))
-    student_info = cursor.fetchone()
-    
-    if student_info is None:
-        return jsonify({'message': f'Student ID {student_no} is not registered.'}), 404
 
-    s_info = dict(student_info)
-    real_first_name = decrypt_data(s_info['first_name'])
-    
-    cursor.execute("SELECT am_cutoff, attendance_mode FROM events WHERE id = %s", (event_id,))
-    event_data = cursor.fetchone()
+    now = datetime.now()
+    current_time_str = now.strftime('%I:%M %p') # For the UI Popup
 
-    cutoff_str = event_data['am_cutoff'] if event_data and event_data['am_cutoff'] else '12:00'
-    mode = event_data['attendance_mode'] if event_data else 'IN'
-    
     try:
-        cutoff_time = datetime.strptime(cutoff_str, '%H:%M').time()
-        current_time = datetime.now().time()
-        is_am = current_time <= cutoff_time
-        
-        current_time_str = datetime.now().strftime('%I:%M %p') # For the UI Popup
-        db_timestamp = datetime.now().isoformat()              # For PostgreSQL
-    except ValueError:
-        is_am = datetime.now().hour < 12
-        current_time_str = datetime.now().strftime('%I:%M %p')
-        db_timestamp = datetime.now().isoformat()
+        # Cutoff and mode come from the event cache, so the scan itself is a single write
+        event = get_event(cursor, event_id)
+        if event is None:
+            return jsonify({'message': 'Event not found.', 'status': 'error'}), 404
 
-    cursor.execute(
-        "SELECT * FROM attendance WHERE event_id = %s AND student_no = %s", 
-        (event_id, student_no)
-    )
-    record = cursor.fetchone()
+        # Student lookup and the IN/OUT write in one atomic statement
+        cursor.execute("SELECT * FROM attendance_check_in(%s, %s, %s, %s, %s)",
+                       (event_id, student_no, now, event['attendance_mode'] or 'IN', _is_am_session(event, now)))
+        result = cursor.fetchone()
+        db.commit()
+    except Exception as e:
+        db.rollback() 
+        return jsonify({'message': f'Database error: {str(e)}'}), 500
+    finally:
+        cursor.close()
 
-    message = ""
-    status_type = "info"
+    payload, http_status = _check_in_payload(result, student_no, current_time_str)
+    return jsonify(payload), http_status
 
+@attendance_bp.route('/api/check_in/batch', methods=['POST'])
+def check_in_batch():
+    """
+    Replays an ordered queue of offline scans in one transaction.
+    Body: {"scans": [{"student_no", "event_id", "scanned_at"}, ...]}
+    Returns one result per scan, in order, shaped like /api/check_in responses.
+    """
+    data = request.get_json(silent=True) or {}
+    scans = data.get('scans') if isinstance(data, dict) else data
+
+    if not isinstance(scans, list) or not scans:
+        return jsonify({'message': 'Expected a non-empty "scans" array.'}), 400
+    if len(scans) > MAX_BATCH_SCANS:
+        return jsonify({'message': f'At most {MAX_BATCH_SCANS} scans per batch.'}), 400
+
+    db = get_db_connection()
+    cursor = db.cursor()
+    now = datetime.now()
+
+    results = [None] * len(scans)
+    pending = []  # (index, event_id, student_no, at, mode, is_am)
     try:
-        if mode == 'IN':
-            if record is None:
-                # First scan ever for this event
-                time_col = 'am_in' if is_am else 'pm_in'
-                cursor.execute(f"INSERT INTO attendance (event_id, student_no, {time_col}, status) VALUES (%s, %s, %s, 'Present')", 
-                               (event_id, student_no, db_timestamp))
-                message = f"Time IN recorded, {real_first_name}!"
-                status_type = "in"
-            else:
-                record_id = record['id']
-                # Record exists. Check if they already timed in for the current session (AM or PM)
-                if is_am:
-                    if record['am_in']:
-                        return jsonify({'message': f"{real_first_name}, you have already Timed IN for the AM session.", 'status': 'error'}), 400
-                    else:
-                        cursor.execute("UPDATE attendance SET am_in = %s, status = 'Present' WHERE id = %s", (db_timestamp, record_id))
-                        message = f"AM Time IN recorded, {real_first_name}."
-                        status_type = "in"
-                else: # is PM
-                    if record['pm_in']:
-                        return jsonify({'message': f"{real_first_name}, you have already Timed IN for the PM session.", 'status': 'error'}), 400
-                    else:
-                        cursor.execute("UPDATE attendance SET pm_in = %s, status = 'Present' WHERE id = %s", (db_timestamp, record_id))
-                        message = f"PM Time IN recorded, {real_first_name}."
-                        status_type = "in"
-
-        # ---------------------------
-        # TIME OUT MODE LOGIC
-        # ---------------------------
-        elif mode == 'OUT':
-            if record is None:
-                return jsonify({'message': f"Cannot Time OUT. No Time IN record found for {real_first_name}.", 'status': 'error'}), 400
-
-            record_id = record['id']
-            if is_am:
-                if not record['am_in']:
-                    return jsonify({'message': f"Cannot Time OUT. You haven't Timed IN for AM yet.", 'status': 'error'}), 400
-                if record['am_out']:
-                    return jsonify({'message': f"You have already Timed OUT for AM.", 'status': 'error'}), 400
-
-                cursor.execute("UPDATE attendance SET am_out = %s WHERE id = %s", (db_timestamp, record_id))
-                message = f"AM Time OUT recorded, {real_first_name}."
-                status_type = "out"
-            else: # is PM
-                if not record['pm_in']:
-                    return jsonify({'message': f"Cannot Time OUT. You haven't Timed IN for PM yet.", 'status': 'error'}), 400
-                if record['pm_out']:
-                    return jsonify({'message': f"You have already Timed OUT for PM.", 'status': 'error'}), 400
-
-                cursor.execute("UPDATE attendance SET pm_out = %s WHERE id = %s", (db_timestamp, record_id))
-                message = f"PM Time OUT recorded, {real_first_name}."
-                status_type = "out"
+        for index, scan in enumerate(scans):
+            scan = scan if isinstance(scan, dict) else {}
+            event_id, student_no = _scan_event_id(scan.get('event_id')), scan.get('student_no')
+            if not scan.get('event_id') or not student_no:
+                results[index] = ({'message': 'Missing event_id or student_no.', 'status': 'error'}, 400)
+                continue
+            if event_id is None or not isinstance(student_no, (str, int)) or isinstance(student_no, bool):
+                results[index] = ({'message': 'Invalid event_id or student_no.', 'status': 'error'}, 400)
+                continue
 
-        db.commit()
-        return jsonify({'message': message, 'status': status_type, 'time': current_time_str, 'student_name': real_first_name}), 200 
+            event = get_event(cursor, event_id)
+            if event is None:
+                results[index] = ({'message': 'Event not found.', 'status': 'error'}, 404)
+                continue
 
+            at = _parse_scan_time(scan.get('scanned_at') or scan.get('timestamp'), now)
+            pending.append((index, event_id, str(student_no), at,
+                            event['attendance_mode'] or 'IN', _is_am_session(event, at)))
+
+        if pending:
+            # One set-based statement; the function runs once per scan in queue order,
+            # so later scans see the rows written by earlier ones
+            columns = list(zip(*pending))
+            cursor.execute("""
+                SELECT s.ord, r.outcome, r.session, r.first_name
+                FROM unnest(%s::int[], %s::text[], %s::timestamp[], %s::text[], %s::boolean[])
+                     WITH ORDINALITY AS s(event_id, student_no, at, mode, is_am, ord)
+                CROSS JOIN LATERAL attendance_check_in(s.event_id, s.student_no, s.at, s.mode, s.is_am) r
+                ORDER BY s.ord
+            """, (list(columns[1]), list(columns[2]), list(columns[3]), list(columns[4]), list(columns[5])))
+            rows = cursor.fetchall()
+        db.commit()
     except Exception as e:
-        db.rollback() 
+        db.rollback()
         return jsonify({'message': f'Database error: {str(e)}'}), 500
     finally:
         cursor.close()
 
+    if pending:
+        for (index, event_id, student_no, at, _, _), row in zip(pending, rows):
+            results[index] = _check_in_payload(row, student_no, at.strftime('%I:%M %p'))
+
+    response = []
+    for scan, (payload, http_status) in zip(scans, results):
+        scan = scan if isinstance(scan, dict) else {}
+        response.append(dict(payload, student_no=scan.get('student_no'), event_id=scan.get('event_id'), code=http_status))
+    return jsonify({'results': response}), 200
+
 @attendance_bp.route('/api/export/attendance/<int:event_id>', methods=['GET'])
 def export_csv(event_id):
     db = get_db_connection()
@@ -128,33 +189,43 @@ def export_csv(event_id):
     # Updated '?' to '%s'
     cursor.execute("SELECT name FROM events WHERE id = %s", (event_id,))
     event = cursor.fetchone()
-    if not event: return jsonify({'message': 'Event not found'}), 404
-    
-    # Updated '?' to '%s'
-    cursor.execute("""
-        SELECT s.student_no, s.last_name, s.first_name, s.program, s.year_level, s.section,
-               a.am_in, a.am_out, a.pm_in, a.pm_out, a.status
-        FROM attendance a JOIN students s ON a.student_no = s.student_no
-        WHERE a.event_id = %s AND a.deleted_at IS NULL 
-        ORDER BY s.last_name ASC
-    """, (event_id,))
-    records = cursor.fetchall()
-
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Student No', 'Last Name', 'First Name', 'Program', 'Year', 'Section', 'AM In', 'AM Out', 'PM In', 'PM Out', 'Status'])
-    
-    for r in records:
-        d_last = decrypt_data(r['last_name'])
-        d_first = decrypt_data(r['first_name'])
-        
-        writer.writerow([r['student_no'], d_last, d_first, r['program'], r['year_level'], r['section'],
-                         r['am_in'] or '', r['am_out'] or '', r['pm_in'] or '', r['pm_out'] or '', r['status']])
-    
     cursor.close()
-    response = make_response(output.getvalue())
+    if not event: return jsonify({'message': 'Event not found'}), 404
+
+    def generate():
+        output = StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['Student No', 'Last Name', 'First Name', 'Program', 'Year', 'Section', 'AM In', 'AM Out', 'PM In', 'PM Out', 'Status'])
+
+        # Server-side cursor: rows arrive in batches, so memory stays flat for any event size
+        with stream_connection() as conn, conn.cursor(name=f'export_attendance_{event_id}') as records:
+            records.itersize = EXPORT_BATCH_SIZE
+            records.execute("""
+                SELECT s.student_no, s.last_name, s.first_name, s.program, s.year_level, s.section,
+                       a.am_in, a.am_out, a.pm_in, a.pm_out, a.status
+                FROM attendance a JOIN students s ON a.student_no = s.student_no
+                WHERE a.event_id = %s AND a.deleted_at IS NULL 
+                ORDER BY s.name_sort ASC, s.student_no ASC
+            """, (event_id,))
+
+            while True:
+                batch = records.fetchmany(EXPORT_BATCH_SIZE)
+                if not batch:
+                    break
+                for r in batch:
+                    d_last = decrypt_data(r['last_name'])
+                    d_first = decrypt_data(r['first_name'])
+
+                    writer.writerow([r['student_no'], d_last, d_first, r['program'], r['year_level'], r['section'],
+                                     r['am_in'] or '', r['am_out'] or '', r['pm_in'] or '', r['pm_out'] or '', r['status']])
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+
+            yield output.getvalue()
+
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
     response.headers['Content-Disposition'] = f"attachment; filename={event['name']}_Report.csv"
-    response.headers['Content-type'] = 'text/csv'
     return response
 
 @attendance_bp.route('/api/section_spreadsheet', methods=['GET'])
@@ -173,7 +244,7 @@ def section_spreadsheet():
             FROM students s 
             LEFT JOIN attendance a ON s.student_no = a.student_no AND a.event_id = %s AND a.deleted_at IS NULL
             WHERE s.program = %s AND s.year_level = %s AND s.section = %s 
-            ORDER BY s.last_name ASC
+            ORDER BY s.name_sort ASC, s.student_no ASC
         """
         cursor.execute(query, (args.get('event_id'), args.get('program'), args.get('year'), args.get('section')))
         results = cursor.fetchall()
@@ -203,70 +274,314 @@ def section_spreadsheet():
     finally:
         cursor.close()
 
+# Cell types a section matrix can carry, with their XLSX sheet titles
+MATRIX_FIELDS = {'status': 'Status', 'am_in': 'AM In', 'am_out': 'AM Out', 'pm_in': 'PM In', 'pm_out': 'PM Out'}
+
+def _pivot_section_matrix(rows, events, fields):
+    """
+    Turns long-form (student, event) rows into one students x events grid per
+    field. Students with no attendance in range come through with event_id NULL.
+    """
+    import pandas as pd  # heavy; only the matrix report needs it
+
+    frame = pd.DataFrame.from_records(rows, columns=['student_no', 'first_name', 'last_name', 'event_id', *MATRIX_FIELDS])
+    # Query order is name order; each student's name is decrypted exactly once
+    students = frame.drop_duplicates('student_no')[['student_no', 'first_name', 'last_name']].reset_index(drop=True)
+    students['first_name'] = students['first_name'].map(decrypt_data)
+    students['last_name'] = students['last_name'].map(decrypt_data)
+
+    event_ids = [e['id'] for e in events]
+    marked = frame.dropna(subset=['event_id']).astype({'event_id': 'int64'})
+    grids = {}
+    for field in fields:
+        grid = marked.pivot(index='student_no', columns='event_id', values=field)
+        grid = grid.reindex(index=students['student_no'], columns=event_ids)
+        if field == 'status':
+            grid = grid.fillna('Absent')
+        grids[field] = grid.astype(object).where(grid.notna(), None)
+    return students, grids
+
+def _section_matrix_xlsx(students, events, grids, title):
+    import pandas as pd
+
+    labels = [f"{e['name']} ({e['date']})" for e in events]
+    names = students.rename(columns={'student_no': 'Student No', 'last_name': 'Last Name', 'first_name': 'First Name'})
+    names = names[['Student No', 'Last Name', 'First Name']]
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        for field, grid in grids.items():
+            sheet = pd.concat([names, pd.DataFrame(grid.to_numpy(), columns=labels)], axis=1)
+            sheet.to_excel(writer, sheet_name=MATRIX_FIELDS[field], index=False)
+    response = Response(output.getvalue(),
+                        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response.headers['Content-Disposition'] = f"attachment; filename={title}_Attendance_Matrix.xlsx"
+    return response
+
+@attendance_bp.route('/api/section_matrix', methods=['GET'])
+def section_matrix():
+    """
+    Students x events attendance grid for one section across a date range.
+    Query: program, year, section, optional from/to (YYYY-MM-DD), fields
+    (comma list of status, am_in, am_out, pm_in, pm_out; default all) and
+    format=json|xlsx. JSON is columnar: each field holds one list per event,
+    aligned with the `students` arrays.
+    """
+    args = request.args
+    program, year, section = args.get('program'), args.get('year'), args.get('section')
+    if not (program and year and section):
+        return jsonify({'message': 'program, year and section are required.'}), 400
+    fields = [f for f in args.get('fields', ','.join(MATRIX_FIELDS)).split(',') if f in MATRIX_FIELDS] or ['status']
+
+    event_clauses, event_params = ["deleted_at IS NULL"], []
+    if args.get('from'):
+        event_clauses.append("date >= %s")
+        event_params.append(args['from'])
+    if args.get('to'):
+        event_clauses.append("date <= %s")
+        event_params.append(args['to'])
+
+    db = get_db_connection()
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"SELECT id, name, date FROM events WHERE {' AND '.join(event_clauses)} ORDER BY date, id",
+                       event_params)
+        events = [dict(e) for e in cursor.fetchall()]
+
+        # One pass over the section: every student, with their attendance in range (if any)
+        cursor.execute("""
+            SELECT s.student_no, s.first_name, s.last_name, a.event_id,
+                   COALESCE(a.status, 'Absent') AS status,
+                   a.am_in::text, a.am_out::text, a.pm_in::text, a.pm_out::text
+            FROM students s
+            LEFT JOIN attendance a ON a.student_no = s.student_no
+                 AND a.deleted_at IS NULL AND a.event_id = ANY(%s)
+            WHERE s.program = %s AND s.year_level = %s AND s.section = %s
+            ORDER BY s.name_sort ASC, s.student_no ASC
+        """, ([e['id'] for e in events], program, year, section))
+        rows = cursor.fetchall()
+    except Exception as e:
+        db.rollback()
+        print(f"Section Matrix Error: {str(e)}")
+        return jsonify({'message': 'Failed to build section matrix', 'error': str(e)}), 500
+    finally:
+        cursor.close()
+
+    students, grids = _pivot_section_matrix([tuple(r.values()) for r in rows], events, fields)
+    for e in events:
+        e['date'] = str(e['date'])
+
+    if args.get('format') == 'xlsx':
+        return _section_matrix_xlsx(students, events, grids, f"{program}_{year}_{section}".replace(' ', '_'))
+
+    payload = {
+        'events': events,
+        'students': {column: students[column].tolist() for column in ('student_no', 'last_name', 'first_name')},
+    }
+    for field, grid in grids.items():
+        payload[field] = grid.T.values.tolist()
+    return jsonify(payload), 200
+
+def _format_attendance_row(rec):
+    rec_dict = dict(rec)
+    rec_dict['date'] = str(rec_dict['date'])
+
+    # Decrypt Names for Live Log 
+    rec_dict['first_name'] = decrypt_data(rec_dict['first_name'])
+    rec_dict['middle_name'] = decrypt_data(rec_dict['middle_name'])
+    rec_dict['last_name'] = decrypt_data(rec_dict['last_name'])
+
+    # Determine Time In
+    if rec_dict['am_in']:
+        rec_dict['time_in'] = rec_dict['am_in']
+    elif rec_dict['pm_in']:
+        rec_dict['time_in'] = rec_dict['pm_in']
+    else:
+        rec_dict['time_in'] = None # Changed from "--:--"
+
+    # Determine Time Out
+    if rec_dict['pm_out']:
+         rec_dict['time_out'] = rec_dict['pm_out']
+    elif rec_dict['am_out']:
+         rec_dict['time_out'] = rec_dict['am_out']
+    else:
+         rec_dict['time_out'] = None # Changed from "--:--"
+
+    return rec_dict
+
 @attendance_bp.route('/api/attendance/<int:event_id>', methods=['GET'])
 def get_attendance_list(event_id):
+    """
+    Full live log, newest first. With ?since=<cursor> only rows inserted or
+    changed after that cursor are returned (oldest change first), as
+    {"rows": [...], "cursor": <new cursor>}; start from since=0. Rows are
+    keyed by student_no; rows archived since the cursor come back with
+    "deleted": true. Changes appear once every transaction that started
+    before them has finished, so a long-running transaction delays the feed.
+    """
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'message': 'Invalid since cursor.'}), 400
+        if since < 0:
+            return jsonify({'message': 'Invalid since cursor.'}), 400
+
     db = get_db_connection()
     cursor = db.cursor()
     
-    # Updated '?' to '%s'
+    if since is None:
+        # Updated '?' to '%s'
+        cursor.execute("""
+            SELECT 
+                s.student_no, s.first_name, s.middle_name, s.last_name, 
+                s.program, s.year_level, s.section,
+                a.am_in, a.am_out, a.pm_in, a.pm_out, a.status,
+                e.date
+            FROM attendance a
+            JOIN students s ON a.student_no = s.student_no
+            JOIN events e ON a.event_id = e.id
+            WHERE a.event_id = %s AND a.deleted_at IS NULL
+            ORDER BY a.id DESC
+        """, (event_id,))
+        attendance_records = cursor.fetchall()
+        cursor.close()
+        return jsonify([_format_attendance_row(rec) for rec in attendance_records]), 200
+
+    # The cursor is a transaction id horizon: every transaction below it has
+    # finished, so each change is handed out exactly once, when the horizon
+    # passes the transaction that wrote it. An index range scan on
+    # (event_id, change_xid) keeps the cost in line with the new scans.
+    cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS horizon")
+    horizon = int(cursor.fetchone()['horizon'])
     cursor.execute("""
         SELECT 
             s.student_no, s.first_name, s.middle_name, s.last_name, 
             s.program, s.year_level, s.section,
             a.am_in, a.am_out, a.pm_in, a.pm_out, a.status,
-            e.date
+            e.date, a.change_seq, a.deleted_at IS NOT NULL AS deleted
         FROM attendance a
         JOIN students s ON a.student_no = s.student_no
         JOIN events e ON a.event_id = e.id
-        WHERE a.event_id = %s AND a.deleted_at IS NULL
-        ORDER BY a.id DESC
-    """, (event_id,))
-    attendance_records = cursor.fetchall()
-    
-    formatted_attendance = []
-    for rec in attendance_records:
-        rec_dict = dict(rec)
-        rec_dict['date'] = str(rec_dict['date'])
-
-        # Decrypt Names for Live Log 
-        rec_dict['first_name'] = decrypt_data(rec_dict['first_name'])
-        rec_dict['middle_name'] = decrypt_data(rec_dict['middle_name'])
-        rec_dict['last_name'] = decrypt_data(rec_dict['last_name'])
-
-        # Determine Time In
-        if rec_dict['am_in']:
-            rec_dict['time_in'] = rec_dict['am_in']
-        elif rec_dict['pm_in']:
-            rec_dict['time_in'] = rec_dict['pm_in']
-        else:
-            rec_dict['time_in'] = None # Changed from "--:--"
-
-        # Determine Time Out
-        if rec_dict['pm_out']:
-             rec_dict['time_out'] = rec_dict['pm_out']
-        elif rec_dict['am_out']:
-             rec_dict['time_out'] = rec_dict['am_out']
-        else:
-             rec_dict['time_out'] = None # Changed from "--:--"
-
-        formatted_attendance.append(rec_dict)
-    
+        WHERE a.event_id = %s AND a.change_xid >= %s::text::xid8 AND a.change_xid < %s::text::xid8
+          AND (a.deleted_at IS NULL OR %s > 0)
+        ORDER BY a.change_seq ASC
+    """, (event_id, since, horizon, since))
+    changes = cursor.fetchall()
     cursor.close()
-    return jsonify(formatted_attendance), 200
+
+    rows = [_format_attendance_row(rec) for rec in changes]
+    return jsonify({'rows': rows, 'cursor': max(horizon, since)}), 200
+
+# ?breakdown= values for /api/stats and the section columns they group by
+STATS_BREAKDOWNS = {
+    'program': ['program'],
+    'year': ['program', 'year_level'],
+    'section': ['program', 'year_level', 'section'],
+}
+# Check-ins append counter deltas; a stats read folds them into the base rows
+# at most this often per worker
+STATS_FOLD_SECONDS = 5
+_last_fold = 0.0
+
+# An event's per-section counters: the folded rows plus the pending deltas
+_SECTION_STATS_SQL = """
+    SELECT program, year_level, section,
+           SUM(checked_in)::int AS checked_in, SUM(am_in)::int AS am_in, SUM(am_out)::int AS am_out,
+           SUM(pm_in)::int AS pm_in, SUM(pm_out)::int AS pm_out
+    FROM (
+        SELECT program, year_level, section, checked_in, am_in, am_out, pm_in, pm_out
+        FROM event_section_stats WHERE event_id = %(event_id)s
+        UNION ALL
+        SELECT program, year_level, section, checked_in, am_in, am_out, pm_in, pm_out
+        FROM attendance_stats_delta WHERE event_id = %(event_id)s
+    ) s
+    GROUP BY program, year_level, section
+"""
 
 @attendance_bp.route('/api/stats/<int:event_id>', methods=['GET'])
 def get_event_stats(event_id):
+    """Trigger-maintained counters; ?breakdown=program|year|section adds per-group rows."""
+    global _last_fold
+    breakdown = request.args.get('breakdown')
+    if breakdown and breakdown not in STATS_BREAKDOWNS:
+        return jsonify({'message': 'Invalid breakdown.'}), 400
+
     db = get_db_connection()
     cursor = db.cursor()
-    
-    cursor.execute("SELECT COUNT(*) AS checked_in_count FROM attendance WHERE event_id = %s", (event_id,))
+
+    if time.monotonic() - _last_fold >= STATS_FOLD_SECONDS:
+        _last_fold = time.monotonic()
+        cursor.execute("SELECT fold_attendance_stats()")
+        db.commit()
+
+    cursor.execute("""
+        SELECT COALESCE(SUM(checked_in), 0) AS checked_in,
+               COALESCE(SUM(am_in), 0) AS am_in, COALESCE(SUM(am_out), 0) AS am_out,
+               COALESCE(SUM(pm_in), 0) AS pm_in, COALESCE(SUM(pm_out), 0) AS pm_out
+        FROM (
+            SELECT checked_in, am_in, am_out, pm_in, pm_out FROM event_stats WHERE event_id = %(event_id)s
+            UNION ALL
+            SELECT checked_in, am_in, am_out, pm_in, pm_out FROM attendance_stats_delta WHERE event_id = %(event_id)s
+        ) s
+    """, {'event_id': event_id})
     stats_row = cursor.fetchone()
 
-    cursor.execute("SELECT COUNT(*) AS total_roster_size FROM students")
+    cursor.execute("SELECT COALESCE(SUM(students), 0) AS total_roster_size FROM roster_stats")
     roster_row = cursor.fetchone()
 
+    result = {
+        'checked_in_count': stats_row['checked_in'],
+        'total_roster_size': roster_row['total_roster_size'],
+        'am_in': stats_row['am_in'],
+        'am_out': stats_row['am_out'],
+        'pm_in': stats_row['pm_in'],
+        'pm_out': stats_row['pm_out'],
+    }
+
+    if breakdown:
+        # FULL JOIN: a section can have attendance and no roster row left (its
+        # students moved or were deleted), and still belongs in the breakdown
+        group = ', '.join(STATS_BREAKDOWNS[breakdown])
+        cursor.execute(f"""
+            SELECT {group},
+                   COALESCE(SUM(r.students), 0) AS roster_size,
+                   COALESCE(SUM(ss.checked_in), 0) AS checked_in,
+                   COALESCE(SUM(ss.am_in), 0) AS am_in, COALESCE(SUM(ss.am_out), 0) AS am_out,
+                   COALESCE(SUM(ss.pm_in), 0) AS pm_in, COALESCE(SUM(ss.pm_out), 0) AS pm_out
+            FROM roster_stats r
+            FULL JOIN ({_SECTION_STATS_SQL}) ss USING (program, year_level, section)
+            WHERE r.students > 0 OR ss.checked_in > 0
+            GROUP BY {group}
+            ORDER BY {group}
+        """, {'event_id': event_id})
+        result['breakdown'] = [dict(row) for row in cursor.fetchall()]
+
     cursor.close()
-    return jsonify({
-        'checked_in_count': stats_row['checked_in_count'],
-        'total_roster_size': roster_row['total_roster_size']
-    }), 200
\ No newline at end of file
+    return jsonify(result), 200
+
+@attendance_bp.route('/api/stream/attendance/<int:event_id>', methods=['GET'])
+def stream_attendance(event_id):
+    """
+    Server-Sent Events feed of check-ins for one event. Every dashboard on a
+    worker shares that worker's single LISTEN connection; no pooled connection
+    is held while streaming. A 'resync' event means scans may have been missed.
+    """
+    subscription = broadcast.subscribe(event_id)
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    message = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                kind = 'resync' if message == broadcast.RESYNC else 'check_in'
+                yield f'event: {kind}\ndata: {message}\n\n'
+        finally:
+            broadcast.unsubscribe(event_id, subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.security import check_password_hash, generate_password_hash
-import secrets
 import datetime
 from database import get_db_connection
+from cache import invalidate_officer
+from helpers import issue_session_token, get_session_claims, log_action
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -23,7 +24,8 @@ def login():
         if not officer['is_active']:
              return jsonify({'message': 'Account is suspended.'}), 403
 
-        token = secrets.token_hex(16)
+        # Signed token: each scanner keeps its own, and none need a DB lookup to validate
+        token = issue_session_token(officer['username'], officer['role'], officer['token_generation'])
         now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
         # Updated: Changed '?' to '%s'
@@ -44,14 +46,10 @@ def check_session_validity():
     data = request.get_json()
     token = data.get('token')
     username = data.get('username') 
-    db = get_db_connection()
-    cursor = db.cursor()
-    
-    # Updated: Changed '?' to '%s'
-    cursor.execute("SELECT 1 FROM officers WHERE username = %s AND session_token = %s", (username, token))
-    user = cursor.fetchone()
-    
-    return jsonify({'valid': True if user else False}), 200 if user else 401
+
+    claims = get_session_claims(token)
+    valid = bool(claims and claims['username'] == username)
+    return jsonify({'valid': valid}), 200 if valid else 401
 
 @auth_bp.route('/api/update_password', methods=['POST'])
 def change_own_password():
@@ -61,27 +59,34 @@ def change_own_password():
     new_pw = data.get('new_password')
     token = data.get('token')
 
+    claims = get_session_claims(token)
+    if not claims or claims['username'] != username:
+        return jsonify({'message': 'Unauthorized session'}), 401
+
     db = get_db_connection()
     cursor = db.cursor()
 
-    cursor.execute("SELECT * FROM officers WHERE username = %s AND session_token = %s", (username, token))
+    cursor.execute("SELECT * FROM officers WHERE username = %s", (username,))
     user = cursor.fetchone()
 
-    if not user:
-        return jsonify({'message': 'Unauthorized session'}), 401
-
     # Verify current password before allowing change
     if not check_password_hash(user['password_hash'], current_pw):
         return jsonify({'message': 'Current password incorrect'}), 403
 
-    # Hash new password and update
+    # Hash new password and update; bumping the generation signs out every
+    # other session holding the old password, and this one gets a fresh token
     hashed_new = generate_password_hash(new_pw)
-    cursor.execute("UPDATE officers SET password_hash = %s WHERE username = %s", (hashed_new, username))
-    
-    # Log the action in your audit_logs table
-    cursor.execute("INSERT INTO audit_logs (actor_username, action, details) VALUES (%s, %s, %s)", 
-                   (username, 'UPDATE_PASSWORD', f'User {username} changed their own password.'))
-    
+    cursor.execute("""
+        UPDATE officers SET password_hash = %s, token_generation = token_generation + 1
+        WHERE username = %s
+        RETURNING token_generation
+    """, (hashed_new, username))
+    token = issue_session_token(username, user['role'], cursor.fetchone()['token_generation'])
+    cursor.execute("UPDATE officers SET session_token = %s WHERE username = %s", (token, username))
+    invalidate_officer(cursor, username)
     db.commit()
     cursor.close()
-    return jsonify({'message': 'Password updated successfully'}), 200
\ No newline at end of file
+
+    # Log the action in your audit_logs table
+    log_action(username, 'UPDATE_PASSWORD', f'User {username} changed their own password.')
+    return jsonify({'message': 'Password updated successfully', 'token': token}), 200
\ No newline at end of file
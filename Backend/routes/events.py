@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from database import get_db_connection
+from cache import get_event, get_setting, invalidate_event, invalidate_settings
 from helpers import log_action
+from partitions import ensure_event_partition
 
 events_bp = Blueprint('events', __name__)
 
@@ -33,9 +35,11 @@ def manage_events():
             (name, date, am_cutoff)
         )
         new_id = cursor.fetchone()['id']
+        # Check-ins for the event go straight to its own partition (when partitioned)
+        ensure_event_partition(cursor, new_id)
         
-        log_action('Admin', 'CREATE_EVENT', f"Created event: {name} (Cutoff: {am_cutoff})")
         db.commit()
+        log_action('Admin', 'CREATE_EVENT', f"Created event: {name} (Cutoff: {am_cutoff})")
         return jsonify({'message': 'Event created', 'id': new_id}), 201
     except Exception as e:
         db.rollback() # Rollback transaction on error
@@ -51,23 +55,22 @@ def active_event():
     if request.method == 'POST':
         # Updated: Changed '?' to '%s'
         cursor.execute("UPDATE settings SET value = %s WHERE key = 'active_event_id'", (str(request.get_json().get('event_id')),))
+        invalidate_settings(cursor)
         db.commit()
         cursor.close()
         return jsonify({'message': 'Active event updated.'}), 200
     
-    cursor.execute("SELECT value FROM settings WHERE key = 'active_event_id'")
-    setting = cursor.fetchone()
+    # Both lookups are served from the shared cache on most polls
+    active_event_id = get_setting(cursor, 'active_event_id')
 
-    if not setting: 
+    if not active_event_id: 
         cursor.close()
         return jsonify({'message': 'No active event.'}), 404
         
-    # Updated: Changed '?' to '%s'
-    cursor.execute("SELECT * FROM events WHERE id = %s", (int(setting['value']),))
-    event = cursor.fetchone()
+    event = get_event(cursor, active_event_id)
     cursor.close()
     
-    return jsonify(dict(event)) if event else ({'message': 'Event not found'}, 404)
+    return jsonify(event) if event else ({'message': 'Event not found'}, 404)
 
 @events_bp.route('/api/events/<int:event_id>', methods=['PUT', 'DELETE'])
 def modify_event(event_id):
@@ -89,9 +92,10 @@ def modify_event(event_id):
                 "UPDATE events SET name = %s, date = %s WHERE id = %s",
                 (name, date, event_id)
             )
+            invalidate_event(cursor, event_id)
+            db.commit()
             # Log the action for your Audit Logs
             log_action('Admin', 'UPDATE_EVENT', f"Updated event ID {event_id} to: {name}")
-            db.commit()
             return jsonify({'message': 'Event updated successfully.'}), 200
         except Exception as e:
             db.rollback()
@@ -107,9 +111,10 @@ def modify_event(event_id):
 
             # Soft Delete: Updated timestamp instead of DELETE FROM
             cursor.execute("UPDATE events SET deleted_at = CURRENT_TIMESTAMP WHERE id = %s", (event_id,))
+            invalidate_event(cursor, event_id)
             
-            log_action('Admin', 'SOFT_DELETE_EVENT', f"Archived event: {event_name}")
             db.commit()
+            log_action('Admin', 'SOFT_DELETE_EVENT', f"Archived event: {event_name}")
             return jsonify({'message': 'Event securely archived.'}), 200
         except Exception as e:
             db.rollback()
@@ -129,8 +134,9 @@ def toggle_attendance_mode(event_id):
 
     try:
         cursor.execute("UPDATE events SET attendance_mode = %s WHERE id = %s", (mode, event_id))
-        log_action('Officer', 'TOGGLE_MODE', f"Changed event {event_id} mode to {mode}")
+        invalidate_event(cursor, event_id)
         db.commit()
+        log_action('Officer', 'TOGGLE_MODE', f"Changed event {event_id} mode to {mode}")
         return jsonify({'message': f'System changed to Time {mode} mode.', 'mode': mode}), 200
     except Exception as e:
         db.rollback()
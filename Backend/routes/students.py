@@ -1,32 +1,152 @@
-from flask import Blueprint, request, jsonify
-import pandas as pd
+import base64
+import binascii
+import itertools
+import json
+import shutil
+import tempfile
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import psycopg2 
-from psycopg2.extras import execute_values
-from database import get_db_connection
+from database import get_db_connection, stream_connection
 from helpers import log_action, encrypt_data, decrypt_data
+from name_index import search_tokens, query_tokens, place_name_sort, maintain_name_sort
+from roster import (ROSTER_MAX_ERRORS, RosterFormatError, prepare_rows, read_roster_file,
+                    upsert_students, begin_student_stage, stage_students, merge_student_stage)
 
 students_bp = Blueprint('students', __name__)
 
+# Public columns only; name_sort/name_search are internal blind-index data
+STUDENT_COLUMNS = "student_no, first_name, middle_name, last_name, program, year_level, section"
+
+STUDENT_PAGE_DEFAULT = 50
+STUDENT_PAGE_MAX = 200
+STUDENT_STREAM_BATCH = 1000
+# Uploaded rosters larger than this are spooled to disk while they import
+ROSTER_SPOOL_SIZE = 8 * 1024 * 1024
+
+def _decrypt_student(row):
+    s = dict(row)
+    s['first_name'] = decrypt_data(s['first_name'])
+    s['middle_name'] = decrypt_data(s['middle_name'])
+    s['last_name'] = decrypt_data(s['last_name'])
+    return s
+
+def _encode_cursor(name_sort, student_no):
+    return base64.urlsafe_b64encode(json.dumps([name_sort, student_no]).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(token):
+    """(name_sort, student_no) from a next_cursor token; ValueError if it is not one."""
+    try:
+        name_sort, student_no = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (TypeError, UnicodeError, binascii.Error, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+    if name_sort is not None and (not isinstance(name_sort, int) or isinstance(name_sort, bool)):
+        raise ValueError("Invalid cursor: name_sort must be an integer")
+    if not isinstance(student_no, (str, int)) or isinstance(student_no, bool):
+        raise ValueError("Invalid cursor: bad student_no")
+    return name_sort, str(student_no)
+
+def _like_prefix(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def _student_filters(args):
+    """WHERE clause for the roster filters; 'All' (the dashboard default) means no filter."""
+    clauses, params = [], []
+    for column, arg in (('program', 'program'), ('year_level', 'year_level'), ('section', 'section')):
+        value = args.get(arg)
+        if value and value != 'All':
+            clauses.append(f"{column} = %s")
+            params.append(value)
+    search = args.get('q', '').strip()
+    if search:
+        # Prefix search over the blind index (no decryption needed) or the student number
+        clauses.append("(name_search @> %s::text[] OR student_no LIKE %s)")
+        params.extend([query_tokens(search), _like_prefix(search)])
+    return clauses, params
+
+def _list_students_page(db, args):
+    """One keyset page ordered by (name_sort, student_no), plus the filtered total."""
+    try:
+        limit = min(max(int(args.get('limit', STUDENT_PAGE_DEFAULT)), 1), STUDENT_PAGE_MAX)
+        after = _decode_cursor(args['cursor']) if args.get('cursor') else None
+    except (ValueError, TypeError):
+        return jsonify({'message': 'Invalid limit or cursor.'}), 400
+
+    clauses, params = _student_filters(args)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    page_clauses, page_params = list(clauses), list(params)
+    if after is not None:
+        if after[0] is None:
+            page_clauses.append("name_sort IS NULL AND student_no > %s")
+            page_params.append(after[1])
+        else:
+            # Rows not yet ranked (name_sort NULL) sort last
+            page_clauses.append("((name_sort, student_no) > (%s, %s) OR name_sort IS NULL)")
+            page_params.extend(after)
+    page_where = " WHERE " + " AND ".join(page_clauses) if page_clauses else ""
+
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT {STUDENT_COLUMNS}, name_sort FROM students{page_where}
+            ORDER BY name_sort ASC, student_no ASC
+            LIMIT %s
+        """, tuple(page_params) + (limit + 1,))
+        rows = cursor.fetchall()
+
+        cursor.execute(f"SELECT COUNT(*) AS total FROM students{where}", tuple(params))
+        total = cursor.fetchone()['total']
+    finally:
+        cursor.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]['name_sort'], rows[-1]['student_no'])
+
+    students = []
+    for row in rows:
+        s = _decrypt_student(row)
+        del s['name_sort']
+        students.append(s)
+    return jsonify({'students': students, 'next_cursor': next_cursor, 'total': total}), 200
+
+def _stream_all_students(args):
+    """Legacy full-roster array, streamed batch by batch from a server-side cursor."""
+    clauses, params = _student_filters(args)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    def generate():
+        with stream_connection() as db, db.cursor(name='students_listing') as cursor:
+            cursor.itersize = STUDENT_STREAM_BATCH
+            cursor.execute(f"SELECT {STUDENT_COLUMNS} FROM students{where} ORDER BY name_sort ASC, student_no ASC",
+                           tuple(params))
+            yield '['
+            first = True
+            while True:
+                batch = cursor.fetchmany(STUDENT_STREAM_BATCH)
+                if not batch:
+                    break
+                chunk = ','.join(json.dumps(_decrypt_student(row)) for row in batch)
+                yield chunk if first else ',' + chunk
+                first = False
+            yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
 # Decrypt Logic
 @students_bp.route('/api/students', methods=['GET', 'POST'], strict_slashes=False)
 def manage_students():
     db = get_db_connection()
-    cursor = db.cursor() 
     
     if request.method == 'GET':
-        cursor.execute("SELECT * FROM students ORDER BY last_name ASC")
-        students = cursor.fetchall()
-        student_list = []
-        
-        for row in students:
-            s = dict(row)
-            s['first_name'] = decrypt_data(s['first_name'])
-            s['middle_name'] = decrypt_data(s['middle_name'])
-            s['last_name'] = decrypt_data(s['last_name'])
-            student_list.append(s)
-            
-        cursor.close()
-        return jsonify(student_list), 200
+        # Keyset pages by default; ?all=1 streams the whole roster as a plain
+        # array for callers that really need every student (e.g. exports).
+        if request.args.get('all') in ('1', 'true'):
+            return _stream_all_students(request.args)
+        return _list_students_page(db, request.args)
+
+    cursor = db.cursor() 
     
     # Encrypt Logic (Create Student)
     data = request.get_json()
@@ -37,11 +157,15 @@ def manage_students():
         enc_last = encrypt_data(data['last_name'])
 
         # Updated: Changed '?' to '%s'
-        cursor.execute("""INSERT INTO students (student_no, first_name, middle_name, last_name, program, year_level, section)
-                      VALUES (%s, %s, %s, %s, %s, %s, %s)""", 
+        cursor.execute("""INSERT INTO students (student_no, first_name, middle_name, last_name, program, year_level, section, name_search)
+                      VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""", 
                       (data['student_no'], enc_first, enc_middle, enc_last, 
-                       data['program'], data['year_level'], data['section']))
+                       data['program'], data['year_level'], data['section'],
+                       search_tokens(data['first_name'], data['last_name'])))
+        unplaced = place_name_sort(cursor, [data['student_no']])
         db.commit()
+        if unplaced:
+            maintain_name_sort(db)
         return jsonify({'message': 'Student added.'}), 201
     except psycopg2.IntegrityError: 
         db.rollback()
@@ -65,13 +189,17 @@ def update_student(student_no):
         # Updated: Changed '?' to '%s'
         cursor.execute("""UPDATE students 
                       SET first_name = %s, middle_name = %s, last_name = %s, 
-                          program = %s, year_level = %s, section = %s
+                          program = %s, year_level = %s, section = %s, name_search = %s
                       WHERE student_no = %s""",
                    (enc_first, enc_middle, enc_last,
                     data['program'], data['year_level'], data['section'], 
+                    search_tokens(data['first_name'], data['last_name']),
                     student_no))
+        unplaced = place_name_sort(cursor, [student_no])
         
         db.commit()
+        if unplaced:
+            maintain_name_sort(db)
         return jsonify({'message': 'Student updated successfully.'}), 200
     except Exception as e:
         db.rollback()
@@ -90,49 +218,26 @@ def import_students():
     db = get_db_connection()
     cursor = db.cursor()
     try:
-        students_data = []
-        
-        # Loop through the chunk and apply encryption
-        for r in data:
-            # Skip empty rows if any sneak through
-            if not r.get('student_no') or not r.get('last_name') or not r.get('first_name'):
-                continue
-                
-            enc_first = encrypt_data(str(r.get('first_name', '')).strip())
-            enc_middle = encrypt_data(str(r.get('middle_name', '')).strip())
-            enc_last = encrypt_data(str(r.get('last_name', '')).strip())
-            
-            students_data.append((
-                str(r.get('student_no', '')).strip(), 
-                enc_first, 
-                enc_middle, 
-                enc_last, 
-                str(r.get('program', '')).strip(), 
-                str(r.get('year_level', '')).strip(), 
-                str(r.get('section', '')).strip()
-            ))
+        # Validate, normalize and encrypt the chunk; JSON rows are numbered from 1
+        students_data, errors = prepare_rows(enumerate(data, start=1))
 
         if not students_data:
-            return jsonify({'message': 'No valid records found in this chunk.'}), 400
-
-        # Use execute_values with ON CONFLICT for safe, fast batching
-        query = """
-            INSERT INTO students (student_no, first_name, middle_name, last_name, program, year_level, section) 
-            VALUES %s
-            ON CONFLICT (student_no) DO UPDATE SET
-                first_name = EXCLUDED.first_name,
-                middle_name = EXCLUDED.middle_name,
-                last_name = EXCLUDED.last_name,
-                program = EXCLUDED.program,
-                year_level = EXCLUDED.year_level,
-                section = EXCLUDED.section
-        """
-        
-        execute_values(cursor, query, students_data)
+            return jsonify({'message': 'No valid records found in this chunk.', 'errors': errors[:ROSTER_MAX_ERRORS]}), 400
+
+        if request.args.get('mode') == 'copy':
+            # COPY into a staging table, then one set-based merge
+            begin_student_stage(cursor)
+            stage_students(cursor, students_data)
+            merge_student_stage(cursor)
+            unplaced = place_name_sort(cursor, [row[0] for row in students_data])
+        else:
+            unplaced = upsert_students(cursor, students_data)
         
-        log_action('admin', 'IMPORT_STUDENTS', f'Imported chunk of {len(students_data)} students')
         db.commit()
-        return jsonify({'message': 'Import successful', 'count': len(students_data)}), 200
+        if unplaced:
+            maintain_name_sort(db)
+        log_action('admin', 'IMPORT_STUDENTS', f'Imported chunk of {len(students_data)} students')
+        return jsonify({'message': 'Import successful', 'count': len(students_data), 'errors': errors[:ROSTER_MAX_ERRORS]}), 200
         
     except Exception as e:
         db.rollback()
@@ -141,6 +246,101 @@ def import_students():
     finally:
         cursor.close()
 
+@students_bp.route('/api/admin/import_students/file', methods=['POST'])
+def import_students_file():
+    """
+    Imports a whole roster from an uploaded .csv/.xlsx ('file' form field).
+    Rows are parsed and upserted ROSTER_CHUNK_SIZE at a time, one transaction
+    per chunk, and progress is streamed back as newline-delimited JSON:
+        {"type": "progress", "rows": ..., "imported": ..., "errors": [...]}
+        {"type": "done", "rows": ..., "imported": ..., "error_count": ...}
+    With mode=copy every chunk is COPYed into a staging table instead and
+    merged in one transaction at the end: all or nothing, and faster for
+    whole-campus rosters.
+    """
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'message': 'No file uploaded.'}), 400
+
+    # Flask closes request files once this view returns, but the import keeps
+    # reading while the response streams, so it works from its own copy
+    source = tempfile.SpooledTemporaryFile(max_size=ROSTER_SPOOL_SIZE)
+    shutil.copyfileobj(upload.stream, source)
+    source.seek(0)
+
+    # Parse the first chunk up front so an unreadable file is a plain 400
+    try:
+        chunks = read_roster_file(source, upload.filename)
+        first = next(chunks, None)
+    except RosterFormatError as e:
+        source.close()
+        return jsonify({'message': str(e)}), 400
+    if first is None:
+        source.close()
+        return jsonify({'message': 'The file has no rows.'}), 400
+
+    actor = request.form.get('username', 'admin')
+    bulk = request.form.get('mode') == 'copy'
+
+    def generate():
+        # The import outlives the view, and with it the request's connection
+        rows_read = imported = committed = error_count = 0
+        reported = 0
+        sort_keys = {}  # plaintext order keys of written rows, so placing them skips decryption
+        staged_keys = {}
+        try:
+            with stream_connection() as db, db.cursor() as cursor:
+                try:
+                    if bulk:
+                        begin_student_stage(cursor)
+                    for chunk in itertools.chain([first], chunks):
+                        chunk_keys = {}
+                        students_data, errors = prepare_rows(chunk, chunk_keys)
+                        if students_data and bulk:
+                            stage_students(cursor, students_data)
+                            staged_keys.update(chunk_keys)
+                        elif students_data:
+                            # name_sort is placed once at the end, not per chunk
+                            upsert_students(cursor, students_data, refresh_order=False)
+                            db.commit()
+                            committed += len(students_data)
+                            sort_keys.update(chunk_keys)
+
+                        rows_read += len(chunk)
+                        imported += len(students_data)
+                        error_count += len(errors)
+                        shown = errors[:max(ROSTER_MAX_ERRORS - reported, 0)]
+                        reported += len(shown)
+                        yield json.dumps({'type': 'progress', 'rows': rows_read, 'imported': imported, 'errors': shown}) + '\n'
+
+                    if bulk and imported:
+                        merged = merge_student_stage(cursor)
+                        db.commit()
+                        committed = merged
+                        sort_keys = staged_keys
+                except Exception as e:
+                    db.rollback()
+                    print(f"Import Error: {str(e)}")
+                    yield json.dumps({'type': 'error', 'message': str(e), 'rows': rows_read, 'imported': committed}) + '\n'
+                finally:
+                    if committed:
+                        # Also covers a failed import: committed chunks still need a rank
+                        try:
+                            unplaced = place_name_sort(cursor, list(sort_keys), known=sort_keys)
+                            db.commit()
+                            if unplaced:
+                                maintain_name_sort(db)
+                        except Exception as e:
+                            db.rollback()
+                            print(f"Placing imported students in name order failed: {e}")
+                        log_action(actor, 'IMPORT_STUDENTS', f'Imported {committed} students from {upload.filename}')
+        finally:
+            source.close()
+
+        yield json.dumps({'type': 'done', 'rows': rows_read, 'imported': committed, 'error_count': error_count}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @students_bp.route('/api/sections', methods=['GET', 'POST'])
 def manage_sections():
     db = get_db_connection()
@@ -170,7 +370,7 @@ def get_student_info(student_no):
     db = get_db_connection()
     cursor = db.cursor()
     # Updated: Changed '?' to '%s'
-    cursor.execute("SELECT * FROM students WHERE student_no = %s", (student_no,))
+    cursor.execute(f"SELECT {STUDENT_COLUMNS} FROM students WHERE student_no = %s", (student_no,))
     student_row = cursor.fetchone()
     cursor.close()
 
@@ -0,0 +1,174 @@
+"""
+Slow-query log: statements slower than SLOW_QUERY_MS are aggregated per worker
+by normalized SQL and served by /api/admin/slow_queries. A sampled,
+rate-limited share is also logged (logger "slow_queries", WARNING) with
+redacted parameters and its plan.
+
+The plan is captured synchronously: EXPLAIN ANALYZE re-runs the statement on
+the caller's connection, inside its transaction, before the request carries
+on. Each sampled statement therefore adds up to SLOW_QUERY_EXPLAIN_TIMEOUT_MS
+to that request's latency, which is why only SLOW_QUERY_SAMPLE_RATE of slow
+statements, and at most SLOW_QUERY_LOG_PER_MINUTE a minute, are sampled.
+"""
+import logging
+import os
+import random
+import re
+import threading
+import time
+import psycopg2
+from psycopg2 import extensions
+from flask import has_request_context, request
+
+# Statements slower than this are aggregated by normalized SQL (0 disables)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+# Fraction of slow statements logged with their parameters and plan
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "0.05"))
+# Most slow statements logged (and EXPLAINed) per worker per minute
+SLOW_QUERY_LOG_PER_MINUTE = int(os.getenv("SLOW_QUERY_LOG_PER_MINUTE", "10"))
+# EXPLAIN ANALYZE runs the statement again, so it is cut off after this long
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "5000"))
+# Distinct normalized statements kept; the one with the least total time goes first
+SLOW_QUERY_MAX_ENTRIES = 200
+
+SLOW_QUERY_SECONDS = SLOW_QUERY_MS / 1000 if SLOW_QUERY_MS > 0 else float('inf')
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ('SELECT', 'WITH', 'VALUES', 'INSERT', 'UPDATE', 'DELETE')
+ENCRYPTED_VALUE = re.compile(r"gAAAA[A-Za-z0-9_=-]+")
+
+_lock = threading.Lock()
+_entries = {}  # normalized sql -> entry dict
+_window = [0.0, 0]  # [minute start, statements logged in it]
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|%s|\b\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\?(?:, \?)*\)")
+_REPEATED_LISTS = re.compile(r"\(\.\.\.\)(?:, \(\.\.\.\))+")
+
+def normalize_sql(query):
+    """SQL with literals and placeholders as ?, so statements differing only in values group together."""
+    text = _WHITESPACE.sub(' ', query).strip()
+    text = re.sub(r"\s*,\s*", ", ", text)
+    text = _LITERALS.sub('?', text)
+    text = _VALUE_LIST.sub('(...)', text)
+    return _REPEATED_LISTS.sub('(...)', text)
+
+def redact(value):
+    """Parameters with encrypted values (student names) masked."""
+    if isinstance(value, str):
+        return '<encrypted>' if value.startswith('gAAAA') else value
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if value is None or isinstance(value, (int, float, bool)):
+        return value
+    return str(value)
+
+def _take_log_slot():
+    if random.random() >= SLOW_QUERY_SAMPLE_RATE:
+        return False
+    now = time.monotonic()
+    with _lock:
+        if now - _window[0] >= 60:
+            _window[0], _window[1] = now, 0
+        if _window[1] >= SLOW_QUERY_LOG_PER_MINUTE:
+            return False
+        _window[1] += 1
+        return True
+
+def explain(cursor, query, vars):
+    """
+    Plan of a statement that just ran on cursor's connection, or None.
+    SELECTs get EXPLAIN (ANALYZE, BUFFERS); other statements, and SELECTs
+    that fail to run read-only, get a plain EXPLAIN. Everything happens in
+    a read-only savepoint that is rolled back, so nothing the second run does
+    is kept and the caller's transaction carries on unaffected.
+    """
+    conn = cursor.connection
+    if conn.autocommit or conn.get_transaction_status() != extensions.TRANSACTION_STATUS_INTRANS:
+        return None
+    verb = query.lstrip().split(None, 1)[0].upper() if query.strip() else ''
+    if verb not in EXPLAINABLE:
+        return None
+    # Session-level advisory locks survive a savepoint rollback
+    analyze = verb in ('SELECT', 'WITH') and 'pg_advisory' not in query
+
+    plain = conn.cursor(cursor_factory=extensions.cursor)
+    try:
+        plain.execute("SAVEPOINT slow_query_explain")
+        for analyzed in ((True, False) if analyze else (False,)):
+            try:
+                plain.execute("SET LOCAL transaction_read_only = on")
+                plain.execute("SET LOCAL statement_timeout = %s", (SLOW_QUERY_EXPLAIN_TIMEOUT_MS,))
+                plain.execute(("EXPLAIN (ANALYZE, BUFFERS) " if analyzed else "EXPLAIN ") + query, vars)
+                return '\n'.join(row[0] for row in plain.fetchall())
+            except psycopg2.Error:
+                continue
+            finally:
+                plain.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+        return None
+    except psycopg2.Error as e:
+        logger.warning("Slow query EXPLAIN failed: %s", e)
+        return None
+    finally:
+        try:
+            plain.execute("RELEASE SAVEPOINT slow_query_explain")
+        except psycopg2.Error:
+            pass
+        plain.close()
+
+def record(cursor, query, vars, seconds):
+    """Aggregates one slow statement; a sampled, rate-limited share is also logged with its plan."""
+    if not isinstance(query, str):
+        query = query.as_string(cursor.connection) if hasattr(query, 'as_string') else query.decode('utf-8')
+    normalized = normalize_sql(query)
+    route = request.endpoint if has_request_context() else None
+    duration_ms = seconds * 1000
+
+    sample = None
+    if _take_log_slot():
+        plan = explain(cursor, query, vars)
+        sample = {
+            'duration_ms': round(duration_ms, 3),
+            'route': route,
+            'params': redact(vars),
+            'plan': ENCRYPTED_VALUE.sub('<encrypted>', plan) if plan else None,
+            'at': time.time(),
+        }
+        logger.warning("Slow query: %.0f ms on %s: %s params=%s%s", duration_ms, route or 'no request', normalized,
+                       sample['params'], f"\n{sample['plan']}" if sample['plan'] else "")
+
+    with _lock:
+        entry = _entries.get(normalized)
+        if entry is None:
+            if len(_entries) >= SLOW_QUERY_MAX_ENTRIES:
+                _entries.pop(min(_entries, key=lambda k: _entries[k]['total_ms']))
+            entry = _entries[normalized] = {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'routes': {},
+                                            'last_seen': None, 'sample': None}
+        entry['calls'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+        entry['last_seen'] = time.time()
+        if route and (route in entry['routes'] or len(entry['routes']) < 20):
+            entry['routes'][route] = entry['routes'].get(route, 0) + 1
+        # Keep the slowest logged occurrence as the example
+        if sample and (entry['sample'] is None or sample['duration_ms'] >= entry['sample']['duration_ms']):
+            entry['sample'] = sample
+
+def worst(sort='total_ms', limit=50):
+    """Aggregated slow statements, worst first by total_ms, max_ms or calls."""
+    with _lock:
+        rows = [{'sql': sql, **entry, 'routes': dict(entry['routes'])} for sql, entry in _entries.items()]
+    for row in rows:
+        row['avg_ms'] = round(row['total_ms'] / row['calls'], 3)
+        row['total_ms'] = round(row['total_ms'], 3)
+        row['max_ms'] = round(row['max_ms'], 3)
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    return rows[:limit]
+
+def reset():
+    with _lock:
+        _entries.clear()
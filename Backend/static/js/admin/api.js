@@ -15,7 +15,8 @@ export const api = {
     updateOfficer: (username, body) => apiFetch(`/admin/officers/${username}`, { method: 'PUT', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(body) }),
     
     // Students
-    getStudents: () => apiFetch('/students'),
+    getStudents: (params) => apiFetch(`/students?${params}`),
+    getAllStudents: () => apiFetch('/students?all=1'),
     updateStudent: (id, body) => apiFetch(`/students/${id}`, { method: 'PUT', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(body) }),
     promoteStudents: () => apiFetch('/admin/maintenance/promote', { method: 'POST' }),
     demoteStudents: (student_nos) => apiFetch('/admin/demote_year_level', { method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify({ student_nos }) }),
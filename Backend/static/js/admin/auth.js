@@ -90,6 +90,8 @@ export async function updateMyPassword(currentPassword, newPassword) {
         });
         const result = await response.json();
         if (response.ok) {
+            // The old token was revoked along with the old password
+            localStorage.setItem('auth_token', result.token);
             showAlert('Success', result.message, 'success');
         } else {
             showAlert('Update Failed', result.message, 'error');
@@ -16,6 +16,7 @@ export async function loadGlobalSettings() {
         setVal('semester', settings.semester);
         setVal('org_name', settings.org_name);
         setVal('absence_fine', settings.absence_fine);
+        setVal('late_after', settings.late_after);
 
     } catch (error) {
         console.error("Error loading settings:", error);
@@ -34,7 +35,8 @@ export async function saveGlobalSettings() {
         academic_year: document.querySelector('[name="academic_year"]').value,
         semester: document.querySelector('[name="semester"]').value,
         org_name: document.querySelector('[name="org_name"]').value,
-        absence_fine: document.querySelector('[name="absence_fine"]').value
+        absence_fine: document.querySelector('[name="absence_fine"]').value,
+        late_after: document.querySelector('[name="late_after"]').value
     };
 
     try {
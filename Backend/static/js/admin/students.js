@@ -1,38 +1,48 @@
 import { api } from './api.js';
 import { showAlert, showConfirm } from './ui.js';
 
-let allStudents = []; 
+// Students on screen: the first page of matches for the current search
+let shownStudents = []; 
+const DISPLAY_LIMIT = 100;
+let latestRequest = 0;
+let searchTimer = null;
 
 export async function loadStudentList() {
     const tbody = document.getElementById('students-table-body');
     tbody.innerHTML = '<tr><td colspan="5" class="px-6 py-8 text-center animate-pulse">Loading roster...</td></tr>';
     
+    const search = document.getElementById('student-search');
+    const params = new URLSearchParams({ limit: DISPLAY_LIMIT, q: search ? search.value.trim() : '' });
+    const request = ++latestRequest;
     try {
-        const response = await api.getStudents();
-        allStudents = await response.json();
-        renderStudents(allStudents);
+        const response = await api.getStudents(params);
+        if (!response.ok) throw new Error('Failed to fetch');
+        const page = await response.json();
+        if (request !== latestRequest) return; // a newer search is on its way
+        shownStudents = page.students;
+        renderStudents(shownStudents, page.total);
     } catch (e) {
+        if (request !== latestRequest) return;
         console.error(e);
         tbody.innerHTML = '<tr><td colspan="5" class="px-6 py-8 text-center text-red-500">Failed to load roster.</td></tr>';
         showAlert('Loading Failed', 'Could not retrieve the student list from the server.', 'error');
     }
 }
 
-export function renderStudents(students) {
+export function renderStudents(students, total = students.length) {
     const tbody = document.getElementById('students-table-body');
     const countLabel = document.getElementById('student-count');
     tbody.innerHTML = '';
-    countLabel.textContent = `${students.length} students found`;
+    countLabel.textContent = total > students.length
+        ? `${total} students found (showing the first ${students.length})`
+        : `${total} students found`;
 
     if (students.length === 0) {
         tbody.innerHTML = '<tr><td colspan="5" class="px-6 py-8 text-center text-gray-400">No records found.</td></tr>';
         return;
     }
 
-    // Limit display to 100 for performance
-    const displayList = students.slice(0, 100); 
-
-    displayList.forEach(s => {
+    students.forEach(s => {
         const tr = document.createElement('tr');
         tr.className = 'hover:bg-gray-50 dark:hover:bg-gray-700/30 transition-colors border-b border-gray-50 dark:border-gray-700/50';
         tr.innerHTML = `
@@ -63,20 +73,16 @@ export function renderStudents(students) {
 
 // Search Logic
 export function setupStudentSearch() {
-    document.getElementById('student-search').addEventListener('input', (e) => {
-        const term = e.target.value.toLowerCase();
-        const filtered = allStudents.filter(s => 
-            s.last_name.toLowerCase().includes(term) || 
-            s.first_name.toLowerCase().includes(term) || 
-            s.student_no.includes(term)
-        );
-        renderStudents(filtered);
+    // The server searches the whole roster; wait for a pause in typing first
+    document.getElementById('student-search').addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(loadStudentList, 250);
     });
 }
 
 // Edit Logic
 export function openStudentEdit(studentNo) {
-    const student = allStudents.find(s => s.student_no === studentNo);
+    const student = shownStudents.find(s => s.student_no === studentNo);
     if (!student) return;
 
     document.getElementById('edit-student-no-orig').value = student.student_no;
@@ -170,14 +176,18 @@ export function toggleSelectAll(source) {
     checkboxes.forEach(cb => cb.checked = source.checked);
 }
 
-export function checkDuplicates() {
-    // 1. Guard clause in case data hasn't loaded
-    if (!allStudents || allStudents.length === 0) {
-        showAlert('No Data', 'No student records found to check.', 'warning');
-        return;
-    }
-
+export async function checkDuplicates() {
     try {
+        // 1. The check needs every student, so it streams the full roster on demand
+        const response = await api.getAllStudents();
+        if (!response.ok) throw new Error('Failed to fetch');
+        const allStudents = await response.json();
+
+        if (allStudents.length === 0) {
+            showAlert('No Data', 'No student records found to check.', 'warning');
+            return;
+        }
+
         const nameMap = {};
         
         // 2. Map and count occurrences locally
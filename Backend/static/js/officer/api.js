@@ -7,7 +7,7 @@ export const checkSession = async (payload) =>
     });
 
 // --- Students ---
-export const fetchStudents = async () => fetch(`${API_BASE_URL}/api/students`);
+export const fetchStudents = async (params) => fetch(`${API_BASE_URL}/api/students?${params}`);
 
 export const fetchAvailableSections = async (program, year) => 
     fetch(`${API_BASE_URL}/api/students/available_sections?program=${program}&year_level=${year}`);
@@ -1,9 +1,14 @@
 import * as API from './api.js';
 import { API_BASE_URL } from './config.js';
 
-let cachedStudents = [];
+let cachedStudents = []; // only the page on screen; the server pages the roster
 let currentPage = 1;
 const ITEMS_PER_PAGE = 10;
+let pageCursors = [null]; // pageCursors[n] is the cursor that opens page n + 1
+let nextCursor = null;
+let totalStudents = 0;
+let latestRequest = 0;
+let searchTimer = null;
 let currentSort = { field: 'last_name', direction: 'asc' };
 let currentEditingStudentId = null;
 let currentDeleteId = null; // Internal module state
@@ -48,8 +53,12 @@ export function loadStudentsView() {
         
         searchInput.addEventListener('input', (e) => {
             console.log("User typed:", e.target.value); // TEST 2
-            currentPage = 1; 
-            filterAndRenderStudents(); 
+            // Wait for a pause in typing before asking the server
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => {
+                resetPaging();
+                fetchAndRenderStudents();
+            }, 250);
         });
     } else {
         console.error("CRITICAL: Search bar with ID 'roster-search' was not found in the DOM."); // TEST 3
@@ -57,28 +66,34 @@ export function loadStudentsView() {
 
     // Trigger update whenever Program changes
     document.getElementById('roster-filter-program').addEventListener('change', () => { 
-        currentPage = 1; 
+        resetPaging();
         updateSectionDropdown(); // Fetch new sections
-        filterAndRenderStudents(); 
+        fetchAndRenderStudents();
     });
 
     // Trigger update whenever Year Level changes
     document.getElementById('roster-filter-year').addEventListener('change', () => { 
-        currentPage = 1; 
+        resetPaging();
         updateSectionDropdown(); // Fetch new sections
-        filterAndRenderStudents(); 
+        fetchAndRenderStudents();
     });
 
     // Re-render table when Section itself changes
     sectionFilter.addEventListener('change', () => { 
-        currentPage = 1; 
-        filterAndRenderStudents(); 
+        resetPaging();
+        fetchAndRenderStudents();
     });
 
-    document.getElementById('prev-page-btn').onclick = () => { if (currentPage > 1) { currentPage--; filterAndRenderStudents(); } };
+    document.getElementById('prev-page-btn').onclick = () => { if (currentPage > 1) { currentPage--; fetchAndRenderStudents(); } };
 
-    document.getElementById('next-page-btn').onclick = () => { currentPage++; filterAndRenderStudents(); };
+    document.getElementById('next-page-btn').onclick = () => {
+        if (!nextCursor) return;
+        pageCursors[currentPage] = nextCursor;
+        currentPage++;
+        fetchAndRenderStudents();
+    };
     
+    resetPaging();
     fetchAndRenderStudents();
     updateSectionDropdown();
 }
@@ -91,7 +106,7 @@ export function sortRoster(field) {
         currentSort.field = field;
         currentSort.direction = 'asc';
     }
-    filterAndRenderStudents();
+    renderStudents();
 }
 
 export function editStudent(studentNo) {
@@ -139,39 +154,47 @@ export function closeStudentModal() {
 }
 
 // Internal logic
+function resetPaging() {
+    currentPage = 1;
+    pageCursors = [null];
+    nextCursor = null;
+}
+
 async function fetchAndRenderStudents() {
     const tableBody = document.getElementById('students-table-body');
     tableBody.innerHTML = '<tr><td colspan="7" class="px-6 py-4 text-sm text-gray-500 dark:text-gray-500 text-center">Loading roster...</td></tr>';
+
+    // Filters and search run on the server; only one page comes back
+    const params = new URLSearchParams({
+        limit: ITEMS_PER_PAGE,
+        q: document.getElementById('roster-search').value.trim(),
+        program: document.getElementById('roster-filter-program').value,
+        year_level: document.getElementById('roster-filter-year').value,
+        section: document.getElementById('roster-filter-section').value,
+    });
+    const cursor = pageCursors[currentPage - 1];
+    if (cursor) params.set('cursor', cursor);
+
+    const request = ++latestRequest;
     try {
-        const response = await API.fetchStudents();
+        const response = await API.fetchStudents(params);
         if (!response.ok) throw new Error('Failed to fetch');
-        cachedStudents = await response.json();
-        filterAndRenderStudents();
+        const page = await response.json();
+        if (request !== latestRequest) return; // a newer search or page is on its way
+        cachedStudents = page.students;
+        nextCursor = page.next_cursor;
+        totalStudents = page.total;
+        renderStudents();
     } catch (error) {
+        if (request !== latestRequest) return;
         console.error(error);
         tableBody.innerHTML = '<tr><td colspan="7" class="px-6 py-4 text-sm text-red-500 dark:text-red-400 text-center">Error loading data.</td></tr>';
     }
 }
 
-function filterAndRenderStudents() {
-    const searchTerm = document.getElementById('roster-search').value.toLowerCase();
-    const programFilter = document.getElementById('roster-filter-program').value;
-    const yearFilter = document.getElementById('roster-filter-year').value;
-    const sectionFilter = document.getElementById('roster-filter-section').value; // New
-
-    let filtered = cachedStudents.filter(s => {
-        const matchesSearch = s.last_name.toLowerCase().includes(searchTerm) || 
-                              s.first_name.toLowerCase().includes(searchTerm) || 
-                              s.student_no.toLowerCase().includes(searchTerm);
-        const matchesProgram = programFilter === 'All' || s.program === programFilter;
-        const matchesYear = yearFilter === 'All' || s.year_level === yearFilter;
-        const matchesSection = sectionFilter === 'All' || s.section === sectionFilter; 
-        
-        // ADDED matchesSearch right here:
-        return matchesSearch && matchesProgram && matchesYear && matchesSection;
-    });
-    
-    filtered.sort((a, b) => {
+function renderStudents() {
+    // Pages arrive in name order; column sorting reorders the page on screen
+    const pageItems = [...cachedStudents].sort((a, b) => {
         let valA = a[currentSort.field].toLowerCase();
         let valB = b[currentSort.field].toLowerCase();
         if (valA < valB) return currentSort.direction === 'asc' ? -1 : 1;
@@ -179,22 +202,19 @@ function filterAndRenderStudents() {
         return 0;
     });
 
-    const totalItems = filtered.length;
-    const totalPages = Math.ceil(totalItems / ITEMS_PER_PAGE);
-
-    if (currentPage > totalPages) currentPage = Math.max(1, totalPages);
     const startIdx = (currentPage - 1) * ITEMS_PER_PAGE;
-    const paginatedItems = filtered.slice(startIdx, startIdx + ITEMS_PER_PAGE);
     const tableBody = document.getElementById('students-table-body');
     tableBody.innerHTML = '';
 
-    if (paginatedItems.length === 0) {
+    if (pageItems.length === 0) {
         tableBody.innerHTML = '<tr><td colspan="7" class="px-6 py-8 text-center text-gray-400 italic">No matching students found.</td></tr>';
         document.getElementById('roster-count').textContent = 'Showing 0 students';
+        document.getElementById('prev-page-btn').disabled = currentPage === 1;
+        document.getElementById('next-page-btn').disabled = true;
         return;
     }
 
-    paginatedItems.forEach((s, index) => {
+    pageItems.forEach((s, index) => {
         const realIndex = startIdx + index + 1;
         const row = document.createElement('tr');
         row.className = 'border-b border-gray-100 dark:border-gray-700/50 hover:bg-gray-50 dark:hover:bg-gray-700/30 transition duration-150';
@@ -220,9 +240,9 @@ function filterAndRenderStudents() {
         tableBody.appendChild(row);
     });
 
-    document.getElementById('roster-count').textContent = `Showing ${startIdx + 1}-${Math.min(startIdx + ITEMS_PER_PAGE, totalItems)} of ${totalItems} students`;
+    document.getElementById('roster-count').textContent = `Showing ${startIdx + 1}-${startIdx + pageItems.length} of ${totalStudents} students`;
     document.getElementById('prev-page-btn').disabled = currentPage === 1;
-    document.getElementById('next-page-btn').disabled = currentPage === totalPages || totalPages === 0;
+    document.getElementById('next-page-btn').disabled = !nextCursor;
 }
 
 async function updateSectionDropdown() {
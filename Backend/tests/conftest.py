@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# Keys must be in place before helpers is imported
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('ENCRYPTION_KEY', 'c-mPr0DNCmtUkyaVPWbLrGUcU9MBkQw4VfOV2eaN9vw=')
+
+
+@pytest.fixture
+def db():
+    """
+    A connection to DATABASE_URL whose work is rolled back afterwards, so tests
+    can write freely. Skips the test when no database is reachable.
+    """
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    from database import DATABASE_URL
+
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+    try:
+        conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor, connect_timeout=3)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"database unavailable: {e}")
+    from migrations import migrate
+    migrate(conn)  # what the app does at startup; a no-op on a current schema
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
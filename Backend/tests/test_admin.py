@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from helpers import issue_session_token
+
+OFFICER = 'test-admin-officer'
+
+
+@pytest.fixture
+def officer_token(db):
+    """A session token for a committed, non-admin officer, removed again afterwards."""
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO officers (username, password_hash, role) VALUES (%s, %s, 'officer')
+        RETURNING token_generation
+    """, (OFFICER, generate_password_hash('password')))
+    token = issue_session_token(OFFICER, 'officer', cursor.fetchone()['token_generation'])
+    db.commit()
+    try:
+        yield token
+    finally:
+        db.rollback()
+        cursor.execute("DELETE FROM officers WHERE username = %s", (OFFICER,))
+        db.commit()
+        cursor.close()
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+    return app.test_client()
+
+
+@pytest.mark.parametrize('path', ['/api/admin/restore', '/api/admin/events/1/purge'])
+def test_destructive_endpoints_need_an_admin(client, officer_token, path):
+    assert client.post(path, data=b'x').status_code == 401
+    assert client.post(path, data=b'x', headers={'Authorization': 'Bearer forged'}).status_code == 401
+    assert client.post(path, data=b'x', headers={'Authorization': f'Bearer {officer_token}'}).status_code == 403
+
+
+def test_restore_script_exits_non_zero_on_a_bad_archive(tmp_path):
+    archive = tmp_path / 'bogus.gz'
+    archive.write_bytes(b'not a backup')
+    proc = subprocess.run([sys.executable, 'restore_db.py', str(archive)],
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 1
+    assert 'Restore refused' in proc.stdout
@@ -0,0 +1,39 @@
+import pytest
+
+from analytics import compute
+
+DAY = '2001-01-05'
+
+
+@pytest.fixture
+def scans(db):
+    """One past event (AM cutoff 12:00) where a student came early, one came late and one only for the PM."""
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO events (name, date, am_cutoff) VALUES ('tardy test', %s, '12:00') RETURNING id", (DAY,))
+    event_id = cursor.fetchone()['id']
+    cursor.execute("SELECT ensure_attendance_partition(%s)", (event_id,))
+    for student_no, column, at in (('TEST-EARLY', 'am_in', '08:00'), ('TEST-LATE', 'am_in', '09:30'),
+                                   ('TEST-PM', 'pm_in', '13:00')):
+        cursor.execute("INSERT INTO students (student_no, first_name, last_name) VALUES (%s, 'A', 'B')", (student_no,))
+        cursor.execute(f"INSERT INTO attendance (event_id, student_no, {column}, status) VALUES (%s, %s, %s, 'Present')",
+                       (event_id, student_no, f'{DAY} {at}'))
+    return cursor
+
+
+def tardy_students(cursor):
+    report = compute(cursor, 'test', DAY, DAY)
+    tardy = report.students[report.students['tardy'] > 0]['student_no']
+    return report.late_after, sorted(s for s in tardy if s.startswith('TEST-'))
+
+
+def test_without_late_after_only_pm_arrivals_are_tardy(scans):
+    scans.execute("DELETE FROM settings WHERE key = 'late_after'")
+    assert tardy_students(scans) == (None, ['TEST-PM'])
+
+
+def test_late_after_is_compared_with_the_first_in(scans):
+    scans.execute("""
+        INSERT INTO settings (key, value) VALUES ('late_after', '09:00')
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+    """)
+    assert tardy_students(scans) == ('09:00', ['TEST-LATE', 'TEST-PM'])
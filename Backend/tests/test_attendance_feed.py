@@ -0,0 +1,80 @@
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+from database import DATABASE_URL
+from partitions import purge_event_attendance
+
+STUDENTS = ('TEST-FEED-1', 'TEST-FEED-2')
+
+
+@pytest.fixture
+def event(db):
+    """A committed event with two students, removed again afterwards."""
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO students (student_no, first_name, last_name) VALUES (%s, 'Ana', 'Cruz'), (%s, 'Ben', 'Abad')",
+                   STUDENTS)
+    cursor.execute("INSERT INTO events (name, date) VALUES ('feed test', '2026-01-05') RETURNING id")
+    event_id = cursor.fetchone()['id']
+    cursor.execute("SELECT ensure_attendance_partition(%s)", (event_id,))
+    db.commit()
+    try:
+        yield event_id
+    finally:
+        db.rollback()
+        purge_event_attendance(cursor, event_id)
+        cursor.execute("DELETE FROM event_section_stats WHERE event_id = %s", (event_id,))
+        cursor.execute("DELETE FROM event_stats WHERE event_id = %s", (event_id,))
+        cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+        cursor.execute("DELETE FROM students WHERE student_no = ANY(%s)", (list(STUDENTS),))
+        db.commit()
+        cursor.close()
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+    return app.test_client()
+
+
+def scan(cursor, event_id, student_no):
+    cursor.execute("INSERT INTO attendance (event_id, student_no, am_in, status) VALUES (%s, %s, now(), 'Present')",
+                   (event_id, student_no))
+
+
+def poll(client, event_id, since):
+    body = client.get(f'/api/attendance/{event_id}?since={since}').get_json()
+    return [row['student_no'] for row in body['rows']], body['cursor']
+
+
+def test_rows_are_stamped_with_their_transaction(db, event):
+    cursor = db.cursor()
+    scan(cursor, event, STUDENTS[0])
+    cursor.execute("SELECT change_xid = pg_current_xact_id() AS own FROM attendance WHERE event_id = %s", (event,))
+    assert cursor.fetchone()['own']
+
+
+def test_feed_waits_for_earlier_transactions(db, event, client):
+    _, start = poll(client, event, 0)
+
+    slow = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    try:
+        # An older transaction that is still open (it could hold a smaller change_seq)
+        slow.cursor().execute("SELECT pg_current_xact_id()")
+        fast = db.cursor()
+        scan(fast, event, STUDENTS[1])
+        db.commit()
+
+        seen, cursor = poll(client, event, start)
+        assert seen == []
+        slow.commit()
+    finally:
+        slow.close()
+
+    seen, cursor = poll(client, event, cursor)
+    assert seen == [STUDENTS[1]]
+    assert poll(client, event, cursor)[0] == []
+
+
+def test_negative_cursor_is_a_400(client, event):
+    assert client.get(f'/api/attendance/{event}?since=-1').status_code == 400
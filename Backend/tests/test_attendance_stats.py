@@ -0,0 +1,101 @@
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+from database import DATABASE_URL
+from partitions import purge_event_attendance
+
+STUDENTS = ('TEST-STATS-1', 'TEST-STATS-2')
+SECTION = 'TEST-STATS'
+
+
+@pytest.fixture
+def event(db):
+    """A committed event with two students in their own section, removed again afterwards."""
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO students (student_no, first_name, last_name, program, year_level, section)
+        VALUES (%s, 'Ana', 'Cruz', 'BSIT', '1', %s), (%s, 'Ben', 'Abad', 'BSIT', '1', %s)
+    """, (STUDENTS[0], SECTION, STUDENTS[1], SECTION))
+    cursor.execute("INSERT INTO events (name, date) VALUES ('stats test', '2026-01-05') RETURNING id")
+    event_id = cursor.fetchone()['id']
+    cursor.execute("SELECT ensure_attendance_partition(%s)", (event_id,))
+    db.commit()
+    try:
+        yield event_id
+    finally:
+        db.rollback()
+        purge_event_attendance(cursor, event_id)
+        cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+        cursor.execute("DELETE FROM students WHERE student_no = ANY(%s)", (list(STUDENTS),))
+        cursor.execute("DELETE FROM roster_stats WHERE section = %s", (SECTION,))
+        db.commit()
+        cursor.close()
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+    return app.test_client()
+
+
+def scan(cursor, event_id, student_no):
+    cursor.execute("INSERT INTO attendance (event_id, student_no, am_in, status) VALUES (%s, %s, now(), 'Present')",
+                   (event_id, student_no))
+
+
+def stats(client, event_id, monkeypatch, **params):
+    # Force the fold a real dashboard poll would eventually trigger
+    monkeypatch.setattr('routes.attendance._last_fold', 0.0)
+    return client.get(f'/api/stats/{event_id}', query_string=params).get_json()
+
+
+def test_concurrent_check_ins_do_not_wait_on_each_other(db, event):
+    other = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    try:
+        scan(db.cursor(), event, STUDENTS[0])
+        other_cursor = other.cursor()
+        other_cursor.execute("SET lock_timeout = '2s'")
+        # Used to block on the event's event_stats row until the first scan committed
+        scan(other_cursor, event, STUDENTS[1])
+    finally:
+        other.rollback()
+        other.close()
+
+
+def test_fold_moves_deltas_into_the_totals(db, event):
+    cursor = db.cursor()
+    scan(cursor, event, STUDENTS[0])
+    scan(cursor, event, STUDENTS[1])
+    cursor.execute("UPDATE attendance SET am_out = now() WHERE event_id = %s AND student_no = %s", (event, STUDENTS[0]))
+    cursor.execute("SELECT fold_attendance_stats()")
+    cursor.execute("SELECT COUNT(*) AS n FROM attendance_stats_delta WHERE event_id = %s", (event,))
+    assert cursor.fetchone()['n'] == 0
+    cursor.execute("SELECT checked_in, am_in, am_out FROM event_stats WHERE event_id = %s", (event,))
+    assert dict(cursor.fetchone()) == {'checked_in': 2, 'am_in': 2, 'am_out': 1}
+    cursor.execute("SELECT checked_in FROM event_section_stats WHERE event_id = %s AND section = %s", (event, SECTION))
+    assert cursor.fetchone()['checked_in'] == 2
+
+
+def test_stats_count_pending_and_folded_check_ins(db, event, client, monkeypatch):
+    cursor = db.cursor()
+    scan(cursor, event, STUDENTS[0])
+    db.commit()
+    assert stats(client, event, monkeypatch)['checked_in_count'] == 1
+
+    scan(cursor, event, STUDENTS[1])
+    db.commit()
+    # Read without folding: the second scan is still a pending delta
+    body = client.get(f'/api/stats/{event}').get_json()
+    assert (body['checked_in_count'], body['am_in']) == (2, 2)
+
+
+def test_breakdown_keeps_sections_without_a_roster_row(db, event, client, monkeypatch):
+    cursor = db.cursor()
+    scan(cursor, event, STUDENTS[0])
+    cursor.execute("DELETE FROM roster_stats WHERE section = %s", (SECTION,))
+    db.commit()
+
+    rows = stats(client, event, monkeypatch, breakdown='section')['breakdown']
+    assert {'program': 'BSIT', 'year_level': '1', 'section': SECTION, 'roster_size': 0,
+            'checked_in': 1, 'am_in': 1, 'am_out': 0, 'pm_in': 0, 'pm_out': 0} in rows
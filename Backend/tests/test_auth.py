@@ -0,0 +1,42 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from helpers import get_session_claims, issue_session_token
+
+OFFICER = 'test-auth-officer'
+
+
+@pytest.fixture
+def officer(db):
+    """A committed officer with password 'old-password', removed again afterwards."""
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO officers (username, password_hash, role) VALUES (%s, %s, 'officer')
+        RETURNING token_generation
+    """, (OFFICER, generate_password_hash('old-password')))
+    token = issue_session_token(OFFICER, 'officer', cursor.fetchone()['token_generation'])
+    db.commit()
+    try:
+        yield token
+    finally:
+        db.rollback()
+        cursor.execute("DELETE FROM officers WHERE username = %s", (OFFICER,))
+        db.commit()
+        cursor.close()
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+    return app.test_client()
+
+
+def test_changing_own_password_revokes_older_sessions(client, officer):
+    response = client.post('/api/update_password', json={
+        'username': OFFICER, 'token': officer,
+        'current_password': 'old-password', 'new_password': 'new-password',
+    })
+    assert response.status_code == 200
+    with client.application.app_context():
+        assert get_session_claims(officer) is None
+        assert get_session_claims(response.get_json()['token'])['username'] == OFFICER
@@ -0,0 +1,21 @@
+import gzip
+import json
+
+import pytest
+
+from backup import BACKUP_FORMAT
+from database import get_pool
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+    return app.test_client()
+
+
+def test_backup_streams_an_archive_and_returns_its_connection(client):
+    in_use = get_pool().stats()['in_use']
+    response = client.get('/api/admin/backup')
+    archive = gzip.decompress(response.get_data())
+    assert json.loads(archive.split(b'\n', 1)[0])['format'] == BACKUP_FORMAT
+    assert get_pool().stats()['in_use'] == in_use
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+from helpers import encrypt_data
+from routes.attendance import CHECK_IN_RESULTS, _check_in_payload
+
+
+def row(outcome, session='AM', first_name='Ana'):
+    return {'outcome': outcome, 'session': session, 'first_name': first_name}
+
+
+def test_first_time_in():
+    payload, status = _check_in_payload(row('in_first'), 'S-1', '08:01 AM')
+    assert status == 200
+    assert payload == {'message': 'Time IN recorded, Ana!', 'status': 'in', 'time': '08:01 AM', 'student_name': 'Ana'}
+
+
+def test_time_out_names_the_session():
+    payload, status = _check_in_payload(row('out', session='PM'), 'S-1', '05:00 PM')
+    assert status == 200
+    assert payload['status'] == 'out'
+    assert payload['message'] == 'PM Time OUT recorded, Ana.'
+
+
+@pytest.mark.parametrize('outcome', ['already_in', 'no_record', 'not_in', 'already_out'])
+def test_refusals_are_400_errors_without_a_time(outcome):
+    payload, status = _check_in_payload(row(outcome), 'S-1', '08:01 AM')
+    assert status == 400
+    assert payload['status'] == 'error'
+    assert 'time' not in payload
+
+
+def test_unknown_student_and_event_are_404():
+    payload, status = _check_in_payload(row('unknown_student', session=None, first_name=None), 'S-404', '08:01 AM')
+    assert status == 404
+    assert 'S-404' in payload['message']
+
+    payload, status = _check_in_payload(row('unknown_event', session=None), 'S-1', '08:01 AM')
+    assert (status, payload['status']) == (404, 'error')
+
+
+def test_every_outcome_message_formats():
+    for outcome in CHECK_IN_RESULTS:
+        payload, _ = _check_in_payload(row(outcome), 'S-1', '08:01 AM')
+        assert '{' not in payload['message']
+
+
+def test_first_name_is_decrypted():
+    payload, _ = _check_in_payload(row('in_first', first_name=encrypt_data('Maria')), 'S-1', '08:01 AM')
+    assert payload['student_name'] == 'Maria'
+
+
+def check_in(cursor, event_id, student_no, at, mode=None, is_am=None):
+    cursor.execute("SELECT * FROM attendance_check_in(%s, %s, %s, %s, %s)", (event_id, student_no, at, mode, is_am))
+    return cursor.fetchone()['outcome']
+
+
+def test_check_in_state_machine(db):
+    cursor = db.cursor()
+    cursor.execute("INSERT INTO students (student_no, first_name, last_name) VALUES ('TEST-CHECKIN', 'Ana', 'Cruz')")
+    cursor.execute("INSERT INTO events (name, date, am_cutoff) VALUES ('test', '2026-01-05', '12:00') RETURNING id")
+    event_id = cursor.fetchone()['id']
+    cursor.execute("SELECT ensure_attendance_partition(%s)", (event_id,))
+    morning, afternoon = datetime(2026, 1, 5, 8, 0), datetime(2026, 1, 5, 13, 0)
+
+    assert check_in(cursor, event_id, 'TEST-NOBODY', morning) == 'unknown_student'
+    assert check_in(cursor, event_id, 'TEST-CHECKIN', morning, mode='OUT') == 'no_record'
+    assert check_in(cursor, event_id, 'TEST-CHECKIN', morning) == 'in_first'
+    assert check_in(cursor, event_id, 'TEST-CHECKIN', morning) == 'already_in'
+    assert check_in(cursor, event_id, 'TEST-CHECKIN', afternoon) == 'in'
+    assert check_in(cursor, event_id, 'TEST-CHECKIN', morning, mode='OUT') == 'out'
+    assert check_in(cursor, event_id, 'TEST-CHECKIN', morning, mode='OUT') == 'already_out'
+
+    cursor.execute("SELECT COUNT(*) AS n FROM attendance WHERE event_id = %s", (event_id,))
+    assert cursor.fetchone()['n'] == 1
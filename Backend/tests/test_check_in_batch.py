@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+
+from routes.attendance import _parse_scan_time, _scan_event_id
+
+NOW = datetime(2026, 3, 2, 9, 30)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (7, 7), ('7', 7), (' 12 ', 12),
+    ('abc', None), ('7.5', None), (7.0, None), (True, None), (None, None),
+    ([7], None), (0, None), (-3, None), (2**31, None),
+])
+def test_scan_event_id(value, expected):
+    assert _scan_event_id(value) == expected
+
+
+def test_scan_time_falls_back_when_missing_or_unreadable():
+    assert _parse_scan_time(None, NOW) == NOW
+    assert _parse_scan_time('yesterday', NOW) == NOW
+
+
+def test_scan_time_is_converted_to_local_wall_clock():
+    assert _parse_scan_time('2026-03-02T08:15:00', NOW) == datetime(2026, 3, 2, 8, 15)
+    utc = _parse_scan_time('2026-03-02T08:15:00Z', NOW)
+    assert utc.tzinfo is None
+    assert utc == datetime.fromisoformat('2026-03-02T08:15:00+00:00').astimezone().replace(tzinfo=None)
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+    return app.test_client()
+
+
+def test_invalid_scans_get_their_own_error(client):
+    response = client.post('/api/check_in/batch', json={'scans': [
+        {'event_id': 'abc', 'student_no': 'S-1'},
+        {'event_id': 1, 'student_no': ['S-1']},
+        {'student_no': 'S-1'},
+        'not a scan',
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['code'] for r in results] == [400, 400, 400, 400]
+    assert results[0]['message'] == 'Invalid event_id or student_no.'
+    assert results[0]['event_id'] == 'abc'
+    assert results[2]['message'] == 'Missing event_id or student_no.'
+
+
+@pytest.mark.parametrize('body', [
+    {'event_id': 'abc', 'student_no': 'S-1'},
+    {'event_id': 2**31, 'student_no': 'S-1'},
+    {'event_id': 1, 'student_no': {'no': 'S-1'}},
+])
+def test_single_check_in_rejects_invalid_input(client, body):
+    response = client.post('/api/check_in', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Invalid event_id or student_no.'
+
+
+def test_single_check_in_without_json_is_a_400(client):
+    assert client.post('/api/check_in', data='nope').status_code == 400
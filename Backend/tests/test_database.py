@@ -0,0 +1,66 @@
+import gc
+import os
+
+import psycopg2
+import pytest
+
+from database import get_pool, stream_connection
+
+
+def test_stream_connection_goes_back_to_the_pool(db):
+    pool = get_pool()
+    in_use = pool.stats()['in_use']
+    with stream_connection() as conn, conn.cursor(name='test_stream') as records:
+        records.execute("SELECT generate_series(1, 3) AS n")
+        assert [r['n'] for r in records.fetchmany(10)] == [1, 2, 3]
+        assert pool.stats()['in_use'] == in_use + 1
+    assert pool.stats()['in_use'] == in_use
+
+
+def test_stream_connection_is_returned_when_the_stream_fails(db):
+    pool = get_pool()
+    in_use = pool.stats()['in_use']
+    with pytest.raises(psycopg2.Error):
+        with stream_connection() as conn, conn.cursor(name='test_stream') as records:
+            records.execute("SELECT 1 / 0")
+            records.fetchall()
+    assert pool.stats()['in_use'] == in_use
+
+
+def test_abandoned_stream_returns_its_connection(db):
+    pool = get_pool()
+    in_use = pool.stats()['in_use']
+
+    def generate():
+        with stream_connection() as conn, conn.cursor(name='test_stream') as records:
+            records.execute("SELECT generate_series(1, 1000) AS n")
+            for row in records:
+                yield row['n']
+
+    body = generate()
+    assert next(body) == 1
+    body.close()  # what the server does when the client disconnects
+    assert pool.stats()['in_use'] == in_use
+
+
+def test_forked_worker_keeps_the_inherited_pool(db):
+    import database
+    pool = get_pool()
+    pool.putconn(pool.getconn())  # make sure the parent has an idle connection
+    pid = os.fork()
+    if pid == 0:
+        # A worker builds its own pool; the inherited one must stay referenced
+        fresh = get_pool()
+        gc.collect()
+        os._exit(0 if fresh is not pool and database._abandoned[-1] is pool else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 AS ok")
+        assert cursor.fetchone()['ok'] == 1
+        cursor.close()
+    finally:
+        pool.putconn(conn)
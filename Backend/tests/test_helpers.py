@@ -0,0 +1,26 @@
+from helpers import _decrypt_cached, decrypt_data, encrypt_data
+
+
+def test_round_trip_and_plaintext_passthrough():
+    assert decrypt_data(encrypt_data('Dela Cruz')) == 'Dela Cruz'
+    assert decrypt_data('not encrypted') == 'not encrypted'
+    assert decrypt_data('') == ''
+
+
+def test_failed_decryptions_are_not_cached():
+    bogus = 'gAAAAAthis-is-not-a-valid-token'
+    before = _decrypt_cached.cache_info().currsize
+    assert decrypt_data(bogus) == '[Decryption Failed]'
+    assert decrypt_data(bogus) == '[Decryption Failed]'
+    assert _decrypt_cached.cache_info().currsize == before
+
+
+def test_missing_secret_key_refuses_to_start():
+    import os
+    import subprocess
+    import sys
+    env = {k: v for k, v in os.environ.items() if k != 'SECRET_KEY'}
+    proc = subprocess.run([sys.executable, '-c', 'import helpers'], cwd=os.path.dirname(os.path.dirname(__file__)),
+                          env=env, capture_output=True, text=True)
+    assert proc.returncode != 0
+    assert 'SECRET_KEY' in proc.stderr
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from migrations import _unique_attendance
+
+
+def test_duplicate_scans_merge_into_the_oldest_row(db):
+    cursor = db.cursor()
+    # Shadows the real table for this transaction (pg_temp comes first in the search path)
+    cursor.execute("""
+        CREATE TEMP TABLE attendance (
+            id SERIAL PRIMARY KEY, event_id INTEGER, student_no TEXT,
+            am_in TIMESTAMP, am_out TIMESTAMP, pm_in TIMESTAMP, pm_out TIMESTAMP, status TEXT
+        ) ON COMMIT DROP
+    """)
+    am_in, am_in_later, pm_out = datetime(2026, 1, 5, 8), datetime(2026, 1, 5, 8, 5), datetime(2026, 1, 5, 17)
+    cursor.execute("""
+        INSERT INTO attendance (event_id, student_no, am_in, pm_out, status) VALUES
+            (1, 'A', %s, NULL, 'Present'),
+            (1, 'A', %s, %s, 'Present'),
+            (1, 'B', %s, NULL, 'Present'),
+            (2, 'A', NULL, %s, 'Present')
+    """, (am_in_later, am_in, pm_out, am_in, pm_out))
+
+    _unique_attendance(cursor)
+
+    cursor.execute("SELECT id, event_id, student_no, am_in, pm_out FROM attendance ORDER BY id")
+    rows = [tuple(r.values()) for r in cursor.fetchall()]
+    assert rows == [
+        (1, 1, 'A', am_in, pm_out),  # earliest time per column, kept on the oldest row
+        (3, 1, 'B', am_in, None),
+        (4, 2, 'A', None, pm_out),
+    ]
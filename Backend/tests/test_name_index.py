@@ -0,0 +1,135 @@
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+from database import DATABASE_URL
+from helpers import encrypt_data
+from name_index import (NAME_SORT_GAP, _respace, collation_key, normalize_name, place_name_sort,
+                        query_tokens, search_tokens)
+
+
+def test_normalize_name_folds_case_accents_and_punctuation():
+    assert normalize_name('  José-María  ') == 'jose maria'
+    assert normalize_name(None) == ''
+
+
+def test_collation_key_orders_by_last_then_first_name():
+    keys = [collation_key('Ana', '', 'Cruz', '3'), collation_key('Ben', '', 'Abad', '2'), collation_key('Al', '', 'Cruz', '1')]
+    assert [k[-1] for k in sorted(keys)] == ['2', '1', '3']
+
+
+def test_query_tokens_match_name_prefixes():
+    tokens = set(search_tokens('Maria', 'Dela Cruz'))
+    assert set(query_tokens('mar cru')) <= tokens
+    assert not set(query_tokens('maria santos')) <= tokens
+
+
+@pytest.fixture
+def roster(db):
+    """An empty students table (a temp table shadowing the real one) and a way to add to it."""
+    cursor = db.cursor()
+    cursor.execute("CREATE TEMP TABLE students (LIKE public.students INCLUDING ALL) ON COMMIT DROP")
+
+    def add(student_no, first, last, name_sort=None):
+        cursor.execute("""
+            INSERT INTO students (student_no, first_name, middle_name, last_name, program, year_level, section, name_sort)
+            VALUES (%s, %s, %s, %s, 'BSIT', '1', 'A', %s)
+        """, (student_no, encrypt_data(first), encrypt_data(''), encrypt_data(last), name_sort))
+    yield cursor, add
+    cursor.close()
+
+
+def order(cursor):
+    cursor.execute("SELECT student_no FROM students ORDER BY name_sort, student_no")
+    return [r['student_no'] for r in cursor.fetchall()]
+
+
+def test_place_name_sort_slots_students_between_neighbours(roster):
+    cursor, add = roster
+    names = {'1': ('Ana', 'Cruz'), '2': ('Ben', 'Abad'), '3': ('Carl', 'Santos'), '4': ('Dina', 'Mendoza')}
+    for student_no, (first, last) in names.items():
+        add(student_no, first, last)
+    assert place_name_sort(cursor, list(names)) == 0
+    assert order(cursor) == ['2', '1', '4', '3']
+
+    add('5', 'Eve', 'Lopez')
+    add('6', 'Fe', 'Zamora')
+    add('7', 'Gil', 'Aaron')
+    assert place_name_sort(cursor, ['5', '6', '7']) == 0
+    assert order(cursor) == ['7', '2', '1', '5', '4', '3', '6']
+
+    # A rename moves the student
+    cursor.execute("UPDATE students SET last_name = %s WHERE student_no = '3'", (encrypt_data('Abaya'),))
+    assert place_name_sort(cursor, ['3']) == 0
+    assert order(cursor) == ['7', '2', '3', '1', '5', '4', '6']
+
+
+def test_place_name_sort_uses_known_keys(roster):
+    cursor, add = roster
+    add('1', 'Ana', 'Cruz')
+    add('2', 'Ben', 'Abad')
+    # The stored ciphertext says otherwise; the caller's plaintext wins
+    known = {'1': collation_key('Ana', '', 'Aaron', '1')}
+    place_name_sort(cursor, ['1', '2'], known=known)
+    assert order(cursor) == ['1', '2']
+
+
+def test_full_gap_is_left_unranked_until_respaced(roster):
+    cursor, add = roster
+    add('1', 'Ana', 'Abad', name_sort=NAME_SORT_GAP)
+    add('2', 'Ben', 'Cruz', name_sort=NAME_SORT_GAP + 1)
+    add('3', 'Carl', 'Bello')
+    assert place_name_sort(cursor, ['3']) == 1
+    assert order(cursor) == ['1', '2', '3']
+
+    assert _respace(cursor)
+    assert place_name_sort(cursor, ['3']) == 0
+    assert order(cursor) == ['1', '3', '2']
+    cursor.execute("SELECT name_sort FROM students WHERE student_no = '2'")
+    assert cursor.fetchone()['name_sort'] == 2 * NAME_SORT_GAP
+
+
+def test_respace_backs_off_while_a_writer_holds_a_student(db):
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO students (student_no, first_name, middle_name, last_name, program, year_level, section, name_sort)
+        VALUES ('TEST-RESPACE', %s, %s, %s, 'BSIT', '1', 'A', 3)
+    """, (encrypt_data('Ana'), encrypt_data(''), encrypt_data('Cruz')))
+    db.commit()
+    other = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    try:
+        # An officer moving the student to another section, mid-transaction
+        other.cursor().execute("UPDATE students SET section = 'B' WHERE student_no = 'TEST-RESPACE'")
+        assert not _respace(cursor)
+        cursor.execute("SELECT name_sort FROM students WHERE student_no = 'TEST-RESPACE'")
+        assert cursor.fetchone()['name_sort'] == 3
+        db.rollback()
+    finally:
+        other.rollback()
+        other.close()
+        cursor.execute("DELETE FROM students WHERE student_no = 'TEST-RESPACE'")
+        db.commit()
+
+
+def test_backfill_fills_rows_that_predate_the_index(db):
+    from name_index import backfill_name_index
+    cursor = db.cursor()
+    cursor.execute("""
+        INSERT INTO students (student_no, first_name, middle_name, last_name, program, year_level, section)
+        VALUES ('TEST-BACKFILL-1', %s, %s, %s, 'BSIT', '1', 'A'), ('TEST-BACKFILL-2', %s, %s, %s, 'BSIT', '1', 'A')
+    """, (encrypt_data('Ana'), encrypt_data(''), encrypt_data('Cruz'),
+          encrypt_data('Ben'), encrypt_data(''), encrypt_data('Abad')))
+    db.commit()
+    try:
+        assert backfill_name_index(db, batch_size=1) >= 2
+        cursor.execute("""
+            SELECT student_no, name_search IS NOT NULL AS searchable FROM students
+            WHERE student_no LIKE 'TEST-BACKFILL-%' ORDER BY name_sort
+        """)
+        assert [tuple(r.values()) for r in cursor.fetchall()] == [('TEST-BACKFILL-2', True), ('TEST-BACKFILL-1', True)]
+        # Nothing left to do on the next run
+        assert backfill_name_index(db) == 0
+    finally:
+        db.rollback()
+        cursor.execute("DELETE FROM students WHERE student_no LIKE 'TEST-BACKFILL-%'")
+        db.commit()
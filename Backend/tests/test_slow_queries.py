@@ -0,0 +1,35 @@
+import logging
+
+import pytest
+
+import slow_queries
+from slow_queries import normalize_sql, redact
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("SELECT *\n  FROM students   WHERE student_no = %s", "SELECT * FROM students WHERE student_no = ?"),
+    ("SELECT * FROM events WHERE id = 42 AND name = 'it''s'", "SELECT * FROM events WHERE id = ? AND name = ?"),
+    ("UPDATE s SET a = %(a)s,b=%(b)s", "UPDATE s SET a = ?, b=?"),
+    ("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)", "INSERT INTO t (a, b) VALUES (...)"),
+    ("SELECT * FROM t WHERE id IN (1, 2, 3)", "SELECT * FROM t WHERE id IN (...)"),
+    ("SELECT col1 FROM t2", "SELECT col1 FROM t2"),
+])
+def test_normalize_sql(query, expected):
+    assert normalize_sql(query) == expected
+
+
+def test_redact_masks_encrypted_values_only():
+    assert redact(('gAAAAbc', 'S-1', 3, None, True)) == ['<encrypted>', 'S-1', 3, None, True]
+    assert redact({'name': 'gAAAAxyz', 'ids': ['1', 'gAAAAq']}) == {'name': '<encrypted>', 'ids': ['1', '<encrypted>']}
+    assert redact(b'bytes') == "b'bytes'"
+
+
+def test_sampled_statements_are_logged_as_warnings(db, monkeypatch, caplog):
+    monkeypatch.setattr(slow_queries, 'SLOW_QUERY_SAMPLE_RATE', 1.0)
+    monkeypatch.setattr(slow_queries, '_window', [0.0, 0])
+    cursor = db.cursor()
+    cursor.execute("SELECT 1")
+    with caplog.at_level(logging.WARNING, logger='slow_queries'):
+        slow_queries.record(cursor, "SELECT %s::int", (1,), 0.5)
+    assert any(r.levelno == logging.WARNING and 'SELECT ?::int' in r.getMessage() for r in caplog.records)
+    slow_queries.reset()
@@ -0,0 +1,65 @@
+import base64
+import json
+
+import pytest
+
+from routes.students import _decode_cursor, _encode_cursor, _like_prefix
+
+
+def test_cursor_round_trip():
+    assert _decode_cursor(_encode_cursor(3 << 20, '2300951')) == (3 << 20, '2300951')
+    assert _decode_cursor(_encode_cursor(None, 2300951)) == (None, '2300951')
+
+
+@pytest.mark.parametrize('payload', [b'"ab"', b'["a", "1"]', b'[true, "1"]', b'[1, [2]]', b'[1]', b'{}', b'not json'])
+def test_malformed_cursors_are_rejected(payload):
+    with pytest.raises(ValueError):
+        _decode_cursor(base64.urlsafe_b64encode(payload).decode('ascii'))
+
+
+def test_like_prefix_escapes_wildcards():
+    assert _like_prefix('23_0%') == '23\\_0\\%%'
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+    return app.test_client()
+
+
+def test_listing_is_paged_by_default(client):
+    page = client.get('/api/students').get_json()
+    assert set(page) == {'students', 'next_cursor', 'total'}
+    assert len(page['students']) <= 50
+
+
+def test_keyset_pages_follow_the_full_stream(client):
+    everyone = client.get('/api/students?all=1').get_json()
+    paged, cursor = [], None
+    while len(paged) < 35:
+        page = client.get('/api/students', query_string={'limit': 7, **({'cursor': cursor} if cursor else {})}).get_json()
+        paged += page['students']
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert [s['student_no'] for s in paged] == [s['student_no'] for s in everyone[:len(paged)]]
+
+
+@pytest.mark.parametrize('cursor', ['nonsense', base64.urlsafe_b64encode(b'"ab"').decode('ascii'), 'é'])
+def test_bad_cursor_is_a_400(client, cursor):
+    assert client.get('/api/students', query_string={'cursor': cursor}).status_code == 400
+
+
+def test_file_import_returns_its_connection(client, db):
+    from io import BytesIO
+    from database import get_pool
+    in_use = get_pool().stats()['in_use']
+    csv = b'Student No,First Name,Last Name,Program,Year Level,Section\nTEST-IMPORT-1,Ana,Cruz,BSIT,1,A\n'
+    try:
+        response = client.post('/api/admin/import_students/file', data={'file': (BytesIO(csv), 'roster.csv')})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert lines[-1] == {'type': 'done', 'rows': 1, 'imported': 1, 'error_count': 0}
+        assert get_pool().stats()['in_use'] == in_use
+    finally:
+        db.cursor().execute("DELETE FROM students WHERE student_no = 'TEST-IMPORT-1'")
+        db.commit()